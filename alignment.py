@@ -0,0 +1,181 @@
+"""Drift-aware alignment of caption cues to a diarized transcript
+
+The first-match delay in merge_subtitle assumes the captions lag the audio by
+one constant offset. On long broadcasts that offset drifts, so this module
+estimates it along the whole episode instead:
+
+1. Both texts are turned into timed word streams; a word's time is
+   interpolated inside the cue or speaker turn it belongs to.
+2. Word n-grams that occur exactly once in the captions and once in the
+   transcript become anchor candidates.
+3. The longest chain of candidates that is increasing in both streams is
+   kept (patience-style), which discards repeated phrases and crossings.
+4. The caption-minus-transcript offsets of the anchors are smoothed with a
+   running median and interpolated linearly between anchors.
+
+Every step is a hash lookup, a sort or a bisect, so aligning an episode is
+O(n log n) in its number of words.
+"""
+import re
+from bisect import bisect_left
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Words per anchor n-gram; shorter n-grams repeat too often to be unique
+ANCHOR_NGRAM = 3
+# Anchors whose offset differs from the episode's first-match delay by more
+# than this (seconds) are implausible. Some broadcasts drift by well over a
+# minute, e.g. where the transcript's video had cuts the captioned one did not.
+MAX_OFFSET = 180.0
+# Fewer anchors than this, or anchors near fewer than this share of the cues,
+# and the episode keeps the constant fallback delay
+MIN_ANCHORS = 8
+MIN_COVERAGE = 0.5
+# Anchors in the running median that smooths interpolation noise
+SMOOTHING_WINDOW = 9
+# A cue is covered if an anchor lies within this many seconds of it
+COVERAGE_RADIUS = 30.0
+
+MODES = ('first-match', 'piecewise')
+
+# Same words as merge_subtitle.normalize_text(text).split()
+_WORD_RE = re.compile(r'\w+')
+
+
+def timed_words(items):
+    """Flatten (start, end, text) items into parallel lists of words and times
+
+    Words are spread evenly over their item's time span.
+    """
+    words, times = [], []
+    for start, end, text in items:
+        item_words = _WORD_RE.findall(text.lower())
+        if not item_words:
+            continue
+        step = (end - start) / len(item_words)
+        words.extend(item_words)
+        times.extend(start + step * (k + 0.5) for k in range(len(item_words)))
+    return words, times
+
+
+def _unique_ngrams(words, n):
+    """{n-gram: position} for the n-grams that occur exactly once"""
+    seen = {}
+    for i in range(len(words) - n + 1):
+        gram = tuple(words[i:i + n])
+        seen[gram] = -1 if gram in seen else i
+    return {gram: i for gram, i in seen.items() if i >= 0}
+
+
+def _longest_increasing_chain(pairs):
+    """Longest subsequence of (i, j) pairs, sorted by i, whose j also increases"""
+    tails, tail_index, previous = [], [], [None] * len(pairs)
+    for k, (_, j) in enumerate(pairs):
+        pos = bisect_left(tails, j)
+        if pos:
+            previous[k] = tail_index[pos - 1]
+        if pos == len(tails):
+            tails.append(j)
+            tail_index.append(k)
+        else:
+            tails[pos] = j
+            tail_index[pos] = k
+    chain = []
+    k = tail_index[-1] if tail_index else None
+    while k is not None:
+        chain.append(pairs[k])
+        k = previous[k]
+    return chain[::-1]
+
+
+def match_anchors(caption_items, transcript_items, n=ANCHOR_NGRAM, expected_offset=0.0):
+    """Monotone anchor points as (caption_time, transcript_time) pairs
+
+    Candidates whose offset is more than MAX_OFFSET from ``expected_offset``
+    (the first-match delay) are dropped before chaining.
+    """
+    caption_words, caption_times = timed_words(caption_items)
+    transcript_words, transcript_times = timed_words(transcript_items)
+
+    transcript_grams = _unique_ngrams(transcript_words, n)
+    candidates = []
+    # Dicts keep insertion order, so unique n-grams come out by caption position
+    for gram, i in _unique_ngrams(caption_words, n).items():
+        j = transcript_grams.get(gram)
+        if j is not None and abs(caption_times[i] - transcript_times[j] - expected_offset) <= MAX_OFFSET:
+            candidates.append((i, j))
+
+    return [(caption_times[i], transcript_times[j]) for i, j in _longest_increasing_chain(candidates)]
+
+
+class Alignment:
+    """Piecewise-linear caption delay along an episode
+
+    ``delay_at(cue)`` is the number of seconds to subtract from the cue's
+    times to get transcript time, the same convention as the constant delay
+    of ``detect_delay_first_match``.
+    """
+
+    def __init__(self, anchors, fallback_delay, cue_times=()):
+        self.fallback_delay = fallback_delay
+        self.anchor_count = len(anchors)
+        cue_times = np.asarray(cue_times, dtype=float)
+
+        covered = 0.0
+        if len(anchors) < MIN_ANCHORS:
+            self.fallback = 'few anchors'
+        else:
+            anchor_times = np.array([a[0] for a in anchors])
+            if len(cue_times):
+                # Distance from every cue to its nearest anchor
+                pos = np.searchsorted(anchor_times, cue_times).clip(1, len(anchor_times) - 1)
+                nearest = np.minimum(abs(cue_times - anchor_times[pos - 1]), abs(cue_times - anchor_times[pos]))
+                covered = float(np.mean(nearest <= COVERAGE_RADIUS))
+            self.fallback = 'low coverage' if len(cue_times) and covered < MIN_COVERAGE else None
+
+        if self.fallback:
+            self.knot_times = np.array([0.0])
+            self.knot_offsets = np.array([float(fallback_delay)])
+            residuals = np.zeros(0)
+        else:
+            raw = np.array([a[0] - a[1] for a in anchors])
+            half = SMOOTHING_WINDOW // 2
+            padded = np.pad(raw, half, mode='edge')
+            self.knot_times = anchor_times
+            self.knot_offsets = np.median(sliding_window_view(padded, SMOOTHING_WINDOW), axis=1)
+            residuals = raw - self.knot_offsets
+
+        self.metrics = {
+            'anchors': self.anchor_count,
+            # None, 'few anchors' or 'low coverage'
+            'fallback': self.fallback,
+            'coverage': round(covered, 3),
+            'residual_mad': round(float(np.median(abs(residuals))), 3) if len(residuals) else None,
+            'offset_start': round(float(self.knot_offsets[0]), 2),
+            'offset_end': round(float(self.knot_offsets[-1]), 2),
+            'drift': round(float(self.knot_offsets[-1] - self.knot_offsets[0]), 2),
+            'offset_min': round(float(self.knot_offsets.min()), 2),
+            'offset_max': round(float(self.knot_offsets.max()), 2),
+        }
+
+    def delay_at(self, cue):
+        """Delay at the middle of a cue; constant beyond the first and last anchor"""
+        if self.fallback:
+            return self.fallback_delay
+        return float(np.interp((cue.start + cue.end) / 2, self.knot_times, self.knot_offsets))
+
+
+def align_episode(cues, transcript_turns, fallback_delay):
+    """Fit an Alignment of caption cues to transcript turns
+
+    Args:
+        cues: caption Cue list
+        transcript_turns: (start, end, text) of every speaker turn
+        fallback_delay: first-match delay; anchors must lie within MAX_OFFSET
+            of it, and it is used as a constant when too few anchors are found
+            or they cover too little of the episode
+    """
+    anchors = match_anchors(((cue.start, cue.end, cue.text) for cue in cues), transcript_turns,
+                            expected_offset=fallback_delay)
+    return Alignment(anchors, fallback_delay, [(cue.start + cue.end) / 2 for cue in cues])
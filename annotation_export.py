@@ -0,0 +1,157 @@
+"""Lazy, chunked exports of the annotation store
+
+Exports are produced only when requested, written chunk by chunk from a
+database cursor into a file under EXPORT_DIR, and reused while the filters and
+the store's data version stay the same. Memory use is bounded by the chunk
+size rather than the number of annotations.
+"""
+import hashlib
+import json
+import os
+import threading
+
+from annotation_store import COLUMNS, TIME_COLUMNS
+
+EXPORT_DIR = "exports"
+# Older export files beyond this many are removed
+MAX_CACHED_EXPORTS = 20
+CHUNK_SIZE = 5000
+
+FORMATS = {
+    "csv": {"label": "CSV", "extension": "csv", "mime": "text/csv"},
+    "xlsx": {"label": "Excel", "extension": "xlsx",
+             "mime": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"},
+    "json": {"label": "JSON", "extension": "json", "mime": "application/json"},
+    "jsonl": {"label": "JSON Lines", "extension": "jsonl", "mime": "application/x-ndjson"},
+    "parquet": {"label": "Parquet", "extension": "parquet", "mime": "application/vnd.apache.parquet"},
+}
+
+INTEGER_COLUMNS = {"video_idx", "annotation_order"}
+
+
+def export_fingerprint(fmt, filters, data_version):
+    """Key of an export: format, normalised filters and the store's data version"""
+    normalised = {k: sorted(map(str, v)) if isinstance(v, (list, tuple, set)) else v
+                  for k, v in sorted((filters or {}).items()) if v}
+    payload = json.dumps([fmt, normalised, data_version], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def _records(chunk):
+    """Chunk rows as plain dicts with JSON-friendly values"""
+    for record in chunk.to_dict("records"):
+        for column, value in record.items():
+            if value != value:  # NaN from empty SQL values
+                record[column] = None
+            elif column in INTEGER_COLUMNS and value is not None:
+                record[column] = int(value)
+            elif column in TIME_COLUMNS and value is not None:
+                record[column] = float(value)
+        yield record
+
+
+def _write_csv(chunks, path):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        header = True
+        for chunk in chunks:
+            chunk.to_csv(f, index=False, header=header)
+            header = False
+        if header:
+            f.write(",".join(COLUMNS) + "\n")
+
+
+def _write_jsonl(chunks, path):
+    with open(path, "w", encoding="utf-8") as f:
+        for chunk in chunks:
+            for record in _records(chunk):
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def _write_json(chunks, path):
+    """A pretty-printed JSON array, like DataFrame.to_json(orient='records', indent=2)"""
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("[")
+        first = True
+        for chunk in chunks:
+            for record in _records(chunk):
+                f.write("\n  " if first else ",\n  ")
+                f.write(json.dumps(record, ensure_ascii=False, indent=2).replace("\n", "\n  "))
+                first = False
+        f.write("\n]\n" if not first else "]\n")
+
+
+def _write_xlsx(chunks, path):
+    from openpyxl import Workbook
+
+    # write_only streams rows to disk instead of building the sheet in memory
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Annotations")
+    sheet.append(COLUMNS)
+    for chunk in chunks:
+        for record in _records(chunk):
+            sheet.append([record.get(column) for column in COLUMNS])
+    workbook.save(path)
+
+
+def _write_parquet(chunks, path):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([(column, pa.int64() if column in INTEGER_COLUMNS
+                         else pa.float64() if column in TIME_COLUMNS else pa.string())
+                        for column in COLUMNS])
+    with pq.ParquetWriter(path, schema) as writer:
+        for chunk in chunks:
+            rows = list(_records(chunk))
+            columns = {column: [row.get(column) for row in rows] for column in COLUMNS}
+            writer.write_table(pa.Table.from_pydict(columns, schema=schema))
+
+
+WRITERS = {
+    "csv": _write_csv,
+    "xlsx": _write_xlsx,
+    "json": _write_json,
+    "jsonl": _write_jsonl,
+    "parquet": _write_parquet,
+}
+
+
+def _prune(export_dir, keep):
+    files = [os.path.join(export_dir, name) for name in os.listdir(export_dir)
+             if name.startswith("annotations_") and not name.endswith(".tmp")]
+    files.sort(key=os.path.getmtime, reverse=True)
+    for path in files[keep:]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def export_annotations(store, fmt, filters=None, export_dir=EXPORT_DIR, chunk_size=CHUNK_SIZE):
+    """Write (or reuse) an export of the current annotations and return its path
+
+    Args:
+        store: AnnotationStore to read from
+        fmt: one of FORMATS
+        filters: {column: [allowed values], "search": text} as accepted by AnnotationStore.iter_current
+    """
+    if fmt not in WRITERS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    os.makedirs(export_dir, exist_ok=True)
+
+    fingerprint = export_fingerprint(fmt, filters, store.data_version())
+    path = os.path.join(export_dir, f"annotations_{fingerprint}.{FORMATS[fmt]['extension']}")
+    if os.path.exists(path):
+        os.utime(path)  # keep recently used exports from being pruned
+        return path
+
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        WRITERS[fmt](store.iter_current(filters, chunk_size), tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    _prune(export_dir, MAX_CACHED_EXPORTS)
+    return path
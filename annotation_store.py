@@ -0,0 +1,508 @@
+"""Append-only SQLite store for saved annotations
+
+Every save of a (username, video_idx) pair appends one row to ``saves`` and
+its annotations to ``annotations``; the previous save of that pair is only
+marked as superseded. Rows are never rewritten, so:
+
+- a save costs O(annotations in that save), not O(all annotations),
+- the current state is the set of saves that have not been superseded,
+- any earlier point in time can be read back from the same tables, which
+  replaces the full-copy ``annotations_backup_<timestamp>.csv`` files.
+
+The database runs in WAL mode so the dashboard can read while annotators save.
+Superseded saves can be pruned with ``compact``.
+"""
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+import pandas as pd
+
+SAVE_FILE = "annotations.db"
+LEGACY_CSV_FILE = "annotations.csv"
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+# Attempts to take the write lock before a save gives up
+WRITE_RETRIES = 5
+
+# Column order of the exported/legacy annotations.csv
+COLUMNS = [
+    "timestamp", "username", "video_idx", "video_url", "video_title", "video_basic_info",
+    "annotation_order", "argument_type", "claim", "premise", "unclear", "person",
+    "time_start", "time_end",
+]
+# Video time (seconds) of the speaker turns the claim and premise came from,
+# for joining annotations with the video; empty when the subtitle has no timing
+TIME_COLUMNS = ("time_start", "time_end")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS saves (
+    save_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL,
+    video_idx INTEGER NOT NULL,
+    saved_at TEXT NOT NULL,
+    superseded_by INTEGER REFERENCES saves (save_id)
+);
+CREATE UNIQUE INDEX IF NOT EXISTS saves_current
+    ON saves (username, video_idx) WHERE superseded_by IS NULL;
+CREATE INDEX IF NOT EXISTS saves_by_key ON saves (username, video_idx, save_id);
+
+CREATE TABLE IF NOT EXISTS annotations (
+    save_id INTEGER NOT NULL REFERENCES saves (save_id),
+    timestamp TEXT,
+    username TEXT,
+    video_idx INTEGER,
+    video_url TEXT,
+    video_title TEXT,
+    video_basic_info TEXT,
+    annotation_order INTEGER,
+    argument_type TEXT,
+    claim TEXT,
+    premise TEXT,
+    unclear TEXT,
+    person TEXT,
+    time_start REAL,
+    time_end REAL
+);
+CREATE INDEX IF NOT EXISTS annotations_by_save ON annotations (save_id, annotation_order);
+-- Dashboard filters
+CREATE INDEX IF NOT EXISTS annotations_by_type ON annotations (argument_type, save_id);
+CREATE INDEX IF NOT EXISTS annotations_by_title ON annotations (video_title, save_id);
+
+-- Per-user progress, maintained on every save so resuming never scans the history
+CREATE TABLE IF NOT EXISTS user_progress (
+    username TEXT PRIMARY KEY,
+    last_video_idx INTEGER NOT NULL,
+    last_save_id INTEGER NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS completed_videos (
+    username TEXT NOT NULL,
+    video_idx INTEGER NOT NULL,
+    PRIMARY KEY (username, video_idx)
+);
+
+-- Current annotation counts per user / video / argument type / day, kept in
+-- step with every save so the dashboard never aggregates the raw rows
+CREATE TABLE IF NOT EXISTS counters (
+    dimension TEXT NOT NULL,
+    key TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (dimension, key)
+);
+"""
+
+# Full-text index over claim and premise for the dashboard search. It keeps its
+# own copy of the text keyed by (save_id, annotation_order), so VACUUM cannot
+# desynchronise it the way an external-content index on the implicit rowid could.
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE annotations_fts USING fts5(
+    claim, premise, save_id UNINDEXED, annotation_order UNINDEXED,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER annotations_fts_insert AFTER INSERT ON annotations BEGIN
+    INSERT INTO annotations_fts (claim, premise, save_id, annotation_order)
+    VALUES (new.claim, new.premise, new.save_id, new.annotation_order);
+END;
+INSERT INTO annotations_fts (claim, premise, save_id, annotation_order)
+    SELECT claim, premise, save_id, annotation_order FROM annotations;
+"""
+
+_SELECT_COLUMNS = ", ".join(f"a.{c}" for c in COLUMNS)
+
+# Columns the dashboard can filter on; filters may also carry a free-text "search"
+FILTER_COLUMNS = ("argument_type", "video_title")
+SEARCH_COLUMNS = ("claim", "premise")
+
+# Dashboard counter dimensions and the annotation value each one counts by
+COUNTER_DIMENSIONS = {
+    "user": lambda r: r["username"],
+    "video": lambda r: r["video_idx"],
+    "type": lambda r: r["argument_type"],
+    "day": lambda r: (r["timestamp"] or "")[:10],
+}
+
+
+def build_records(video_info, annotations_list, username, timestamp=None):
+    """Turn the session's annotation triplets into annotations.csv-style rows"""
+    timestamp = timestamp or datetime.now().strftime(TIMESTAMP_FORMAT)
+    records = []
+    for idx, anno in enumerate(annotations_list, start=1):
+        records.append({
+            "timestamp": timestamp,
+            "username": username,
+            "video_idx": video_info['original_idx'],
+            "video_url": video_info['url'],
+            "video_title": video_info['title'],
+            "video_basic_info": video_info['basic_info'],
+            "annotation_order": idx,
+            "argument_type": anno['type'],
+            "claim": anno['claim'],
+            "premise": anno['premise'],
+            "unclear": anno.get('unclear', ''),
+            "person": anno.get('person', ''),
+            "time_start": anno.get('time_start'),
+            "time_end": anno.get('time_end'),
+        })
+    return records
+
+
+class AnnotationStore:
+    """Transactional, append-only storage of annotation saves"""
+
+    def __init__(self, db_path=SAVE_FILE, legacy_csv=LEGACY_CSV_FILE):
+        self.db_path = db_path
+        # One connection per thread; Streamlit serves each session from its own thread
+        self._local = threading.local()
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        self._ensure_columns(conn)
+        self.has_fts = self._ensure_fts(conn)
+        if legacy_csv and os.path.exists(legacy_csv) and self.count_saves() == 0:
+            self.import_csv(legacy_csv)
+        if self.count_saves() and not conn.execute("SELECT 1 FROM user_progress LIMIT 1").fetchone():
+            self._backfill_progress()
+        if self.count_saves() and not conn.execute("SELECT 1 FROM counters LIMIT 1").fetchone():
+            self.rebuild_counters()
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # isolation_level=None: transactions are opened explicitly below
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _ensure_columns(conn):
+        """Add the time columns to an annotations table created before they existed"""
+        existing = {row[1] for row in conn.execute("PRAGMA table_info(annotations)")}
+        for column in TIME_COLUMNS:
+            if column in existing:
+                continue
+            try:
+                conn.execute(f"ALTER TABLE annotations ADD COLUMN {column} REAL")
+            except sqlite3.OperationalError as e:
+                if "duplicate column" not in str(e):  # another process added it first
+                    raise
+
+    @staticmethod
+    def _ensure_fts(conn):
+        """Create (and fill) the full-text index if SQLite has FTS5; False means search falls back to LIKE"""
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'annotations_fts'").fetchone():
+            return True
+        try:
+            # executescript commits first, so the index and its backfill are one transaction
+            conn.executescript(f"BEGIN IMMEDIATE; {FTS_SCHEMA} COMMIT;")
+        except sqlite3.OperationalError as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            if "already exists" in str(e):  # another process created it first
+                return True
+            if "fts5" in str(e):
+                return False
+            raise
+        return True
+
+    def close(self):
+        """Close this thread's connection"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def count_saves(self):
+        return self._connect().execute("SELECT COUNT(*) FROM saves").fetchone()[0]
+
+    def _write(self, operation):
+        """Run operation(conn) in an IMMEDIATE transaction, retrying if the database stays busy
+
+        IMMEDIATE takes SQLite's single write lock up front, so concurrent
+        saves from several sessions or app processes are serialised instead
+        of interleaving their read-modify-write steps. The connection
+        already waits up to ``timeout`` seconds for the lock; the retry loop
+        covers the rare case where that is not enough.
+        """
+        conn = self._connect()
+        for attempt in range(WRITE_RETRIES):
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+            except sqlite3.OperationalError as e:
+                if ("locked" not in str(e) and "busy" not in str(e)) or attempt == WRITE_RETRIES - 1:
+                    raise
+                time.sleep(0.05 * 2 ** attempt)
+                continue
+            try:
+                result = operation(conn)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            return result
+
+    @staticmethod
+    def _append_save(conn, username, video_idx, records):
+        """Append one save and supersede the current one; caller holds the write transaction"""
+        saved_at = records[0]["timestamp"] if records else datetime.now().strftime(TIMESTAMP_FORMAT)
+        previous = conn.execute(
+            "SELECT save_id FROM saves WHERE username = ? AND video_idx = ? AND superseded_by IS NULL",
+            (username, video_idx)).fetchone()
+        deltas = Counter()
+        if previous:
+            # Released first so the partial unique index allows the new current save
+            conn.execute("UPDATE saves SET superseded_by = -1 WHERE save_id = ?", (previous[0],))
+            rows = conn.execute(
+                "SELECT username, video_idx, argument_type, timestamp FROM annotations WHERE save_id = ?",
+                (previous[0],)).fetchall()
+            AnnotationStore._count(deltas, [dict(zip(("username", "video_idx", "argument_type", "timestamp"), row))
+                                            for row in rows], -1)
+        save_id = conn.execute(
+            "INSERT INTO saves (username, video_idx, saved_at) VALUES (?, ?, ?)",
+            (username, video_idx, saved_at)).lastrowid
+        if previous:
+            conn.execute("UPDATE saves SET superseded_by = ? WHERE save_id = ?", (save_id, previous[0]))
+        conn.executemany(
+            f"INSERT INTO annotations (save_id, {', '.join(COLUMNS)}) "
+            f"VALUES (?, {', '.join('?' for _ in COLUMNS)})",
+            [(save_id, *(record.get(c) for c in COLUMNS)) for record in records])
+        AnnotationStore._count(deltas, records, +1)
+        AnnotationStore._apply_counters(conn, deltas)
+        AnnotationStore._update_progress(conn, username, video_idx, save_id, saved_at, bool(records))
+        return save_id
+
+    @staticmethod
+    def _count(deltas, records, sign):
+        for record in records:
+            for dimension, key_of in COUNTER_DIMENSIONS.items():
+                key = key_of(record)
+                deltas[dimension, "" if key is None else str(key)] += sign
+
+    @staticmethod
+    def _apply_counters(conn, deltas):
+        changes = [(dimension, key, delta) for (dimension, key), delta in deltas.items() if delta]
+        conn.executemany(
+            "INSERT INTO counters (dimension, key, count) VALUES (?, ?, ?) "
+            "ON CONFLICT (dimension, key) DO UPDATE SET count = count + excluded.count",
+            changes)
+        conn.executemany("DELETE FROM counters WHERE dimension = ? AND key = ? AND count <= 0",
+                         [(dimension, key) for dimension, key, _ in changes])
+
+    @staticmethod
+    def _update_progress(conn, username, video_idx, save_id, saved_at, completed):
+        conn.execute(
+            "INSERT INTO user_progress (username, last_video_idx, last_save_id, updated_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (username) DO UPDATE SET last_video_idx = excluded.last_video_idx, "
+            "last_save_id = excluded.last_save_id, updated_at = excluded.updated_at",
+            (username, video_idx, save_id, saved_at))
+        if completed:
+            conn.execute("INSERT OR IGNORE INTO completed_videos (username, video_idx) VALUES (?, ?)",
+                         (username, video_idx))
+        else:
+            conn.execute("DELETE FROM completed_videos WHERE username = ? AND video_idx = ?",
+                         (username, video_idx))
+
+    def _backfill_progress(self):
+        """Build the progress tables for a store created before they existed"""
+        def operation(conn):
+            if conn.execute("SELECT 1 FROM user_progress LIMIT 1").fetchone():
+                return
+            current = conn.execute(
+                "SELECT s.save_id, s.username, s.video_idx, s.saved_at, "
+                "EXISTS (SELECT 1 FROM annotations a WHERE a.save_id = s.save_id) "
+                "FROM saves s WHERE s.superseded_by IS NULL ORDER BY s.save_id").fetchall()
+            for save_id, username, video_idx, saved_at, completed in current:
+                self._update_progress(conn, username, video_idx, save_id, saved_at, completed)
+        self._write(operation)
+
+    def rebuild_counters(self):
+        """Recompute the dashboard counters from the current annotations"""
+        def operation(conn):
+            conn.execute("DELETE FROM counters")
+            rows = conn.execute(
+                "SELECT a.username, a.video_idx, a.argument_type, a.timestamp FROM annotations a "
+                "JOIN saves s ON s.save_id = a.save_id WHERE s.superseded_by IS NULL").fetchall()
+            deltas = Counter()
+            self._count(deltas, [dict(zip(("username", "video_idx", "argument_type", "timestamp"), row))
+                                 for row in rows], +1)
+            self._apply_counters(conn, deltas)
+        self._write(operation)
+
+    def counters(self):
+        """{dimension: {key: count}} of the current annotations"""
+        result = {dimension: {} for dimension in COUNTER_DIMENSIONS}
+        for dimension, key, count in self._connect().execute("SELECT dimension, key, count FROM counters"):
+            result.setdefault(dimension, {})[key] = count
+        return result
+
+    def data_version(self):
+        """Changes whenever a save is made; used to key caches of derived data"""
+        return self._connect().execute("SELECT COALESCE(MAX(save_id), 0) FROM saves").fetchone()[0]
+
+    def replace_annotations(self, username, video_idx, records):
+        """Make records the current annotations of (username, video_idx)
+
+        Appends a new save and supersedes the previous one in one transaction.
+        Returns the new save_id.
+        """
+        return self._write(lambda conn: self._append_save(conn, username, video_idx, records))
+
+    def current_frame(self):
+        """All current annotations as a DataFrame with the annotations.csv columns"""
+        return pd.read_sql_query(
+            f"SELECT {_SELECT_COLUMNS} FROM annotations a JOIN saves s ON s.save_id = a.save_id "
+            f"WHERE s.superseded_by IS NULL ORDER BY a.save_id, a.annotation_order",
+            self._connect())
+
+    @staticmethod
+    def _search_terms(search):
+        return [term for term in (search or "").split() if term]
+
+    def _filter_clause(self, filters):
+        """SQL condition over current annotations for {column: [allowed values]} filters
+
+        A "search" entry keeps rows whose claim or premise contains every
+        search term (as a word prefix when the full-text index is available).
+        """
+        filters = filters or {}
+        clauses, params = ["s.superseded_by IS NULL"], []
+        for column in FILTER_COLUMNS:
+            values = filters.get(column)
+            if values:
+                clauses.append(f"a.{column} IN ({', '.join('?' for _ in values)})")
+                params.extend(values)
+
+        terms = self._search_terms(filters.get("search"))
+        if terms and self.has_fts:
+            # Quoted terms, so user input is never parsed as FTS query syntax
+            query = " ".join('"{}"*'.format(term.replace('"', '""')) for term in terms)
+            clauses.append("(a.save_id, a.annotation_order) IN ("
+                           "SELECT save_id, annotation_order FROM annotations_fts WHERE annotations_fts MATCH ?)")
+            params.append(query)
+        else:
+            for term in terms:
+                pattern = "%" + term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+                clauses.append("(" + " OR ".join(f"a.{column} LIKE ? ESCAPE '\\'" for column in SEARCH_COLUMNS) + ")")
+                params.extend([pattern] * len(SEARCH_COLUMNS))
+        return " AND ".join(clauses), params
+
+    def iter_current(self, filters=None, chunk_size=5000):
+        """Yield the current annotations matching filters as DataFrame chunks
+
+        Rows are streamed from a cursor, so the full result is never held in memory.
+        """
+        where, params = self._filter_clause(filters)
+        yield from pd.read_sql_query(
+            f"SELECT {_SELECT_COLUMNS} FROM annotations a JOIN saves s ON s.save_id = a.save_id "
+            f"WHERE {where} ORDER BY a.save_id, a.annotation_order",
+            self._connect(), params=params, chunksize=chunk_size)
+
+    def count_current(self, filters=None):
+        """Number of current annotations matching filters"""
+        where, params = self._filter_clause(filters)
+        return self._connect().execute(
+            f"SELECT COUNT(*) FROM annotations a JOIN saves s ON s.save_id = a.save_id WHERE {where}",
+            params).fetchone()[0]
+
+    def current_page(self, filters=None, page=0, page_size=50):
+        """One page (0-based) of the current annotations matching filters, in save order"""
+        where, params = self._filter_clause(filters)
+        return pd.read_sql_query(
+            f"SELECT {_SELECT_COLUMNS} FROM annotations a JOIN saves s ON s.save_id = a.save_id "
+            f"WHERE {where} ORDER BY a.save_id, a.annotation_order LIMIT ? OFFSET ?",
+            self._connect(), params=[*params, page_size, page * page_size])
+
+    def distinct_values(self, column):
+        """Sorted distinct values of a filter column among the current annotations"""
+        if column not in FILTER_COLUMNS:
+            raise ValueError(f"Not a filter column: {column}")
+        rows = self._connect().execute(
+            f"SELECT DISTINCT a.{column} FROM annotations a JOIN saves s ON s.save_id = a.save_id "
+            f"WHERE s.superseded_by IS NULL AND a.{column} IS NOT NULL ORDER BY a.{column}").fetchall()
+        return [row[0] for row in rows]
+
+    def snapshot_frame(self, as_of):
+        """Annotations as they were at a point in time
+
+        Args:
+            as_of: a "%Y-%m-%d %H:%M:%S" timestamp or a save_id
+        """
+        condition = "save_id <= ?" if isinstance(as_of, int) else "saved_at <= ?"
+        return pd.read_sql_query(
+            f"SELECT {_SELECT_COLUMNS} FROM annotations a WHERE a.save_id IN ("
+            f"  SELECT MAX(save_id) FROM saves WHERE {condition} GROUP BY username, video_idx"
+            f") ORDER BY a.save_id, a.annotation_order",
+            self._connect(), params=(as_of,))
+
+    def export_snapshot(self, path, as_of=None):
+        """Write the current (or a past) state to a CSV file"""
+        df = self.current_frame() if as_of is None else self.snapshot_frame(as_of)
+        df.to_csv(path, index=False)
+        return len(df)
+
+    def last_saved_video(self, username):
+        """video_idx of the user's most recently saved video, or None"""
+        row = self._connect().execute(
+            "SELECT last_video_idx FROM user_progress WHERE username = ?", (username,)).fetchone()
+        return row[0] if row else None
+
+    def completed_videos(self, username):
+        """Set of video_idx the user has saved annotations for"""
+        rows = self._connect().execute(
+            "SELECT video_idx FROM completed_videos WHERE username = ?", (username,)).fetchall()
+        return {row[0] for row in rows}
+
+    def compact(self, before):
+        """Drop saves superseded before a timestamp; snapshots older than that become approximate"""
+        def operation(conn):
+            stale = "SELECT s.save_id FROM saves s JOIN saves n ON n.save_id = s.superseded_by WHERE n.saved_at < ?"
+            conn.execute(f"DELETE FROM annotations WHERE save_id IN ({stale})", (before,))
+            if self.has_fts:
+                conn.execute(f"DELETE FROM annotations_fts WHERE save_id IN ({stale})", (before,))
+            return conn.execute(f"DELETE FROM saves WHERE save_id IN ({stale})", (before,)).rowcount
+        return self._write(operation)
+
+    def import_csv(self, csv_path):
+        """Load a legacy annotations.csv, one save per (username, video_idx)
+
+        Runs as a single transaction that only imports into an empty store,
+        so app processes starting at the same time import it exactly once.
+        """
+        # Read as text so "N/A" labels and person numbers survive unchanged
+        df = pd.read_csv(csv_path, dtype=str, keep_default_na=False)
+
+        def operation(conn):
+            if conn.execute("SELECT COUNT(*) FROM saves").fetchone()[0]:
+                return 0
+            groups = df.groupby(["username", "video_idx"], sort=False)
+            for (username, video_idx), group in groups:
+                records = group.reindex(columns=COLUMNS, fill_value="").to_dict("records")
+                for record in records:
+                    for column in TIME_COLUMNS:
+                        record[column] = float(record[column]) if record[column] else None
+                self._append_save(conn, username, int(video_idx), records)
+            return len(groups)
+        return self._write(operation)
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Snapshot or compact the annotation store")
+    parser.add_argument('--db', default=SAVE_FILE)
+    sub = parser.add_subparsers(dest='command', required=True)
+    snap = sub.add_parser('snapshot', help='write the current or a past state to CSV')
+    snap.add_argument('output')
+    snap.add_argument('--as-of', help='"YYYY-MM-DD HH:MM:SS" timestamp (default: now)')
+    comp = sub.add_parser('compact', help='drop saves superseded before a timestamp')
+    comp.add_argument('before', help='"YYYY-MM-DD HH:MM:SS" timestamp')
+    args = parser.parse_args()
+
+    store = AnnotationStore(args.db)
+    if args.command == 'snapshot':
+        count = store.export_snapshot(args.output, args.as_of)
+        print(f"✓ Wrote {count} annotation(s) to {args.output}")
+    else:
+        print(f"✓ Removed {store.compact(args.before)} superseded save(s)")
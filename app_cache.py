@@ -0,0 +1,120 @@
+"""In-process LRU caches for the annotation app, invalidated by file mtimes
+
+Streamlit re-executes the page script on every widget interaction, but
+imported modules stay loaded, so caches defined here survive reruns and are
+shared by all sessions. Each entry remembers the (mtime, size) of the files
+it was loaded from and is reloaded when any of them changes. Files are
+re-stat'ed at most once per ``check_interval`` seconds, so repeated reruns
+within that window are served without touching the disk.
+"""
+import functools
+import os
+import threading
+import time
+from collections import OrderedDict
+
+_REGISTRY = {}
+
+
+def _file_stamp(paths):
+    stamp = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            stamp.append((path, st.st_mtime_ns, st.st_size))
+        except FileNotFoundError:
+            stamp.append((path, None, None))
+    return tuple(stamp)
+
+
+class MtimeLRUCache:
+    """Bounded LRU cache whose entries depend on files on disk"""
+
+    def __init__(self, name, maxsize=128, check_interval=2.0):
+        self.name = name
+        self.maxsize = maxsize
+        self.check_interval = check_interval
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()  # key -> (stamp, checked_at, value)
+        self._lock = threading.RLock()
+        _REGISTRY[name] = self
+
+    def get(self, key, paths, loader):
+        """Return the cached value for key, calling loader() if missing or stale"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stamp, checked_at, value = entry
+                if now - checked_at < self.check_interval:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                current = _file_stamp(paths)
+                if current == stamp:
+                    self._entries[key] = (stamp, now, value)
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                self.invalidations += 1
+                del self._entries[key]
+            self.misses += 1
+
+        # Load outside the lock so one slow file does not block other sessions
+        stamp = _file_stamp(paths)
+        value = loader()
+        with self._lock:
+            self._entries[key] = (stamp, now, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "cache": self.name,
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+                "entries": len(self._entries),
+                "maxsize": self.maxsize,
+            }
+
+
+def mtime_cached(name, depends_on, maxsize=128, check_interval=2.0):
+    """Decorator caching a function by its arguments and the mtimes of depends_on(*args)
+
+    Arguments must be hashable. The wrapped function gets a ``cache``
+    attribute with the underlying MtimeLRUCache. Caches are looked up by
+    name, so a Streamlit page that re-runs the decorator on every rerun keeps
+    using the same cache.
+    """
+    def decorator(func):
+        cache = _REGISTRY.get(name) or MtimeLRUCache(name, maxsize, check_interval)
+
+        @functools.wraps(func)
+        def wrapper(*args):
+            return cache.get(args, depends_on(*args), lambda: func(*args))
+
+        wrapper.cache = cache
+        return wrapper
+    return decorator
+
+
+def cache_stats():
+    """Hit/miss counters of every cache, for the Admin Dashboard"""
+    return [cache.stats() for cache in _REGISTRY.values()]
+
+
+def clear_caches():
+    for cache in _REGISTRY.values():
+        cache.clear()
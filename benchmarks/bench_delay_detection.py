@@ -0,0 +1,116 @@
+"""Compare the legacy delay detection with the batched NumPy matcher
+
+Runs detect_delay_first_match and the nested-loop implementation it replaced
+over every episode with a subtitles/{idx}_old.vtt and a
+transcripts/transcription_{idx}.txt, and prints the time spent in each.
+
+The legacy loop truncated the transcript candidates in place, so every
+caption was compared with prefixes cut to the shortest caption seen so far.
+The new matcher cuts each pair independently. Its delays must equal the
+legacy loop run without that side effect; episodes where the original,
+mutating loop picked a different delay are listed for review.
+
+Usage:
+    python benchmarks/bench_delay_detection.py [--limit N]
+"""
+import argparse
+import contextlib
+import io
+import re
+import sys
+import time
+
+# common puts the repository root on sys.path
+from common import load_corpus
+from merge_subtitle import (detect_delay_first_match, is_background_sound, normalize_text, parse_transcript_time,
+                            parse_vtt, text_similarity_bidirectional)
+
+
+def legacy_detect_delay(vtt_segments, transcript_content, mutate=True):
+    """The nested-loop implementation, with or without its in-place truncation"""
+    TIME_WINDOW = 20
+    pattern = r'(Person\d+)\s*\[(\d+:\d+:\d+)\s*-\s*(\d+:\d+:\d+)\]:\s*\n(.*?)(?=\nPerson\d+\s*\[|\Z)'
+    matches = re.findall(pattern, transcript_content, flags=re.DOTALL)
+
+    transcript_data = []
+    for person, start_str, end_str, speech in matches:
+        start = parse_transcript_time(start_str)
+        if start > TIME_WINDOW:
+            break
+        speech_clean = " ".join(speech.strip().split())
+        if len(speech_clean) > 20:
+            transcript_data.append({'text': normalize_text(speech_clean), 'start': start, 'person': person})
+
+    for vtt_seg in vtt_segments:
+        if vtt_seg.start > TIME_WINDOW:
+            break
+        if is_background_sound(vtt_seg.text):
+            continue
+        vtt_norm = normalize_text(vtt_seg.text)
+        if len(vtt_norm) < 10:
+            continue
+
+        best_similarity = 0
+        best_trans = None
+        for trans in transcript_data:
+            if mutate:
+                trans['text'] = trans['text'][:len(vtt_norm)]
+                text = trans['text']
+            else:
+                text = trans['text'][:len(vtt_norm)]
+            similarity = text_similarity_bidirectional(vtt_norm, text)
+            if similarity > best_similarity:
+                best_similarity = similarity
+                best_trans = trans
+
+        if best_similarity > 0.4 and best_trans:
+            delay = vtt_seg.start - best_trans['start']
+            if 0 < delay < 15:
+                return round(delay, 1)
+    return 1.0
+
+
+def load_episodes(limit=None):
+    """(idx, caption cues, transcript text) of every episode with both files"""
+    return [(episode['idx'], parse_vtt(episode['vtt_old']), episode['transcript']) for episode in load_corpus(limit)]
+
+
+def timed(detect, episodes):
+    t0 = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        delays = [detect(segments, content) for _, segments, content in episodes]
+    return delays, time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--limit', type=int, default=None, help='only use the first N episodes')
+    args = parser.parse_args()
+
+    episodes = load_episodes(args.limit)
+    print(f"Episodes: {len(episodes)}")
+
+    legacy, t_legacy = timed(legacy_detect_delay, episodes)
+    fixed, t_fixed = timed(lambda segments, content: legacy_detect_delay(segments, content, mutate=False), episodes)
+    batched, t_batched = timed(detect_delay_first_match, episodes)
+
+    print(f"legacy nested loop:       {t_legacy:8.3f}s")
+    print(f"legacy, no truncation:    {t_fixed:8.3f}s")
+    print(f"batched NumPy matcher:    {t_batched:8.3f}s")
+    if t_batched > 0:
+        print(f"speedup: {t_legacy / t_batched:.1f}x")
+
+    changed = [(idx, a, b) for (idx, _, _), a, b in zip(episodes, legacy, batched) if a != b]
+    for idx, a, b in changed:
+        print(f"   episode {idx}: legacy delay {a}s -> {b}s (legacy truncation side effect)")
+    print(f"{len(episodes) - len(changed)}/{len(episodes)} episodes keep the legacy delay")
+
+    mismatches = [idx for (idx, _, _), a, b in zip(episodes, fixed, batched) if a != b]
+    if mismatches:
+        print(f"❌ Batched delays differ from the non-mutating loop for episodes: {mismatches}")
+        sys.exit(1)
+    print("✓ Identical delays to the non-mutating loop")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""Throughput and memory benchmark of the subtitle/transcript pipeline stages
+
+Runs each stage over every episode with a subtitles/{idx}_old.vtt and a
+transcripts/transcription_{idx}.txt:
+
+    parse_vtt             merge_subtitle.parse_vtt on the original captions
+    parse_transcript      merge_subtitle.parse_transcript
+    detect_delay          merge_subtitle.detect_delay_first_match
+    find_speaker          SpeakerTimeline lookups for every cue
+    combine_files         the whole merge step, reading and writing files
+    fix_broken_sentences  subtitle_processing.fix_broken_sentences on {idx}.vtt
+
+Inputs are read into memory first, so apart from combine_files the stages
+are timed without disk I/O. Each stage reports the best of --repeat runs as
+episodes/s and cues/s (caption cues of the episodes processed), and its peak
+traced memory from a separate tracemalloc run, which would otherwise slow
+the timed runs down.
+
+Results can be saved as a named baseline and later runs compared with it:
+
+    python benchmarks/bench_pipeline.py --save-baseline before
+    python benchmarks/bench_pipeline.py --compare before [--tolerance 0.15]
+
+Comparing exits with status 1 if any stage got slower than the tolerance.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+# common puts the repository root on sys.path
+from common import ROOT, load_corpus
+from merge_subtitle import SpeakerTimeline, combine_files, detect_delay_first_match, parse_transcript, parse_vtt
+from subtitle_processing import fix_broken_sentences
+
+BASELINE_DIR = os.path.join(ROOT, 'benchmarks', 'baselines')
+
+
+def load_episodes(limit=None):
+    """Raw inputs and parsed cues/turns of every episode with captions and a transcript"""
+    episodes = load_corpus(limit)
+    for episode in episodes:
+        episode['cues'] = parse_vtt(episode['vtt_old'])
+        episode['speakers'] = parse_transcript(episode['transcript'])
+        with contextlib.redirect_stdout(io.StringIO()):
+            episode['delay'] = detect_delay_first_match(episode['cues'], episode['transcript'])
+    return episodes
+
+
+def stage_parse_vtt(episodes, _):
+    for episode in episodes:
+        parse_vtt(episode['vtt_old'])
+
+
+def stage_parse_transcript(episodes, _):
+    for episode in episodes:
+        parse_transcript(episode['transcript'])
+
+
+def stage_detect_delay(episodes, _):
+    with contextlib.redirect_stdout(io.StringIO()):
+        for episode in episodes:
+            detect_delay_first_match(episode['cues'], episode['transcript'])
+
+
+def stage_find_speaker(episodes, _):
+    for episode in episodes:
+        timeline = SpeakerTimeline(episode['speakers'])
+        for cue in episode['cues']:
+            timeline.find_speaker(cue, delay=episode['delay'])
+
+
+def stage_combine_files(episodes, out_dir):
+    with contextlib.redirect_stdout(io.StringIO()):
+        for episode in episodes:
+            combine_files(os.path.join(out_dir, f"{episode['idx']}.vtt"),
+                          episode['paths']['transcript'], episode['paths']['vtt_old'])
+
+
+def stage_fix_broken_sentences(episodes, _):
+    for episode in episodes:
+        if 'merged' in episode:
+            fix_broken_sentences(episode['merged'])
+
+
+STAGES = {
+    'parse_vtt': stage_parse_vtt,
+    'parse_transcript': stage_parse_transcript,
+    'detect_delay': stage_detect_delay,
+    'find_speaker': stage_find_speaker,
+    'combine_files': stage_combine_files,
+    'fix_broken_sentences': stage_fix_broken_sentences,
+}
+
+
+def measure(stage, episodes, repeat, memory):
+    """Best wall time over repeat runs and, optionally, peak traced memory of one run"""
+    with tempfile.TemporaryDirectory() as out_dir:
+        best = float('inf')
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            stage(episodes, out_dir)
+            best = min(best, time.perf_counter() - t0)
+
+        peak = None
+        if memory:
+            tracemalloc.start()
+            try:
+                stage(episodes, out_dir)
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+    return best, peak
+
+
+def run(stage_names, episodes, repeat, memory):
+    n_cues = sum(len(episode['cues']) for episode in episodes)
+    results = {}
+    for name in stage_names:
+        seconds, peak = measure(STAGES[name], episodes, repeat, memory)
+        results[name] = {
+            'seconds': round(seconds, 4),
+            'episodes_per_s': round(len(episodes) / seconds, 1) if seconds else None,
+            'cues_per_s': round(n_cues / seconds) if seconds else None,
+            'peak_mb': round(peak / 1e6, 2) if peak is not None else None,
+        }
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Print per-stage changes against a baseline; return the stages that regressed
+
+    Stages are compared by cues/s, so runs over different --limit values
+    remain comparable.
+    """
+    regressions = []
+    for name, current in results.items():
+        before = baseline['stages'].get(name)
+        if not before or not before['cues_per_s'] or not current['cues_per_s']:
+            print(f"   {name:22s} (not in baseline)")
+            continue
+        slowdown = before['cues_per_s'] / current['cues_per_s'] - 1
+        flag = ''
+        if slowdown > tolerance:
+            flag = '  ❌ slower'
+            regressions.append(name)
+        elif slowdown < -tolerance:
+            flag = '  ✓ faster'
+        line = (f"   {name:22s} {before['cues_per_s']:>9} -> {current['cues_per_s']:>9} cues/s  "
+                f"time {slowdown:+7.1%}")
+        if current['peak_mb'] is not None and before.get('peak_mb') is not None:
+            line += f"   peak {before['peak_mb']:.1f} -> {current['peak_mb']:.1f} MB"
+        print(line + flag)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--stages', nargs='+', choices=list(STAGES), default=list(STAGES),
+                        help='stages to run (default: all)')
+    parser.add_argument('--limit', type=int, default=None, help='only use the first N episodes')
+    parser.add_argument('--repeat', type=int, default=3, help='report the best of N runs')
+    parser.add_argument('--no-memory', action='store_true', help='skip the tracemalloc run')
+    parser.add_argument('--save-baseline', metavar='NAME', help=f'save results to {BASELINE_DIR}/NAME.json')
+    parser.add_argument('--compare', metavar='NAME', help='compare with a saved baseline')
+    parser.add_argument('--tolerance', type=float, default=0.15,
+                        help='relative slowdown reported as a regression (default: 0.15)')
+    args = parser.parse_args()
+
+    episodes = load_episodes(args.limit)
+    n_cues = sum(len(episode['cues']) for episode in episodes)
+    print(f"Episodes: {len(episodes)}, cues: {n_cues}")
+
+    results = run(args.stages, episodes, args.repeat, not args.no_memory)
+    for name, r in results.items():
+        peak = f"{r['peak_mb']:8.1f} MB peak" if r['peak_mb'] is not None else ''
+        print(f"{name:22s} {r['seconds']:8.3f}s  {r['episodes_per_s']:8.1f} episodes/s  "
+              f"{r['cues_per_s']:>9} cues/s  {peak}")
+
+    if args.save_baseline:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        path = os.path.join(BASELINE_DIR, f'{args.save_baseline}.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'created': datetime.now().isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'machine': platform.platform(),
+                'episodes': len(episodes),
+                'cues': n_cues,
+                'repeat': args.repeat,
+                'stages': results,
+            }, f, indent=2)
+        print(f"✓ Saved baseline to {path}")
+
+    if args.compare:
+        with open(os.path.join(BASELINE_DIR, f'{args.compare}.json'), 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline['episodes'] != len(episodes):
+            print(f"⚠ Baseline used {baseline['episodes']} episodes, this run {len(episodes)}")
+        print(f"Compared with baseline '{args.compare}' ({baseline['created']}):")
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"❌ Slower than baseline: {', '.join(regressions)}")
+            sys.exit(1)
+        print("✓ No regressions")
+
+
+if __name__ == "__main__":
+    main()
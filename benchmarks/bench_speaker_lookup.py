@@ -0,0 +1,61 @@
+"""Compare the linear find_speaker scan with the SpeakerTimeline index
+
+Runs both lookups over every episode that has a subtitles/{idx}_old.vtt and a
+transcripts/transcription_{idx}.txt, checks that they assign the same speaker
+to every segment, and prints the time spent in each.
+
+Usage:
+    python benchmarks/bench_speaker_lookup.py [--delay 1.0] [--limit N]
+"""
+import argparse
+import sys
+import time
+
+# common puts the repository root on sys.path
+from common import load_corpus
+from merge_subtitle import SpeakerTimeline, find_speaker, parse_transcript, parse_vtt
+
+
+def load_episodes(limit=None):
+    """(idx, caption cues, transcript turns) of every episode with both an old VTT and a transcript"""
+    return [(episode['idx'], parse_vtt(episode['vtt_old']), parse_transcript(episode['transcript']))
+            for episode in load_corpus(limit)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--delay', type=float, default=1.0, help='caption delay applied to every lookup')
+    parser.add_argument('--limit', type=int, default=None, help='only use the first N episodes')
+    args = parser.parse_args()
+
+    episodes = load_episodes(args.limit)
+    n_segments = sum(len(segments) for _, segments, _ in episodes)
+    n_turns = sum(len(speakers) for _, _, speakers in episodes)
+    print(f"Episodes: {len(episodes)}, segments: {n_segments}, speaker turns: {n_turns}")
+
+    t0 = time.perf_counter()
+    linear = [[find_speaker(seg, speakers, delay=args.delay) for seg in segments]
+              for _, segments, speakers in episodes]
+    t_linear = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    indexed = []
+    for _, segments, speakers in episodes:
+        timeline = SpeakerTimeline(speakers)
+        indexed.append([timeline.find_speaker(seg, delay=args.delay) for seg in segments])
+    t_indexed = time.perf_counter() - t0
+
+    mismatches = [idx for (idx, _, _), a, b in zip(episodes, linear, indexed) if a != b]
+
+    print(f"linear  find_speaker:  {t_linear:8.3f}s")
+    print(f"indexed SpeakerTimeline: {t_indexed:6.3f}s (including index build)")
+    if t_indexed > 0:
+        print(f"speedup: {t_linear / t_indexed:.1f}x")
+    if mismatches:
+        print(f"❌ Results differ for episodes: {mismatches}")
+        sys.exit(1)
+    print("✓ Identical speaker assignments")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""Microbenchmark for the shared streaming VTT parser
+
+Parses every .vtt file in subtitles/ with the previous whole-file readers
+(merge_subtitle.parse_vtt and video_annotation_new.load_vtt_with_time as they
+were before vtt_parser) and with vtt_parser.iter_cues, checks that the cues
+from the original caption files are identical, and prints MB/s for each.
+
+Usage:
+    python benchmarks/bench_vtt_parser.py [--pattern "*_old.vtt"] [--repeat 3]
+"""
+import argparse
+import glob
+import os
+import re
+import sys
+import time
+
+# common puts the repository root on sys.path
+from common import SUBTITLE_DIR
+from vtt_parser import iter_cues, parse_vtt_time
+
+
+def legacy_parse_vtt(vtt_content):
+    """merge_subtitle.parse_vtt before the shared parser"""
+    segments = []
+    lines = vtt_content.strip().split('\n')
+    i = 0
+    while i < len(lines):
+        line = lines[i].strip()
+        if line == 'WEBVTT' or line == '' or line.isdigit():
+            i += 1
+            continue
+        if '-->' in line:
+            times = line.split('-->')
+            start = parse_vtt_time(times[0])
+            end = parse_vtt_time(times[1])
+            text_lines = []
+            i += 1
+            while i < len(lines) and lines[i].strip() != '':
+                text = re.sub(r'<font[^>]*>', '', lines[i])
+                text = re.sub(r'</font>', '', text)
+                text = text.strip()
+                if text:
+                    text_lines.append(text)
+                i += 1
+            if text_lines:
+                segments.append({'start': start, 'end': end, 'text': ' '.join(text_lines)})
+        else:
+            i += 1
+    return segments
+
+
+def legacy_load_vtt_with_time(file_path):
+    """video_annotation_new.load_vtt_with_time before the shared parser"""
+    with open(file_path, "r", encoding="utf-8") as f:
+        lines = f.readlines()
+    subtitles = []
+    buffer = []
+    current_time = ""
+    for line in lines:
+        line = line.strip()
+        if line.isdigit():
+            if buffer and current_time:
+                subtitles.append({"time": current_time, "text": ' '.join(buffer).strip()})
+                buffer = []
+                current_time = ""
+        elif "-->" in line:
+            current_time = line
+        elif line:
+            buffer.append(line)
+    if buffer and current_time:
+        subtitles.append({"time": current_time, "text": ' '.join(buffer).strip()})
+    return subtitles
+
+
+def run_legacy_parse_vtt(paths):
+    count = 0
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            try:
+                count += len(legacy_parse_vtt(f.read()))
+            except ValueError:
+                # Merged speaker files with "-->" in running text crash the old parser
+                pass
+    return count
+
+
+def run_legacy_load_vtt_with_time(paths):
+    return sum(len(legacy_load_vtt_with_time(path)) for path in paths)
+
+
+def run_iter_cues(paths):
+    count = 0
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            for _ in iter_cues(f):
+                count += 1
+    return count
+
+
+def timed(func, paths, repeat):
+    best = float('inf')
+    count = 0
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        count = func(paths)
+        best = min(best, time.perf_counter() - t0)
+    return best, count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pattern', default='*.vtt', help='glob inside subtitles/ (default: every .vtt)')
+    parser.add_argument('--repeat', type=int, default=3, help='report the best of N runs')
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(SUBTITLE_DIR, args.pattern)))
+    megabytes = sum(os.path.getsize(p) for p in paths) / 1e6
+    print(f"Files: {len(paths)}, {megabytes:.1f} MB")
+
+    for name, func in [('legacy parse_vtt', run_legacy_parse_vtt),
+                       ('legacy load_vtt_with_time', run_legacy_load_vtt_with_time),
+                       ('vtt_parser.iter_cues', run_iter_cues)]:
+        seconds, count = timed(func, paths, args.repeat)
+        print(f"{name:28s} {seconds:7.3f}s  {megabytes / seconds:7.1f} MB/s  {count} cues")
+
+    mismatches = []
+    for path in glob.glob(os.path.join(SUBTITLE_DIR, '*_old.vtt')):
+        with open(path, 'r', encoding='utf-8') as f:
+            expected = [(s['start'], s['end'], s['text']) for s in legacy_parse_vtt(f.read())]
+        with open(path, 'r', encoding='utf-8') as f:
+            if [tuple(cue) for cue in iter_cues(f)] != expected:
+                mismatches.append(os.path.basename(path))
+    if mismatches:
+        print(f"❌ Cues differ from legacy parse_vtt for: {sorted(mismatches)}")
+        sys.exit(1)
+    print("✓ iter_cues matches legacy parse_vtt on every *_old.vtt")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+"""Corpus loading shared by the benchmarks
+
+Importing this module puts the repository root on sys.path, so the
+benchmarks can import the pipeline modules when run as
+``python benchmarks/bench_*.py``.
+"""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from merge_subtitle import episode_paths, resolve_episodes  # noqa: E402
+
+SUBTITLE_DIR = os.path.join(ROOT, 'subtitles')
+TRANSCRIPT_DIR = os.path.join(ROOT, 'transcripts')
+
+
+def load_corpus(limit=None):
+    """Raw files of every episode with both an old VTT and a transcript
+
+    Returns one dict per episode, in episode order, with 'idx', 'paths' and
+    the text of 'vtt_old', 'transcript' and, where it exists, 'merged'.
+    """
+    episodes = []
+    for idx in resolve_episodes([], TRANSCRIPT_DIR):
+        merged, vtt_old, transcript = episode_paths(idx, SUBTITLE_DIR, TRANSCRIPT_DIR)
+        paths = {'vtt_old': vtt_old, 'transcript': transcript, 'merged': merged}
+        if not (os.path.exists(vtt_old) and os.path.exists(transcript)):
+            continue
+        episode = {'idx': idx, 'paths': paths}
+        for key, path in paths.items():
+            if os.path.exists(path):
+                with open(path, 'r', encoding='utf-8') as f:
+                    episode[key] = f.read()
+        episodes.append(episode)
+        if limit and len(episodes) >= limit:
+            break
+    return episodes
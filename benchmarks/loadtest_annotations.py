@@ -0,0 +1,141 @@
+"""Load test for concurrent annotation saves
+
+Simulates N annotator sessions saving at the same time through the same code
+path as the app's save_annotation (annotation_store.build_records and
+AnnotationStore.replace_annotations). Sessions run as threads, like Streamlit
+sessions inside one server, or as processes, like several app instances
+sharing the database. At the end the store is checked against the last save
+each session made for every (username, video) pair, so any lost or
+interleaved rows are reported.
+
+Usage:
+    python benchmarks/loadtest_annotations.py [--sessions 8] [--saves 200] [--mode threads|processes]
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from annotation_store import AnnotationStore, build_records  # noqa: E402
+
+ARGUMENT_TYPES = ["Positive", "Neutral", "Negative", "N/A"]
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(db_path):
+    """One AnnotationStore per process, like the app's cached get_annotation_store"""
+    with _stores_lock:
+        if db_path not in _stores:
+            _stores[db_path] = AnnotationStore(db_path, legacy_csv=None)
+        return _stores[db_path]
+
+
+def run_session(db_path, session, saves, videos, seed):
+    """Save random annotation lists; return the last list saved per video and the latencies"""
+    rng = random.Random(seed)
+    store = get_store(db_path)
+    username = f"annotator{session}"
+    expected = {}
+    latencies = []
+
+    for n in range(saves):
+        video_idx = rng.randrange(videos)
+        video_info = {
+            "original_idx": video_idx,
+            "url": f"https://example.invalid/video/{video_idx}",
+            "title": f"Video {video_idx}",
+            "basic_info": "load test",
+        }
+        annotations = [{
+            "type": rng.choice(ARGUMENT_TYPES),
+            "claim": f"{username} save {n} claim {k}",
+            "premise": f"{username} save {n} premise {k}",
+            "person": str(rng.randrange(20)),
+        } for k in range(rng.randint(1, 8))]
+
+        start = time.perf_counter()
+        records = build_records(video_info, annotations, username)
+        store.replace_annotations(username, video_idx, records)
+        latencies.append(time.perf_counter() - start)
+        expected[video_idx] = [a["claim"] for a in annotations]
+
+    return username, expected, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sessions', type=int, default=8, help='concurrent annotator sessions')
+    parser.add_argument('--saves', type=int, default=200, help='saves per session')
+    parser.add_argument('--videos', type=int, default=20, help='videos each session picks from')
+    parser.add_argument('--mode', choices=['threads', 'processes'], default='threads')
+    parser.add_argument('--db', help='database file (default: a temporary file)')
+    args = parser.parse_args()
+
+    tmp_dir = None
+    db_path = args.db
+    if not db_path:
+        tmp_dir = tempfile.mkdtemp(prefix='annotation_loadtest_')
+        db_path = os.path.join(tmp_dir, 'annotations.db')
+    # Create the schema once before the sessions race for it
+    AnnotationStore(db_path, legacy_csv=None).close()
+
+    if args.mode == 'threads':
+        executor = ThreadPoolExecutor(max_workers=args.sessions)
+    else:
+        # Fresh interpreters, like separate app instances; SQLite handles must not cross a fork
+        executor = ProcessPoolExecutor(max_workers=args.sessions, mp_context=multiprocessing.get_context('spawn'))
+    start = time.perf_counter()
+    with executor as pool:
+        futures = [pool.submit(run_session, db_path, s, args.saves, args.videos, s) for s in range(args.sessions)]
+        results = [f.result() for f in futures]
+    elapsed = time.perf_counter() - start
+
+    total_saves = args.sessions * args.saves
+    latencies = sorted(lat for _, _, lats in results for lat in lats)
+    print(f"{args.sessions} {args.mode} x {args.saves} saves into {db_path}")
+    print(f"throughput: {total_saves / elapsed:.0f} saves/s ({elapsed:.2f}s total)")
+    print(f"latency: p50 {latencies[len(latencies) // 2] * 1000:.1f} ms, "
+          f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.1f} ms, max {latencies[-1] * 1000:.1f} ms")
+
+    # Verify: the store holds exactly each session's last save for every video
+    store = AnnotationStore(db_path, legacy_csv=None)
+    df = store.current_frame()
+    actual = {(row.username, row.video_idx): list(group.sort_values('annotation_order')['claim'])
+              for row, group in ((g.iloc[0], g) for _, g in df.groupby(['username', 'video_idx']))}
+    expected = {(username, video_idx): claims
+                for username, per_video, _ in results for video_idx, claims in per_video.items()}
+
+    lost = [key for key in expected if actual.get(key) != expected[key]]
+    # The progress index must agree with the saves it summarises
+    for username, per_video, _ in results:
+        if store.completed_videos(username) != set(per_video):
+            lost.append((username, 'completed_videos'))
+    unexpected = [key for key in actual if key not in expected]
+    saves_recorded = store.count_saves()
+    print(f"rows: {len(df)} current across {len(actual)} (user, video) pairs; saves recorded: {saves_recorded}")
+
+    ok = not lost and not unexpected and saves_recorded == total_saves
+    if ok:
+        print("✓ No lost or interleaved rows")
+    else:
+        print(f"❌ mismatched pairs: {lost[:10]}, unexpected pairs: {unexpected[:10]}, "
+              f"saves recorded {saves_recorded}/{total_saves}")
+
+    if tmp_dir:
+        for name in os.listdir(tmp_dir):
+            os.remove(os.path.join(tmp_dir, name))
+        os.rmdir(tmp_dir)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+"""Content-hash manifest for incremental rebuilds of the subtitle pipeline
+
+Each pipeline stage keeps a small JSON manifest next to its outputs. For every
+episode it records the SHA-256 of the input files and the pipeline version
+that produced the outputs, so a rerun only touches episodes whose inputs or
+code have changed. File size and mtime are stored too: when they are
+unchanged the stored hash is trusted, which keeps a no-op run over the whole
+corpus down to a few hundred ``stat`` calls.
+
+``run_episodes`` is the batch runner the stages share: skip fresh episodes,
+build the rest in a process pool, update the manifest and summarise.
+"""
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from tqdm import tqdm
+
+MANIFEST_FORMAT = 1
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    """Hash a file in chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def code_version(version, *source_files):
+    """Combine a manual version tag with a hash of the stage's source files
+
+    Bumping ``version`` forces a rebuild on purpose; editing any of the source
+    files changes the digest and invalidates the cache automatically.
+    """
+    digest = hashlib.sha256()
+    for path in source_files:
+        digest.update(os.path.basename(path).encode('utf-8'))
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return f"{version}-{digest.hexdigest()[:12]}"
+
+
+class BuildManifest:
+    """Per-stage record of input hashes and outputs, keyed by episode"""
+
+    def __init__(self, path, version):
+        self.path = path
+        self.version = version
+        self.entries = {}
+        self.dirty = False
+        # Hashes computed during this run, so an input shared by several
+        # checks is only read once
+        self._hash_cache = {}
+
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get('format') == MANIFEST_FORMAT:
+                    self.entries = data.get('entries', {})
+            except (OSError, ValueError):
+                # A corrupt manifest only costs a full rebuild
+                self.entries = {}
+
+    def _fingerprint(self, path, known=None):
+        """Return {size, mtime_ns, sha256} for a file, reusing a known hash if the stat matches"""
+        st = os.stat(path)
+        if known and known.get('size') == st.st_size and known.get('mtime_ns') == st.st_mtime_ns:
+            sha = known['sha256']
+        else:
+            sha = self._hash_cache.get(path)
+            if sha is None:
+                sha = file_sha256(path)
+                self._hash_cache[path] = sha
+        return {'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'sha256': sha}
+
+    def is_fresh(self, key, inputs, outputs):
+        """True if the outputs of ``key`` were built from these inputs by this version"""
+        entry = self.entries.get(str(key))
+        if not entry or entry.get('version') != self.version:
+            return False
+        if sorted(entry.get('inputs', {})) != sorted(inputs):
+            return False
+
+        for path in outputs:
+            recorded = entry.get('outputs', {}).get(path)
+            if recorded is None or not os.path.exists(path):
+                return False
+            st = os.stat(path)
+            # Outputs edited or replaced by hand are rebuilt
+            if recorded != {'size': st.st_size, 'mtime_ns': st.st_mtime_ns}:
+                return False
+
+        for path in inputs:
+            if not os.path.exists(path):
+                return False
+            known = entry['inputs'][path]
+            current = self._fingerprint(path, known)
+            if current['sha256'] != known['sha256']:
+                return False
+            if current != known:
+                # Touched but identical content: remember the new stat so the
+                # next run takes the fast path again
+                entry['inputs'][path] = current
+                self.dirty = True
+        return True
+
+    def record(self, key, inputs, outputs):
+        """Store the fingerprints of a successful build"""
+        output_stats = {}
+        for path in outputs:
+            st = os.stat(path)
+            output_stats[path] = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+        self.entries[str(key)] = {
+            'version': self.version,
+            'inputs': {path: self._fingerprint(path) for path in inputs},
+            'outputs': output_stats,
+        }
+        self.dirty = True
+
+    def discard(self, key):
+        """Forget an episode, e.g. after a failed build"""
+        if self.entries.pop(str(key), None) is not None:
+            self.dirty = True
+
+    def save(self):
+        """Write the manifest atomically if anything changed"""
+        if not self.dirty:
+            return
+        directory = os.path.dirname(self.path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'format': MANIFEST_FORMAT, 'entries': self.entries}, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
+        self.dirty = False
+
+
+def run_episodes(indices, process, episode_io, manifest_path, version, code_files, workers=1, force=False,
+                 skipped_fields=None):
+    """Run ``process`` on every stale episode across a process pool and return the run summary
+
+    The batch logic shared by the subtitle stages: episodes whose inputs and
+    code match the build manifest are skipped unless ``force`` is set, the
+    rest run in ``workers`` processes, and the manifest records the
+    successful builds and forgets the failed ones.
+
+    Args:
+        process: picklable callable (use functools.partial for extra
+            arguments) returning the episode's result record, with at least
+            'idx', 'status' ('ok' or 'error'), 'seconds' and 'error', and
+            optionally per-stage 'stages' timings
+        episode_io: idx -> (inputs, outputs) for the manifest
+        version: manual version tag, combined with a hash of code_files
+        code_files: every source file whose changes must rebuild the outputs
+        skipped_fields: extra fields of the record of a skipped episode
+    """
+    start = time.perf_counter()
+    manifest = BuildManifest(manifest_path, code_version(version, *code_files))
+    results = []
+
+    pending = []
+    for idx in indices:
+        if not force and manifest.is_fresh(idx, *episode_io(idx)):
+            results.append({'idx': idx, 'status': 'skipped', 'seconds': 0.0, 'error': None,
+                            **(skipped_fields or {})})
+        else:
+            pending.append(idx)
+
+    if workers <= 1 or len(pending) <= 1:
+        for idx in tqdm(pending, disable=not pending):
+            results.append(process(idx))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(process, idx) for idx in pending]
+            for future in tqdm(as_completed(futures), total=len(futures)):
+                results.append(future.result())
+
+    for result in results:
+        if result['status'] == 'ok':
+            manifest.record(result['idx'], *episode_io(result['idx']))
+        elif result['status'] == 'error':
+            manifest.discard(result['idx'])
+    manifest.save()
+
+    results.sort(key=lambda r: r['idx'])
+    stage_seconds = {}
+    for result in results:
+        for name, seconds in result.get('stages', {}).items():
+            stage_seconds[name] = stage_seconds.get(name, 0.0) + seconds
+    failures = [r for r in results if r['status'] == 'error']
+    skipped = sum(1 for r in results if r['status'] == 'skipped')
+    return {
+        'workers': workers,
+        'episodes': len(results),
+        'succeeded': len(results) - len(failures) - skipped,
+        'skipped': skipped,
+        'failed': len(failures),
+        'wall_seconds': round(time.perf_counter() - start, 4),
+        'episode_seconds': round(sum(r['seconds'] for r in results), 4),
+        'stage_seconds': {name: round(seconds, 4) for name, seconds in stage_seconds.items()},
+        'failures': [{'idx': r['idx'], 'error': r['error']} for r in failures],
+        'results': results,
+    }
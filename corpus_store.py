@@ -0,0 +1,215 @@
+"""Precompiled SQLite store of the Arena corpus for the annotation app
+
+video_links.txt, video_info.json and the corrected subtitles are compiled once
+into a single indexed file. The app then reads one video's record or subtitle
+by primary key instead of re-parsing the whole corpus on every rerun.
+
+Build or refresh the store with:
+    python corpus_store.py [--db arena_corpus.db]
+"""
+import argparse
+import json
+import os
+import sqlite3
+import threading
+
+from episode_registry import episode_links, registry_path_for, urn_of
+from vtt_parser import read_subtitle_text
+
+URL_FILE = "video_links.txt"
+INFO_FILE = "video_info.json"
+SUBTITLE_DIR = "subtitles"
+STORE_FILE = "arena_corpus.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS videos (
+    original_idx INTEGER PRIMARY KEY,
+    url TEXT NOT NULL,
+    title TEXT,
+    description TEXT
+);
+CREATE TABLE IF NOT EXISTS subtitles (
+    original_idx INTEGER PRIMARY KEY,
+    text TEXT NOT NULL,
+    source_size INTEGER NOT NULL,
+    source_mtime_ns INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def iter_video_info(info_path):
+    """Yield the JSON objects of video_info.json
+
+    The file is a sequence of pretty-printed objects rather than one JSON
+    document, so objects are decoded one after another with raw_decode.
+    """
+    with open(info_path, "r", encoding="utf-8") as f:
+        content = f.read()
+    decoder = json.JSONDecoder()
+    pos = 0
+    while True:
+        while pos < len(content) and content[pos].isspace():
+            pos += 1
+        if pos >= len(content):
+            return
+        obj, pos = decoder.raw_decode(content, pos)
+        yield obj
+
+
+def load_video_data(url_path, info_path):
+    """Join the links with their scraped info by urn, indexed by stable episode ID
+
+    IDs come from the episode registry (episode_registry.py), so reordering
+    video_links.txt or video_info.json never pairs a video with another
+    episode's info or subtitles.
+    """
+    links = episode_links(url_path)
+    by_urn = {urn_of(info["link"]): info for info in iter_video_info(info_path) if info.get("link")}
+
+    data = []
+    for episode_id, url in sorted(links.items()):
+        info = by_urn.get(urn_of(url), {})
+        data.append({
+            "original_idx": episode_id,
+            "url": url,
+            "clip_info": '',
+            "title": info.get("title"),
+            "basic_info": info.get("description"),
+        })
+    return data
+
+
+def corrected_subtitle_path(original_idx, subtitle_dir=SUBTITLE_DIR):
+    return os.path.join(subtitle_dir, f"{original_idx}_corrected.vtt")
+
+
+def _source_stamp(url_path, info_path):
+    """Fingerprint of the metadata sources and the episode registry, used to detect a stale store"""
+    stamp = []
+    for path in (url_path, info_path, registry_path_for(url_path)):
+        st = os.stat(path) if os.path.exists(path) else None
+        stamp.append([path, st and st.st_size, st and st.st_mtime_ns])
+    return json.dumps(stamp)
+
+
+def build_store(db_path=STORE_FILE, url_path=URL_FILE, info_path=INFO_FILE, subtitle_dir=SUBTITLE_DIR):
+    """Compile links, titles, descriptions and corrected subtitles into db_path
+
+    The store is written to a temporary file and swapped in atomically, so a
+    running app never sees a half-built database.
+    """
+    videos = load_video_data(url_path, info_path)
+    tmp_path = f"{db_path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.executescript(SCHEMA)
+        conn.executemany(
+            "INSERT INTO videos (original_idx, url, title, description) VALUES (?, ?, ?, ?)",
+            [(v["original_idx"], v["url"], v["title"], v["basic_info"]) for v in videos])
+
+        for v in videos:
+            path = corrected_subtitle_path(v["original_idx"], subtitle_dir)
+            if not os.path.exists(path):
+                continue
+            st = os.stat(path)
+            conn.execute(
+                "INSERT INTO subtitles (original_idx, text, source_size, source_mtime_ns) VALUES (?, ?, ?, ?)",
+                (v["original_idx"], read_subtitle_text(path), st.st_size, st.st_mtime_ns))
+
+        conn.execute("INSERT INTO meta (key, value) VALUES ('sources', ?)", (_source_stamp(url_path, info_path),))
+        conn.commit()
+    finally:
+        conn.close()
+
+    os.replace(tmp_path, db_path)
+    return len(videos)
+
+
+class CorpusStore:
+    """Read access to a compiled corpus store"""
+
+    def __init__(self, db_path=STORE_FILE, subtitle_dir=SUBTITLE_DIR):
+        self.db_path = db_path
+        self.subtitle_dir = subtitle_dir
+        # Streamlit runs each session in its own thread
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def is_stale(self, url_path=URL_FILE, info_path=INFO_FILE):
+        """True if video_links.txt, video_info.json or the episode registry changed since the build"""
+        rows = self._query("SELECT value FROM meta WHERE key = 'sources'")
+        return not rows or rows[0]["value"] != _source_stamp(url_path, info_path)
+
+    def list_videos(self):
+        """Index, URL and title of every video, for selection lists"""
+        rows = self._query("SELECT original_idx, url, title FROM videos ORDER BY original_idx")
+        return [dict(row) for row in rows]
+
+    def get_video(self, original_idx):
+        """Full record of one video, in the shape load_video_data returns"""
+        rows = self._query(
+            "SELECT original_idx, url, title, description FROM videos WHERE original_idx = ?", (original_idx,))
+        if not rows:
+            return None
+        row = rows[0]
+        return {
+            "original_idx": row["original_idx"],
+            "url": row["url"],
+            "clip_info": '',
+            "title": row["title"],
+            "basic_info": row["description"],
+        }
+
+    def get_subtitle_text(self, original_idx):
+        """Corrected subtitle text of one video
+
+        Falls back to the file on disk if it was regenerated after the build
+        or is missing from the store.
+        """
+        path = corrected_subtitle_path(original_idx, self.subtitle_dir)
+        rows = self._query(
+            "SELECT text, source_size, source_mtime_ns FROM subtitles WHERE original_idx = ?", (original_idx,))
+        if rows and os.path.exists(path):
+            st = os.stat(path)
+            if (rows[0]["source_size"], rows[0]["source_mtime_ns"]) == (st.st_size, st.st_mtime_ns):
+                return rows[0]["text"]
+        return read_subtitle_text(path)
+
+    def close(self):
+        self._conn.close()
+
+
+def open_store(db_path=STORE_FILE, url_path=URL_FILE, info_path=INFO_FILE, subtitle_dir=SUBTITLE_DIR):
+    """Open the store, building or rebuilding it first if it is missing or stale"""
+    if not os.path.exists(db_path):
+        build_store(db_path, url_path, info_path, subtitle_dir)
+    store = CorpusStore(db_path, subtitle_dir)
+    if store.is_stale(url_path, info_path):
+        store.close()
+        build_store(db_path, url_path, info_path, subtitle_dir)
+        store = CorpusStore(db_path, subtitle_dir)
+    return store
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compile the Arena corpus into an indexed SQLite store")
+    parser.add_argument('--db', default=STORE_FILE)
+    parser.add_argument('--links', default=URL_FILE)
+    parser.add_argument('--info', default=INFO_FILE)
+    parser.add_argument('--subtitle-dir', default=SUBTITLE_DIR)
+    args = parser.parse_args()
+
+    count = build_store(args.db, args.links, args.info, args.subtitle_dir)
+    print(f"✓ Compiled {count} videos into {args.db} ({os.path.getsize(args.db) / 1e6:.1f} MB)")
@@ -0,0 +1,266 @@
+"""Stable episode IDs keyed by SRF video urn
+
+Every artifact of an episode is named by an integer ID: subtitles/{id}.vtt,
+transcripts/transcription_{id}.txt, video_{id}.mp4, original_idx in the
+corpus store and video_idx in saved annotations. That ID used to be the line
+number of the link in video_links.txt, so reordering or re-scraping the file
+silently paired episodes with the wrong artifacts.
+
+episode_registry.json maps each ``urn:srf:video:<uuid>`` to an ID that never
+changes once assigned. The registry is bootstrapped from the current
+video_links.txt with ID = line number, so existing artifacts keep their names;
+links added later get the next free ID, wherever they appear in the file.
+Lookups in either direction are dict lookups.
+
+If artifacts were produced under a different line order, ``migrate`` renames
+them to their registry IDs in two phases (all sources to temporary names,
+then to their targets), so swaps and cycles are safe, and a journal lets an
+interrupted migration be completed by running it again.
+
+Usage:
+    python episode_registry.py sync                       # register new links
+    python episode_registry.py migrate OLD_LINKS [--apply] [--video-dir DIR]
+"""
+import argparse
+import json
+import os
+import re
+import sys
+
+URL_FILE = "video_links.txt"
+REGISTRY_FILE = "episode_registry.json"
+REGISTRY_FORMAT = 1
+MIGRATION_JOURNAL = ".episode_migration.json"
+
+URN_RE = re.compile(r'urn:srf:video:[0-9a-f-]{36}')
+
+# Per-episode artifacts, as (directory option, file name pattern)
+ARTIFACTS = [
+    ('subtitle_dir', '{}.vtt'),
+    ('subtitle_dir', '{}_old.vtt'),
+    ('subtitle_dir', '{}_corrected.vtt'),
+    ('subtitle_dir', '{}_index.json'),
+    ('transcript_dir', 'transcription_{}.txt'),
+    ('video_dir', 'video_{}.mp4'),
+]
+# State keyed by episode ID that is rebuilt rather than renamed
+STALE_AFTER_MIGRATION = [
+    ('subtitle_dir', '.merge_manifest.json'),
+    ('subtitle_dir', '.correct_manifest.json'),
+    ('subtitle_dir', '.pipeline_manifest.json'),
+    ('subtitle_dir', '.download_state.json'),
+]
+
+
+def urn_of(link):
+    match = URN_RE.search(link)
+    return match.group(0) if match else None
+
+
+def read_links(path=URL_FILE):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+class EpisodeRegistry:
+    """urn <-> stable episode ID, persisted as JSON"""
+
+    def __init__(self, path=REGISTRY_FILE):
+        self.path = path
+        self.episodes = {}
+        self.next_id = 0
+        self.dirty = False
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('format') != REGISTRY_FORMAT:
+                raise ValueError(f"{path}: unsupported registry format {data.get('format')}")
+            self.episodes = data['episodes']
+            self.next_id = data['next_id']
+        self._by_id = {entry['id']: urn for urn, entry in self.episodes.items()}
+
+    def __len__(self):
+        return len(self.episodes)
+
+    def id_for(self, urn):
+        entry = self.episodes.get(urn)
+        return entry['id'] if entry else None
+
+    def urn_for(self, episode_id):
+        return self._by_id.get(episode_id)
+
+    def link_for(self, episode_id):
+        urn = self._by_id.get(episode_id)
+        return self.episodes[urn]['link'] if urn else None
+
+    def links(self):
+        """{ID: link} of every registered episode"""
+        return {entry['id']: entry['link'] for entry in self.episodes.values()}
+
+    def register(self, link, episode_id=None):
+        """Return the ID of the link's urn, assigning the next free one if it is new"""
+        urn = urn_of(link)
+        if urn is None:
+            raise ValueError(f"no urn:srf:video in {link!r}")
+        entry = self.episodes.get(urn)
+        if entry:
+            if entry['link'] != link:
+                # Same video under a new slug
+                entry['link'] = link
+                self.dirty = True
+            return entry['id']
+        if episode_id is None or episode_id in self._by_id:
+            episode_id = self.next_id
+        self.episodes[urn] = {'id': episode_id, 'link': link}
+        self._by_id[episode_id] = urn
+        self.next_id = max(self.next_id, episode_id + 1)
+        self.dirty = True
+        return episode_id
+
+    def sync(self, links):
+        """Register every link; on an empty registry IDs are the line numbers. Return the new IDs"""
+        bootstrap = not self.episodes
+        new_ids = []
+        for i, link in enumerate(links):
+            is_new = urn_of(link) not in self.episodes
+            episode_id = self.register(link, i if bootstrap else None)
+            if is_new:
+                new_ids.append(episode_id)
+        return new_ids
+
+    def save(self):
+        """Write the registry atomically if anything changed"""
+        if not self.dirty:
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'format': REGISTRY_FORMAT, 'next_id': self.next_id,
+                       'episodes': dict(sorted(self.episodes.items(), key=lambda item: item[1]['id']))},
+                      f, indent=1)
+        os.replace(tmp_path, self.path)
+        self.dirty = False
+
+
+def registry_path_for(url_path):
+    """The registry that belongs to a links file: REGISTRY_FILE in the same directory"""
+    return os.path.join(os.path.dirname(url_path), REGISTRY_FILE)
+
+
+def episode_links(url_path=URL_FILE, registry_path=None):
+    """{episode ID: link} for every link in url_path, without writing the registry
+
+    Links that are not registered yet get the IDs ``sync`` would give them;
+    only ``sync_links`` (and the sync/migrate commands) persist IDs.
+    """
+    registry = EpisodeRegistry(registry_path or registry_path_for(url_path))
+    links = read_links(url_path)
+    registry.sync(links)
+    return {registry.id_for(urn_of(link)): link for link in links}
+
+
+def sync_links(url_path=URL_FILE, registry_path=None):
+    """Register the new links of url_path, save the registry and return the new IDs"""
+    registry = EpisodeRegistry(registry_path or registry_path_for(url_path))
+    new_ids = registry.sync(read_links(url_path))
+    registry.save()
+    return new_ids
+
+
+def migration_plan(old_links, registry, dirs):
+    """(source, target) renames that move artifacts from line positions in old_links to registry IDs"""
+    plan = []
+    for position, link in enumerate(old_links):
+        episode_id = registry.id_for(urn_of(link))
+        if episode_id is None:
+            raise ValueError(f"{link} is not registered; run 'sync' first")
+        if episode_id == position:
+            continue
+        for dir_key, pattern in ARTIFACTS:
+            directory = dirs.get(dir_key)
+            if not directory:
+                continue
+            source = os.path.join(directory, pattern.format(position))
+            if os.path.exists(source):
+                plan.append((source, os.path.join(directory, pattern.format(episode_id))))
+    return plan
+
+
+def _write_journal(journal_path, plan, phase):
+    tmp_path = f"{journal_path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'phase': phase, 'plan': plan}, f, indent=1)
+    os.replace(tmp_path, journal_path)
+
+
+def apply_migration(plan, journal_path, phase=1):
+    """Rename every source to a temporary name, then every temporary name to its target
+
+    The journal records the plan and the phase being run; both phases skip
+    renames that already happened, so running again after an interruption
+    completes the migration.
+    """
+    staged = [(f"{source}.migrating", target) for source, target in plan]
+    if phase == 1:
+        _write_journal(journal_path, plan, 1)
+        for (source, _), (tmp, _) in zip(plan, staged):
+            if os.path.exists(source) and not os.path.exists(tmp):
+                os.replace(source, tmp)
+        _write_journal(journal_path, plan, 2)
+    for tmp, target in staged:
+        if os.path.exists(tmp):
+            os.replace(tmp, target)
+    os.remove(journal_path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stable episode IDs keyed by SRF video urn")
+    parser.add_argument('--links', default=URL_FILE)
+    parser.add_argument('--registry', help=f'default: {REGISTRY_FILE} next to the links file')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('sync', help='register the links that are not in the registry yet')
+    migrate = subparsers.add_parser('migrate', help='rename artifacts from an old line order to registry IDs')
+    migrate.add_argument('old_links', help='the links file whose line numbers the artifacts are named by')
+    migrate.add_argument('--subtitle-dir', default='subtitles')
+    migrate.add_argument('--transcript-dir', default='transcripts')
+    migrate.add_argument('--video-dir', help='also rename video_{idx}.mp4 files here')
+    migrate.add_argument('--apply', action='store_true', help='rename the files (default: only print the plan)')
+    args = parser.parse_args(argv)
+
+    args.registry = args.registry or registry_path_for(args.links)
+    registry = EpisodeRegistry(args.registry)
+    if args.command == 'sync':
+        new_ids = registry.sync(read_links(args.links))
+        registry.save()
+        print(f"✓ {len(new_ids)} new episodes registered, {len(registry)} in {args.registry}")
+        return 0
+
+    dirs = {'subtitle_dir': args.subtitle_dir, 'transcript_dir': args.transcript_dir, 'video_dir': args.video_dir}
+    journal_path = os.path.join(args.subtitle_dir, MIGRATION_JOURNAL)
+    if os.path.exists(journal_path):
+        # An earlier migration stopped half-way; finish exactly that plan
+        with open(journal_path, 'r', encoding='utf-8') as f:
+            journal = json.load(f)
+        plan, phase = [tuple(step) for step in journal['plan']], journal['phase']
+        print(f"Resuming interrupted migration from {journal_path}")
+    else:
+        plan, phase = migration_plan(read_links(args.old_links), registry, dirs), 1
+
+    for source, target in plan:
+        print(f"   {source} -> {target}")
+    if not args.apply:
+        print(f"{len(plan)} files would be renamed (rerun with --apply)")
+        return 0
+
+    apply_migration(plan, journal_path, phase)
+    for dir_key, name in STALE_AFTER_MIGRATION:
+        path = os.path.join(dirs[dir_key], name)
+        if os.path.exists(path):
+            os.remove(path)
+    print(f"✓ Renamed {len(plan)} files; build manifests were reset")
+    if plan and os.path.exists("annotations.db"):
+        print("⚠️ annotations.db still refers to videos by their old index")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,46 +1,199 @@
-# find the title and description of each website
-import requests
-from bs4 import BeautifulSoup
+"""Scrape the title and description of every episode page
+
+Reads video_links.txt and appends one JSON line per link
+({"title", "description", "link"}) to video_info.json. Links that already have
+a title there are not fetched again, so a rerun only scrapes new links and
+retries failed ones. corpus_store.iter_video_info reads the old pretty-printed
+records and the appended lines alike, and a later record for a link replaces
+an earlier one. With --force every link is appended again and the file is
+then compacted to one record per link.
+
+Pages are fetched on a thread pool sharing one keep-alive requests.Session.
+Only the <head> is needed, so each response is streamed through an
+incremental parser and the connection is released as soon as </head> has
+been seen, instead of downloading and parsing the whole page.
+
+Usage:
+    python find_info.py [-j N] [--force]
+    python find_info.py --offline page_source.html   # parse a saved page, no network
+"""
+import argparse
+import codecs
 import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from html.parser import HTMLParser
+
+import requests
+from requests.adapters import HTTPAdapter
 from tqdm import tqdm
-# SRF 视频页面 URL
-def get_info(url):
-# url = "https://www.srf.ch/play/tv/arena/video/abstimmungs-arena-initiative-gegen-heiratsstrafe?urn=urn:srf:video:751941f0-2d71-4316-b678-31d457e7f882"
 
-    # 请求网页
-    response = requests.get(url)
-    response.encoding = 'utf-8'
-    response.raise_for_status()  # 确保请求成功
+from corpus_store import INFO_FILE, URL_FILE, iter_video_info
+
+TITLE_SUFFIX = ' - Arena - Play SRF'
+NO_TITLE = "No title found"
+NO_DESCRIPTION = "No description found"
+CHUNK_SIZE = 16 * 1024
+DEFAULT_WORKERS = 8
+TIMEOUT = (10, 30)
+
+
+class HeadParser(HTMLParser):
+    """Collect <title> and og:description, and flag the end of <head>"""
 
-    # 解析 HTML
-    soup = BeautifulSoup(response.text, "html.parser")
+    def __init__(self):
+        super().__init__()
+        self.title = None
+        self.description = None
+        self.done = False
+        self._in_title = False
 
-    # 获取网页标题
-    title = soup.title.string.rstrip(' - Arena - Play SRF') if soup.title else "No title found"
+    def handle_starttag(self, tag, attrs):
+        if tag == 'title' and self.title is None:
+            self._in_title = True
+            self.title = ''
+        elif tag == 'meta' and self.description is None:
+            attrs = dict(attrs)
+            if attrs.get('property') == 'og:description':
+                self.description = attrs.get('content')
+        elif tag == 'body':
+            # Pages without a closing </head>
+            self.done = True
 
-    # 获取描述内容（og:description）
-    meta_desc = soup.find("meta", property="og:description")
-    description = meta_desc["content"] if meta_desc else "No description found"
+    def handle_endtag(self, tag):
+        if tag == 'title':
+            self._in_title = False
+        elif tag == 'head':
+            self.done = True
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.title += data
+
+
+def parse_head(chunks):
+    """Feed byte chunks to a HeadParser until </head>; return (title, description, bytes read)"""
+    parser = HeadParser()
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    read = 0
+    for chunk in chunks:
+        read += len(chunk)
+        parser.feed(decoder.decode(chunk))
+        if parser.done:
+            break
+    title = parser.title.strip().removesuffix(TITLE_SUFFIX) if parser.title else NO_TITLE
+    return title, parser.description or NO_DESCRIPTION, read
+
+
+def make_session(pool_size=DEFAULT_WORKERS):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=2)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def get_info(url, session=None):
+    """Return (title, description) of an episode page, reading it only up to </head>"""
+    session = session or requests
+    with session.get(url, stream=True, timeout=TIMEOUT) as response:
+        response.raise_for_status()
+        title, description, _ = parse_head(response.iter_content(chunk_size=CHUNK_SIZE))
     return title, description
 
-if __name__ == "__main__":
-    with open('video_links.txt') as f:
-        links = f.read().splitlines()
-    with open('video_info.json', 'w', encoding="utf-8") as f:
-        for link in tqdm(links):
+
+def load_records(info_path=INFO_FILE):
+    """{link: latest record} of everything scraped so far"""
+    if not os.path.exists(info_path):
+        return {}
+    return {info['link']: info for info in iter_video_info(info_path) if info.get('link')}
+
+
+def compact_records(info_path=INFO_FILE):
+    """Rewrite info_path with one line per link, keeping the latest record at the link's first position"""
+    records = {}
+    for info in iter_video_info(info_path):
+        # Records without a link cannot be superseded; keep them where they are
+        records[info.get('link') or object()] = info
+    tmp_path = f"{info_path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        for info in records.values():
+            f.write(json.dumps(info, ensure_ascii=False) + '\n')
+    os.replace(tmp_path, info_path)
+
+
+def run_batch(links, info_path=INFO_FILE, workers=DEFAULT_WORKERS, force=False):
+    """Scrape the links missing from info_path, appending each record as it arrives
+
+    With force every link is fetched again and the superseded records are
+    compacted away once the batch is done.
+    """
+    start = time.perf_counter()
+    records = load_records(info_path)
+    pending = list(dict.fromkeys(link for link in links if force or not records.get(link, {}).get('title')))
+    failures = []
+
+    session = make_session(workers)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool, \
+            open(info_path, 'a', encoding='utf-8') as f:
+        futures = {pool.submit(get_info, link, session): link for link in pending}
+        for future in tqdm(as_completed(futures), total=len(futures), disable=not futures):
+            link = futures[future]
             try:
-                title, description = get_info(link)
+                title, description = future.result()
             except Exception as e:
+                failures.append({'link': link, 'error': f"{type(e).__name__}: {e}"})
+                if link in records:
+                    continue
+                # Placeholder so the link is not matched to another record by line number
                 title, description = None, None
-            d = {'title': title, 'description': description, 'link': link}
-            json_str = json.dumps(d, ensure_ascii=False, indent=2)
-            f.write(json_str+'\n')
-            # break
-    # print("Title:", title)
-    # print("Description:", description)
-
-# # 如果需要正文内容，可以根据 HTML 结构抓取 <p> 或 <div> 标签
-# # 示例（根据网页结构调整选择器）
-# paragraphs = soup.find_all("p")
-# content = "\n".join([p.get_text() for p in paragraphs])
-# print("Content:", content)
+            f.write(json.dumps({'title': title, 'description': description, 'link': link},
+                               ensure_ascii=False) + '\n')
+            f.flush()
+    session.close()
+    if force:
+        compact_records(info_path)
+
+    return {
+        'links': len(links),
+        'fetched': len(pending) - len(failures),
+        'skipped': len(links) - len(pending),
+        'failed': len(failures),
+        'wall_seconds': round(time.perf_counter() - start, 4),
+        'failures': failures,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Scrape the title and description of every episode page")
+    parser.add_argument('--links', default=URL_FILE)
+    parser.add_argument('--output', default=INFO_FILE)
+    parser.add_argument('-j', '--workers', type=int, default=DEFAULT_WORKERS,
+                        help=f'concurrent requests (default: {DEFAULT_WORKERS})')
+    parser.add_argument('--force', action='store_true', help='fetch every link again')
+    parser.add_argument('--offline', metavar='HTML', help='parse a saved page instead of fetching links')
+    args = parser.parse_args(argv)
+
+    if args.offline:
+        size = os.path.getsize(args.offline)
+        with open(args.offline, 'rb') as f:
+            title, description, read = parse_head(iter(lambda: f.read(CHUNK_SIZE), b''))
+        print(json.dumps({'title': title, 'description': description}, ensure_ascii=False, indent=2))
+        print(f"✓ Read {read} of {size} bytes")
+        return 0
+
+    with open(args.links, 'r', encoding='utf-8') as f:
+        links = [line.strip() for line in f if line.strip()]
+    summary = run_batch(links, args.output, args.workers, args.force)
+
+    for failure in summary['failures']:
+        print(f"❌ {failure['link']}: {failure['error']}")
+    print(f"✓ {summary['fetched']} pages scraped, {summary['skipped']} already known, "
+          f"{summary['failed']} failed, in {summary['wall_seconds']:.1f}s")
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
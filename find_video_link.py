@@ -1,107 +1,232 @@
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service as ChromeService
-from webdriver_manager.chrome import ChromeDriverManager
-from selenium.webdriver.common.by import By
-import time
-url = 'https://www.srf.ch/play/tv/sendung/arena?id=09784065-687b-4b60-bd23-9ed0d2d43cdc'
-
-driver = webdriver.Chrome(service=ChromeService(
-    ChromeDriverManager().install()))
-
-driver.get(url)
-time.sleep(3)  # 等待3秒，具体等待时间视网页内容加载情况而定
-
-print(driver.page_source)
-click_count = 0
-max_clicks = 20
-while click_count < max_clicks:
+"""Discover new Arena episodes and append their links to video_links.txt
+
+Existing lines of video_links.txt are never reordered: newly discovered
+episodes are appended, oldest first, and registered in the episode registry,
+which gives them the next stable IDs. Discovery stops at the first episode
+that is already known (listings are newest first).
+
+Sources:
+    api      page through the Play SRF JSON listing of the show with requests
+             (default; no browser needed)
+    browser  headless Chrome that clicks "Load more" with explicit waits
+             instead of fixed sleeps
+    --offline FILE
+             a saved page (live_dom.txt, page_source.html); episodes are read
+             from the embedded loader data and from <a> links in the DOM
+
+Usage:
+    python find_video_link.py [--source api|browser] [--dry-run]
+    python find_video_link.py --offline live_dom.txt --show '*' --dry-run
+"""
+import argparse
+import json
+import re
+import sys
+
+import requests
+
+from corpus_store import URL_FILE
+from episode_registry import sync_links, urn_of
+
+BASE_URL = 'https://www.srf.ch'
+SHOW = 'arena'
+SHOW_ID = '09784065-687b-4b60-bd23-9ed0d2d43cdc'
+SHOW_URL = f'{BASE_URL}/play/tv/sendung/{SHOW}?id={SHOW_ID}'
+# Paginated listing behind the show page's "Load more" button
+API_URL = f'{BASE_URL}/play/v3/api/srf/production/videos-by-show-id'
+MAX_PAGES = 50
+WAIT_SECONDS = 15
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"
+}
+
+VIDEO_HREF_RE = re.compile(r'href="([^"]*/video/[^"]*urn=urn:srf:video:[0-9a-f-]{36})"')
+# The page's loader data, serialized as a turbo-stream array
+ENQUEUE_RE = re.compile(r'streamController\.enqueue\(("(?:[^"\\]|\\.)*")\)')
+SLUG_CHARS = str.maketrans({'ä': 'ae', 'ö': 'oe', 'ü': 'ue', 'ß': 'ss', '–': '-'})
+
+
+def load_links(path=URL_FILE):
     try:
-        buttons = driver.find_elements(By.CSS_SELECTOR,
-            "button.Button__StyledButton-sc-1hu80ko-0.cjbhNt.LoadMore__StyledSecondaryButton-sc-1m7lrrf-1.fLJWjy"
-        )
-        print(f"Found {len(buttons)} buttons")
-        if buttons:
-            buttons[0].click()
-        click_count += 1
-        time.sleep(5)
-    except:
-        break
-print('finished loading all videos')
-
-# 获取所有 video 链接
-video_links = set()
-videos = driver.find_elements(By.CSS_SELECTOR, "a.MediaTeaserWrapper__StyledLink-sc-5tzc7y-1")
-print(len(videos))
-for video in videos:
-    link = video.get_attribute("href")
-    video_links.add(link)
-
-driver.quit()
-
-# 保存到 txt 文件
-with open("video_links.txt", "w") as f:
-    for link in video_links:
-        f.write(link + "\n")
-
-print(f"共抓取 {len(video_links)} 个视频链接，已保存到 video_links.txt")
-#
-# from selenium import webdriver
-# from selenium.webdriver.common.by import By
-# from selenium.webdriver.chrome.options import Options
-# from selenium.webdriver.support.ui import WebDriverWait
-# from selenium.webdriver.support import expected_conditions as EC
-# import time
-#
-# # Chrome 无头模式
-# chrome_options = Options()
-# chrome_options.add_argument("--headless")
-# chrome_options.add_argument("--disable-gpu")
-#
-# driver = webdriver.Chrome(options=chrome_options)
-# driver.get("https://www.srf.ch/play/tv/arena")
-# live_html = driver.execute_script("return document.documentElement.outerHTML")
-#
-# # Save to file
-# with open("live_dom.txt", "w", encoding="utf-8") as f:
-#     f.write(live_html)
-# breakpoint()
-# # wait for page load
-# wait = WebDriverWait(driver, 10)
-# # 点击次数计数
-# click_count = 0
-# max_clicks = 5
-#
-# while click_count < max_clicks:
-#     try:
-#         print(driver.page_source)
-#         load_more = wait.until(
-#             EC.element_to_be_clickable((By.XPATH, '//button//*[text()="Load more"]/ancestor::button'))
-#         )
-#         breakpoint()
-#         print(load_more.text)
-#         click_count += 1
-#         load_more.click()
-#         click_count += 1
-#         time.sleep(2)  # 等待内容加载
-#         print('click_count =', click_count)
-#     except:
-#         print('not found')
-#         # 没有按钮可点击时提前结束
-#         break
-#
-# # 获取所有 video 链接
-# video_links = set()
-# videos = driver.find_elements(By.XPATH, '//a[contains(@href, "/play/tv/arena/video/")]')
-#
-# for video in videos:
-#     link = video.get_attribute("href")
-#     video_links.add(link)
-#
-# driver.quit()
-#
-# # 保存到 txt 文件
-# with open("video_links.txt", "w") as f:
-#     for link in video_links:
-#         f.write(link + "\n")
-#
-# print(f"共抓取 {len(video_links)} 个视频链接，已保存到 video_links.txt")
+        with open(path, 'r', encoding='utf-8') as f:
+            return [line.strip() for line in f if line.strip()]
+    except FileNotFoundError:
+        return []
+
+
+def slugify(title):
+    """URL slug of an episode title as Play SRF builds it (the urn alone identifies the video)"""
+    title = re.sub(r'[^\w\s-]', '', title.lower().translate(SLUG_CHARS))
+    return re.sub(r'\s', '-', title)
+
+
+def episode_link(media, show=SHOW):
+    show = slugify(media.get('show', {}).get('title') or show)
+    return f"{BASE_URL}/play/tv/{show}/video/{slugify(media.get('title') or '')}?urn={media['urn']}"
+
+
+def decode_turbo_stream(items):
+    """Rebuild the object graph of a flattened turbo-stream array
+
+    Objects are stored as {"_<key index>": <value index>}, arrays as lists of
+    indices, and negative indices stand for null/undefined.
+    """
+    memo = {}
+
+    def decode(i):
+        if i < 0:
+            return None
+        if i in memo:
+            return memo[i]
+        value = items[i]
+        if isinstance(value, dict):
+            out = memo[i] = {}
+            for key, index in value.items():
+                out[items[int(key[1:])]] = decode(index)
+            return out
+        if isinstance(value, list):
+            if value and isinstance(value[0], str):
+                # Typed values (dates, promises, ...) are kept as they are
+                return value
+            out = memo[i] = []
+            out.extend(decode(index) for index in value)
+            return out
+        return value
+
+    return decode(0)
+
+
+def iter_media(obj):
+    """Yield every video record in a decoded loader-data tree, in document order"""
+    stack = [obj]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            if str(node.get('urn', '')).startswith('urn:srf:video:'):
+                yield node
+            stack.extend(reversed(list(node.values())))
+        elif isinstance(node, list):
+            stack.extend(reversed(node))
+
+
+def snapshot_episodes(html, show=SHOW):
+    """(urn, link, date) of the episodes in a saved page, in document order"""
+    episodes = {}
+    for payload in ENQUEUE_RE.findall(html):
+        for media in iter_media(decode_turbo_stream(json.loads(json.loads(payload)))):
+            episodes.setdefault(media['urn'], (media['urn'], episode_link(media, show), media.get('date')))
+    for href in VIDEO_HREF_RE.findall(html):
+        link = href if href.startswith('http') else BASE_URL + href
+        episodes.setdefault(urn_of(link), (urn_of(link), link, None))
+    return list(episodes.values())
+
+
+def api_episodes(session, show_id=SHOW_ID, show=SHOW, max_pages=MAX_PAGES):
+    """Yield (urn, link, date) from the show's JSON listing, newest first, page by page"""
+    params = {'showId': show_id}
+    for _ in range(max_pages):
+        response = session.get(API_URL, params=params, timeout=(10, 30))
+        response.raise_for_status()
+        data = response.json().get('data', {})
+        for media in data.get('data', []):
+            yield media['urn'], episode_link(media, show), media.get('date')
+        if not data.get('next'):
+            return
+        params = {'showId': show_id, 'next': data['next']}
+
+
+def browser_episodes(url=SHOW_URL, max_clicks=MAX_PAGES, known=()):
+    """Yield (urn, link, None) from the show page in headless Chrome, newest first
+
+    Each "Load more" click waits until new teasers have rendered; loading
+    stops once a known episode is on the page or the button is gone.
+    """
+    from selenium import webdriver
+    from selenium.common.exceptions import TimeoutException
+    from selenium.webdriver.chrome.options import Options
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.support.ui import WebDriverWait
+
+    options = Options()
+    options.add_argument('--headless=new')
+    options.add_argument('--disable-gpu')
+    driver = webdriver.Chrome(options=options)
+    teasers = (By.XPATH, '//a[contains(@href, "/video/") and contains(@href, "urn=urn:srf:video:")]')
+    load_more = (By.XPATH, '//button[.//*[text()="Load more" or text()="Mehr laden"]]')
+    try:
+        driver.get(url)
+        wait = WebDriverWait(driver, WAIT_SECONDS)
+        wait.until(EC.presence_of_element_located(teasers))
+        for _ in range(max_clicks):
+            count = len(driver.find_elements(*teasers))
+            if any(urn_of(a.get_attribute('href')) in known for a in driver.find_elements(*teasers)):
+                break
+            try:
+                wait.until(EC.element_to_be_clickable(load_more)).click()
+                wait.until(lambda d: len(d.find_elements(*teasers)) > count)
+            except TimeoutException:
+                break
+        links = [a.get_attribute('href') for a in driver.find_elements(*teasers)]
+    finally:
+        driver.quit()
+    for link in links:
+        yield urn_of(link), link.split('&')[0], None
+
+
+def new_episodes(discovered, known, show=SHOW):
+    """Episodes up to the first known one, oldest first
+
+    Episodes of other shows are ignored unless ``show`` is '*'. Dated
+    episodes are ordered by air date; the rest keep the reverse of their
+    listing order, so the result does not depend on set iteration order.
+    """
+    found = {}
+    for urn, link, date in discovered:
+        if show != '*' and f'/play/tv/{show}/video/' not in link:
+            continue
+        if urn in known:
+            break
+        found.setdefault(urn, (link, date))
+    ordered = list(found.items())[::-1]
+    return [link for _, (link, date) in sorted(ordered, key=lambda item: item[1][1] or '')]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Append newly published episodes to video_links.txt")
+    parser.add_argument('--links', default=URL_FILE)
+    parser.add_argument('--source', choices=('api', 'browser'), default='api')
+    parser.add_argument('--offline', metavar='HTML', help='read episodes from a saved page instead')
+    parser.add_argument('--show', default=SHOW, help=f"show slug to keep, '*' for all (default: {SHOW})")
+    parser.add_argument('--max-pages', type=int, default=MAX_PAGES, help='listing pages / "Load more" clicks')
+    parser.add_argument('--dry-run', action='store_true', help='print new links without writing them')
+    args = parser.parse_args(argv)
+
+    existing = load_links(args.links)
+    known = {urn_of(link) for link in existing}
+
+    if args.offline:
+        with open(args.offline, 'r', encoding='utf-8') as f:
+            discovered = snapshot_episodes(f.read(), args.show)
+    elif args.source == 'browser':
+        discovered = browser_episodes(max_clicks=args.max_pages, known=known)
+    else:
+        session = requests.Session()
+        session.headers.update(HEADERS)
+        discovered = api_episodes(session, show=args.show, max_pages=args.max_pages)
+
+    links = new_episodes(discovered, known, args.show)
+    for link in links:
+        print(link)
+    if links and not args.dry_run:
+        with open(args.links, 'a', encoding='utf-8') as f:
+            f.writelines(link + '\n' for link in links)
+        # New episodes get their stable IDs right away
+        sync_links(args.links)
+    print(f"✓ {len(links)} new episodes{' (dry run)' if args.dry_run else ''}, "
+          f"{len(existing) + (0 if args.dry_run else len(links))} in {args.links}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
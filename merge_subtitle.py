@@ -1,29 +1,31 @@
+import argparse
+import contextlib
+import cProfile
+import functools
+import glob
+import io
+import json
 import re
 import os
-from datetime import timedelta
-from difflib import SequenceMatcher
+import pstats
+import sys
+import time
+import tracemalloc
+from bisect import bisect_left, bisect_right
+from statistics import median
 import numpy as np
-from tqdm import tqdm
 
+import alignment
+import vtt_parser
+from build_cache import run_episodes
+from vtt_parser import iter_cues
 
-def parse_vtt_time(time_str):
-    """Convert VTT timestamp to seconds"""
-    time_str = time_str.strip()
-    parts = time_str.split(':')
-    if len(parts) == 3:  # HH:MM:SS.mmm
-        h, m, s = parts
-        if '.' in s:
-            s, ms = s.split('.')
-            return int(h) * 3600 + int(m) * 60 + int(s) + float(ms) / 1000
-        else:
-            return int(h) * 3600 + int(m) * 60 + int(s)
-    elif len(parts) == 2:  # MM:SS.mmm
-        m, s = parts
-        if '.' in s:
-            s, ms = s.split('.')
-            return int(m) * 60 + int(s) + float(ms) / 1000
-        else:
-            return int(m) * 60 + int(s)
+# Bump to force a full re-merge even if this file is unchanged
+PIPELINE_VERSION = 1
+MERGE_MANIFEST = '.merge_manifest.json'
+
+# Episode index in subtitles/{idx}.vtt, subtitles/{idx}_old.vtt, transcripts/transcription_{idx}.txt
+EPISODE_FILE_PATTERN = re.compile(r'^(?:transcription_)?(\d+)(?:_old|_corrected)?\.(?:vtt|txt)$')
 
 
 def parse_transcript_time(time_str):
@@ -35,47 +37,8 @@ def parse_transcript_time(time_str):
 
 
 def parse_vtt(vtt_content):
-    """Parse VTT file and return list of segments"""
-    segments = []
-    lines = vtt_content.strip().split('\n')
-
-    i = 0
-    while i < len(lines):
-        line = lines[i].strip()
-
-        # Skip WEBVTT header and empty lines
-        if line == 'WEBVTT' or line == '' or line.isdigit():
-            i += 1
-            continue
-
-        # Check if this is a timestamp line
-        if '-->' in line:
-            times = line.split('-->')
-            start = parse_vtt_time(times[0])
-            end = parse_vtt_time(times[1])
-
-            # Collect subtitle text (next lines until empty line)
-            text_lines = []
-            i += 1
-            while i < len(lines) and lines[i].strip() != '':
-                # Remove HTML font tags
-                text = re.sub(r'<font[^>]*>', '', lines[i])
-                text = re.sub(r'</font>', '', text)
-                text = text.strip()
-                if text:
-                    text_lines.append(text)
-                i += 1
-
-            if text_lines:
-                segments.append({
-                    'start': start,
-                    'end': end,
-                    'text': ' '.join(text_lines)
-                })
-        else:
-            i += 1
-
-    return segments
+    """Parse VTT file content and return list of Cue segments"""
+    return list(iter_cues(vtt_content.splitlines()))
 
 
 def parse_transcript(transcript_content):
@@ -144,87 +107,129 @@ def text_similarity_bidirectional(text1, text2):
     return matches / len(short_words)
 
 
-def detect_delay_first_match(vtt_segments, transcript_content):
+# Delay detection: the first caption in the opening window that matches a
+# transcript turn fixes the caption delay for the whole episode
+DELAY_WINDOW = 20
+DELAY_MIN_SIMILARITY = 0.4
+DEFAULT_DELAY = 1.0
+TRANSCRIPT_TURN_RE = re.compile(
+    r'(Person\d+)\s*\[(\d+:\d+:\d+)\s*-\s*(\d+:\d+:\d+)\]:\s*\n(.*?)(?=\nPerson\d+\s*\[|\Z)', re.DOTALL)
+
+
+def iter_transcript_turns(transcript_content):
+    """Yield (person, start, end, speech) for every speaker turn, with whitespace collapsed"""
+    for match in TRANSCRIPT_TURN_RE.finditer(transcript_content):
+        person, start_str, end_str, speech = match.groups()
+        yield person, parse_transcript_time(start_str), parse_transcript_time(end_str), " ".join(speech.split())
+
+
+def opening_turns(transcript_content, window=DELAY_WINDOW):
+    """Normalised text and start time of the transcript turns starting within window seconds
+
+    Turns are matched lazily and matching stops at the first turn past the
+    window, so the rest of the transcript is never scanned.
     """
-    使用视频开头前10秒的第一个匹配点检测延迟
+    turns = []
+    for person, start, _, speech_clean in iter_transcript_turns(transcript_content):
+        if start > window:
+            break
+        if len(speech_clean) > 20:
+            turns.append({'text': normalize_text(speech_clean), 'start': start, 'person': person})
+    return turns
 
-    Args:
-        vtt_segments: VTT片段列表
-        transcript_content: 转录文本内容
+
+def similarity_matrix(vtt_texts, transcript_texts):
+    """``text_similarity_bidirectional`` of every VTT text against every transcript text, as an array
+
+    Each transcript text is cut to the length of the VTT text it is compared
+    with. Words are mapped to ids once, and all pairs are scored together
+    from bag-of-words count arrays: the share of the shorter text's words
+    that occur in the longer one.
     """
-    TIME_WINDOW = 20  # 只用前10秒
+    n_vtt, n_trans = len(vtt_texts), len(transcript_texts)
+    vocab = {}
 
-    # 从transcript提取前10秒的文本
-    pattern = r'(Person\d+)\s*\[(\d+:\d+:\d+)\s*-\s*(\d+:\d+:\d+)\]:\s*\n(.*?)(?=\nPerson\d+\s*\[|\Z)'
-    matches = re.findall(pattern, transcript_content, flags=re.DOTALL)
+    def word_ids(text):
+        return [vocab.setdefault(word, len(vocab)) for word in text.split()]
 
-    transcript_data = []
-    for person, start_str, end_str, speech in matches:
-        start = parse_transcript_time(start_str)
+    vtt_ids = [word_ids(text) for text in vtt_texts]
+    pair_ids = [[word_ids(trans[:len(vtt)]) for trans in transcript_texts] for vtt in vtt_texts]
 
-        # 只使用前10秒的内容
-        if start > TIME_WINDOW:
-            break
+    vtt_counts = np.zeros((n_vtt, len(vocab)))
+    rows = [i for i, ids in enumerate(vtt_ids) for _ in ids]
+    np.add.at(vtt_counts, (rows, [w for ids in vtt_ids for w in ids]), 1)
 
-        # 将整段话作为一个单元
-        speech_clean = " ".join(speech.strip().split())
-        if len(speech_clean) > 20:
-            transcript_data.append({
-                'text': normalize_text(speech_clean),
-                'start': start,
-                'person': person
-            })
+    trans_counts = np.zeros((n_vtt, n_trans, len(vocab)))
+    flat = [(i, j, w) for i, row in enumerate(pair_ids) for j, ids in enumerate(row) for w in ids]
+    if flat:
+        np.add.at(trans_counts, tuple(np.array(flat).T), 1)
 
-    # 只检测前10秒的VTT片段，找到第一个匹配点
-    for vtt_seg in vtt_segments:
-        print(vtt_seg)
-        # 只检测前10秒
-        if vtt_seg['start'] > TIME_WINDOW:
-            break
+    vtt_len = vtt_counts.sum(axis=1)[:, None]
+    trans_len = trans_counts.sum(axis=2)
+    vtt_in_trans = np.einsum('iw,ijw->ij', vtt_counts, trans_counts > 0)
+    trans_in_vtt = np.einsum('ijw,iw->ij', trans_counts, vtt_counts > 0)
 
-        if is_background_sound(vtt_seg['text']):
-            continue
+    with np.errstate(divide='ignore', invalid='ignore'):
+        similarity = np.where(vtt_len <= trans_len, vtt_in_trans / vtt_len, trans_in_vtt / trans_len)
+    similarity[(vtt_len == 0) | (trans_len == 0)] = 0.0
+    return similarity
 
-        vtt_norm = normalize_text(vtt_seg['text'])
-        if len(vtt_norm) < 10:
-            continue
 
-        # 找最相似的transcript片段
-        best_similarity = 0
-        best_trans = None
-
-        for trans in transcript_data:
-            trans['text'] = trans['text'][:len(vtt_norm)]
-            similarity = text_similarity_bidirectional(vtt_norm, trans['text'])
-            if similarity > best_similarity:
-                best_similarity = similarity
-                best_trans = trans
-
-        # 如果相似度够高，立即返回这个延迟
-        if best_similarity > 0.4 and best_trans:
-            delay = vtt_seg['start'] - best_trans['start']
-            if 0 < delay < 15:
-                delay = round(delay, 1)
-                print(f"   ✓ 第一个匹配点: '{vtt_seg['text'][:40]}...'")
-                print(f"   ✓ 相似度={best_similarity:.2f}, 延迟={delay}s")
-                return delay
+def detect_delay_first_match(vtt_segments, transcript_content):
+    """
+    使用视频开头前20秒的第一个匹配点检测延迟
+
+    Args:
+        vtt_segments: VTT片段列表
+        transcript_content: 转录文本内容
+
+    All candidate captions of the window are scored against all transcript
+    turns at once with ``similarity_matrix``; the first caption whose best
+    turn is similar enough and gives a plausible delay wins. Inputs are
+    never modified, so the result only depends on the files.
+    """
+    turns = opening_turns(transcript_content)
+
+    # 只检测前20秒的VTT片段
+    candidates = []
+    for vtt_seg in vtt_segments:
+        if vtt_seg.start > DELAY_WINDOW:
+            break
+        if is_background_sound(vtt_seg.text):
+            continue
+        vtt_norm = normalize_text(vtt_seg.text)
+        if len(vtt_norm) >= 10:
+            candidates.append((vtt_seg, vtt_norm))
+
+    if candidates and turns:
+        similarity = similarity_matrix([norm for _, norm in candidates], [t['text'] for t in turns])
+        # argmax keeps the earliest turn among equal scores, like a strict ">" scan
+        best = similarity.argmax(axis=1)
+        for (vtt_seg, _), j, score in zip(candidates, best, similarity[np.arange(len(best)), best]):
+            if score > DELAY_MIN_SIMILARITY:
+                delay = vtt_seg.start - turns[j]['start']
+                if 0 < delay < 15:
+                    delay = round(delay, 1)
+                    print(f"   ✓ 第一个匹配点: '{vtt_seg.text[:40]}...'")
+                    print(f"   ✓ 相似度={score:.2f}, 延迟={delay}s")
+                    return delay
 
     # 如果没找到匹配点，使用默认值
-    print(f"   ⚠ 未找到匹配点，使用默认延迟1秒")
-    return 1.0
+    print(f"   ⚠ 未找到匹配点，使用默认延迟{DEFAULT_DELAY:g}秒")
+    return DEFAULT_DELAY
 
 
 def find_speaker(vtt_segment, speakers, delay=0):
     """Find the speaker with the most time overlap
 
     Args:
-        vtt_segment: VTT segment with 'start' and 'end' times
+        vtt_segment: VTT Cue with start and end times
         speakers: List of speaker segments
         delay: Seconds to subtract from VTT times to compensate for caption delay
     """
     # 将VTT时间往前调整，补偿延迟
-    vtt_start = vtt_segment['start'] - delay
-    vtt_end = vtt_segment['end'] - delay
+    vtt_start = vtt_segment.start - delay
+    vtt_end = vtt_segment.end - delay
 
     best_speaker = 'Unknown'
     max_overlap = 0
@@ -242,6 +247,56 @@ def find_speaker(vtt_segment, speakers, delay=0):
     return best_speaker
 
 
+class SpeakerTimeline:
+    """Bisect index over speaker segments for max-overlap lookups
+
+    Segments are sorted by start time, and a running maximum of end times
+    bounds the search from the left, so each query only visits the turns
+    that can actually overlap the VTT segment instead of the whole list.
+    Results are identical to ``find_speaker``: most overlap wins, ties go to
+    the earlier transcript turn, and no overlap gives 'Unknown'.
+    """
+
+    def __init__(self, speakers):
+        order = sorted(range(len(speakers)), key=lambda k: speakers[k]['start'])
+        self.order = order
+        self.starts = [speakers[k]['start'] for k in order]
+        self.ends = [speakers[k]['end'] for k in order]
+        self.names = [speakers[k]['speaker'] for k in order]
+
+        # max_ends[i] = max(ends[:i + 1]) is non-decreasing, so it can be bisected
+        self.max_ends = []
+        running = float('-inf')
+        for end in self.ends:
+            running = max(running, end)
+            self.max_ends.append(running)
+
+    def find_speaker(self, vtt_segment, delay=0):
+        """Same contract as the module-level ``find_speaker``"""
+        vtt_start = vtt_segment.start - delay
+        vtt_end = vtt_segment.end - delay
+
+        # Turns before lo all end at or before vtt_start, turns from hi on
+        # start at or after vtt_end; neither can overlap.
+        lo = bisect_right(self.max_ends, vtt_start)
+        hi = bisect_left(self.starts, vtt_end)
+
+        best_speaker = 'Unknown'
+        best_order = None
+        max_overlap = 0
+
+        for i in range(lo, hi):
+            overlap = min(vtt_end, self.ends[i]) - max(vtt_start, self.starts[i])
+            if overlap <= 0:
+                continue
+            if overlap > max_overlap or (overlap == max_overlap and self.order[i] < best_order):
+                max_overlap = overlap
+                best_order = self.order[i]
+                best_speaker = self.names[i]
+
+        return best_speaker
+
+
 def seconds_to_vtt_time(seconds):
     """Convert seconds to VTT timestamp format"""
     h = int(seconds // 3600)
@@ -251,67 +306,133 @@ def seconds_to_vtt_time(seconds):
     return f"{h:02d}:{m:02d}:{s:02d}.{ms:03d}"
 
 
-def combine_files(vtt_path, transcript_path, vtt_old):
-    """Combine VTT and transcript files with automatic delay detection"""
-    # Read files
-    with open(vtt_old, 'r', encoding='utf-8') as f:
-        vtt_content = f.read()
+class StageTimer:
+    """Wall time spent in each named stage of one episode
+
+    Usage::
+
+        timer = StageTimer()
+        with timer.stage('parse'):
+            ...
+        timer.seconds  # {'parse': 0.012}
+    """
+
+    def __init__(self):
+        self.seconds = {}
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] = self.seconds.get(name, 0.0) + time.perf_counter() - start
 
-    with open(transcript_path, 'r', encoding='utf-8') as f:
-        transcript_content = f.read()
 
-    # Parse both files
-    vtt_segments = parse_vtt(vtt_content)
+def merge_segments(vtt_segments, transcript_content, alignment_mode='first-match', timer=None):
+    """Assign a speaker to every caption cue and join consecutive cues of the same speaker
+
+    Args:
+        vtt_segments: caption Cue list
+        transcript_content: raw diarized transcript
+        alignment_mode: 'first-match' applies the delay found at the start of
+            the episode to every cue; 'piecewise' follows the caption drift
+            along the episode (see alignment.py) and falls back to the
+            first-match delay when too few anchors are found or they cover
+            too little of the episode.
+        timer: optional StageTimer that receives the delay, align and speaker times
+
+    Returns (merged text of "[PersonN]: ..." blocks, alignment report).
+    """
+    timer = timer or StageTimer()
     speakers = parse_transcript(transcript_content)
 
     # Auto-detect delay (只用第一个匹配点)
-    delay = detect_delay_first_match(vtt_segments, transcript_content)
+    with timer.stage('delay'):
+        delay = detect_delay_first_match(vtt_segments, transcript_content)
     print(f"📊 检测到延迟: {delay}秒")
 
+    report = {'alignment': alignment_mode, 'delay': delay}
+    if alignment_mode == 'piecewise':
+        with timer.stage('align'):
+            turns = [(start, end, speech) for _, start, end, speech in iter_transcript_turns(transcript_content)]
+            episode_alignment = alignment.align_episode(vtt_segments, turns, delay)
+        report.update(episode_alignment.metrics)
+        delay_at = episode_alignment.delay_at
+        print(f"📊 分段对齐: {episode_alignment.anchor_count} anchors, drift {report['drift']}s")
+    elif alignment_mode == 'first-match':
+        delay_at = lambda segment: delay  # noqa: E731
+    else:
+        raise ValueError(f"Unknown alignment mode: {alignment_mode}")
+
     # Match speakers to VTT segments
-    current_speaker = None
-    current_texts = []
-    output_lines = []
+    with timer.stage('speaker'):
+        timeline = SpeakerTimeline(speakers)
+        current_speaker = None
+        current_texts = []
+        output_lines = []
+
+        for segment in vtt_segments:
+            # 跳过背景音
+            if is_background_sound(segment.text):
+                continue
+
+            speaker = timeline.find_speaker(segment, delay=delay_at(segment))
+
+            # If speaker changes, write previous speaker's text
+            if speaker != current_speaker and current_speaker is not None:
+                combined_text = ' '.join(current_texts)
+                output_lines.append(f"[{current_speaker}]: {combined_text}")
+                output_lines.append('')
+                current_texts = []
+
+            current_speaker = speaker
+            current_texts.append(segment.text)
+
+        # Don't forget the last speaker
+        if current_texts:
+            combined_text = ' '.join(current_texts)
+            output_lines.append(f"[{current_speaker}]: {combined_text}")
 
-    for segment in vtt_segments:
-        # 跳过背景音
-        if is_background_sound(segment['text']):
-            continue
+    return '\n'.join(output_lines), report
 
-        speaker = find_speaker(segment, speakers, delay=delay)
 
-        # If speaker changes, write previous speaker's text
-        if speaker != current_speaker and current_speaker is not None:
-            combined_text = ' '.join(current_texts)
-            output_lines.append(f"[{current_speaker}]: {combined_text}")
-            output_lines.append('')
-            current_texts = []
+def combine_files(vtt_path, transcript_path, vtt_old, alignment_mode='first-match', timer=None):
+    """Combine VTT and transcript files with automatic delay detection
 
-        current_speaker = speaker
-        current_texts.append(segment['text'])
+    See ``merge_segments`` for alignment_mode. timer, an optional
+    StageTimer, receives the parse, delay, align, speaker and write times.
 
-    # Don't forget the last speaker
-    if current_texts:
-        combined_text = ' '.join(current_texts)
-        output_lines.append(f"[{current_speaker}]: {combined_text}")
+    Returns the alignment report of the episode.
+    """
+    timer = timer or StageTimer()
+
+    # Read and parse both files
+    with timer.stage('parse'):
+        with open(vtt_old, 'r', encoding='utf-8') as f:
+            vtt_segments = list(iter_cues(f))
+
+        with open(transcript_path, 'r', encoding='utf-8') as f:
+            transcript_content = f.read()
+
+    merged, report = merge_segments(vtt_segments, transcript_content, alignment_mode, timer)
 
     # Write output
-    with open(vtt_path, 'w', encoding='utf-8') as f:
-        f.write('\n'.join(output_lines))
+    with timer.stage('write'):
+        with open(vtt_path, 'w', encoding='utf-8') as f:
+            f.write(merged)
 
     print(f"✓ Combined file saved to: {vtt_path}")
     print(f"✓ Processed {len(vtt_segments)} subtitle segments\n")
+    return report
 
 
-def convert_transcript_to_lines(input_file, output_file):
+def transcript_lines(text):
     """
     Convert transcript with timestamps into a clean format:
     [PersonX]: content
-    One line per speaker turn.
+    One line per speaker turn; join them with blank lines for the file.
     """
-    with open(input_file, "r", encoding="utf-8") as f:
-        text = f.read()
-
     # Remove headers or separators like "===="
     text = re.sub(r"=+\s*Video Transcription Results\s*=+", "", text, flags=re.IGNORECASE)
     text = text.strip()
@@ -327,28 +448,259 @@ def convert_transcript_to_lines(input_file, output_file):
         speech = " ".join(speech.strip().split())
         lines.append(f"[{person}]: {speech}")
 
-    with open(output_file, "w", encoding="utf-8") as f:
-        f.write("\n\n".join(lines))
+    return lines
+
+
+def convert_transcript_to_lines(input_file, output_file, timer=None):
+    """Write the ``transcript_lines`` of a transcript file, for episodes without captions"""
+    timer = timer or StageTimer()
+    with timer.stage('parse'):
+        with open(input_file, "r", encoding="utf-8") as f:
+            lines = transcript_lines(f.read())
+
+    with timer.stage('write'):
+        with open(output_file, "w", encoding="utf-8") as f:
+            f.write("\n\n".join(lines))
 
     print(f"✅ Converted transcript saved to: {output_file}")
     print(f"💬 Total lines written: {len(lines)}")
 
 
-# Usage
-if __name__ == "__main__":
-    # Example usage
-    for idx in tqdm(range(287,288)):
-        vtt_file = f"subtitles/{idx}.vtt"
-        vtt_old_file = f"subtitles/{idx}_old.vtt"
-        transcript_file = f"transcripts/transcription_{idx}.txt"
+def episode_paths(idx, subtitle_dir='subtitles', transcript_dir='transcripts'):
+    """Return (vtt_file, vtt_old_file, transcript_file) for an episode index"""
+    return (os.path.join(subtitle_dir, f"{idx}.vtt"),
+            os.path.join(subtitle_dir, f"{idx}_old.vtt"),
+            os.path.join(transcript_dir, f"transcription_{idx}.txt"))
 
-        if os.path.exists(vtt_old_file):
-            try:
-                combine_files(vtt_file, transcript_file, vtt_old_file)
-            except Exception as e:
-                print(f"❌ Error processing {idx}: {e}")
-        else:
+
+PROFILERS = ('cprofile', 'tracemalloc')
+
+
+def process_episode(idx, subtitle_dir='subtitles', transcript_dir='transcripts', verbose=False,
+                    alignment_mode='first-match', profile=None, profile_dir='profiles'):
+    """Merge one episode and return a result record for the run summary
+
+    Episodes with an original caption file go through combine_files, the
+    others are converted from the transcript alone. Errors are caught and
+    reported in the record so one broken episode does not stop a batch.
+
+    The record carries the time spent in each stage. With ``profile`` set to
+    'cprofile' the episode's profile is written to profile_dir/{idx}.prof;
+    with 'tracemalloc' its peak traced memory is recorded.
+    """
+    vtt_file, vtt_old_file, transcript_file = episode_paths(idx, subtitle_dir, transcript_dir)
+    mode = 'combine' if os.path.exists(vtt_old_file) else 'convert'
+    result = {'idx': idx, 'mode': mode, 'status': 'ok', 'seconds': 0.0, 'error': None, 'alignment': None,
+              'stages': {}}
+    timer = StageTimer()
+    profiler = cProfile.Profile() if profile == 'cprofile' else None
+    if profile == 'tracemalloc':
+        tracemalloc.start()
+
+    start = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(sys.stdout if verbose else io.StringIO()):
+            if profiler:
+                profiler.enable()
             try:
-                convert_transcript_to_lines(transcript_file, vtt_file)
-            except Exception as e:
-                print(f"❌ Error converting {idx}: {e}")
\ No newline at end of file
+                if mode == 'combine':
+                    result['alignment'] = combine_files(vtt_file, transcript_file, vtt_old_file, alignment_mode,
+                                                        timer)
+                else:
+                    convert_transcript_to_lines(transcript_file, vtt_file, timer)
+            finally:
+                if profiler:
+                    profiler.disable()
+    except Exception as e:
+        result['status'] = 'error'
+        result['error'] = f"{type(e).__name__}: {e}"
+    result['seconds'] = round(time.perf_counter() - start, 4)
+    result['stages'] = {name: round(seconds, 4) for name, seconds in timer.seconds.items()}
+
+    if profiler:
+        os.makedirs(profile_dir, exist_ok=True)
+        result['profile'] = os.path.join(profile_dir, f"{idx}.prof")
+        profiler.dump_stats(result['profile'])
+    if profile == 'tracemalloc':
+        result['peak_mb'] = round(tracemalloc.get_traced_memory()[1] / 1e6, 2)
+        tracemalloc.stop()
+    return result
+
+
+def resolve_episodes(specs, transcript_dir='transcripts'):
+    """Expand CLI episode specs into a sorted list of indices
+
+    A spec is a single index ("287"), an inclusive range ("0-419") or a glob
+    over episode files ("subtitles/2*_old.vtt", "transcripts/*.txt"). With no
+    specs, every episode that has a transcript is selected.
+    """
+    if not specs:
+        specs = [os.path.join(transcript_dir, 'transcription_*.txt')]
+
+    indices = set()
+    for spec in specs:
+        range_match = re.fullmatch(r'(\d+)(?:-(\d+))?', spec)
+        if range_match:
+            first = int(range_match.group(1))
+            last = int(range_match.group(2)) if range_match.group(2) else first
+            indices.update(range(first, last + 1))
+            continue
+        for path in glob.glob(spec):
+            file_match = EPISODE_FILE_PATTERN.search(os.path.basename(path))
+            if file_match:
+                indices.add(int(file_match.group(1)))
+    return sorted(indices)
+
+
+def episode_io(idx, subtitle_dir='subtitles', transcript_dir='transcripts'):
+    """Return (inputs, outputs) of an episode's merge step for the build manifest"""
+    vtt_file, vtt_old_file, transcript_file = episode_paths(idx, subtitle_dir, transcript_dir)
+    if os.path.exists(vtt_old_file):
+        return [vtt_old_file, transcript_file], [vtt_file]
+    return [transcript_file], [vtt_file]
+
+
+def run_batch(indices, workers=1, subtitle_dir='subtitles', transcript_dir='transcripts', verbose=False,
+              force=False, alignment_mode='first-match', profile=None, profile_dir='profiles'):
+    """Process stale episodes across a process pool and return the run summary
+
+    Episodes whose inputs and pipeline version match the build manifest are
+    reported as skipped unless ``force`` is set. The alignment mode is part
+    of the pipeline version, so switching modes re-merges every episode, and
+    so is the code of the parse and alignment stages.
+    """
+    summary = run_episodes(
+        indices,
+        functools.partial(process_episode, subtitle_dir=subtitle_dir, transcript_dir=transcript_dir,
+                          verbose=verbose, alignment_mode=alignment_mode, profile=profile,
+                          profile_dir=profile_dir),
+        functools.partial(episode_io, subtitle_dir=subtitle_dir, transcript_dir=transcript_dir),
+        os.path.join(subtitle_dir, MERGE_MANIFEST),
+        f"{PIPELINE_VERSION}-{alignment_mode}", [__file__, alignment.__file__, vtt_parser.__file__],
+        workers, force,
+        skipped_fields={'mode': 'cached', 'alignment': None, 'stages': {}})
+    return {'workers': workers, 'alignment': alignment_mode, **summary,
+            'alignment_fallbacks': alignment_fallbacks(summary['results'])}
+
+
+def alignment_fallbacks(results):
+    """Piecewise-aligned episodes that kept the first-match delay, with the reason and anchor metrics"""
+    return [{'idx': r['idx'], 'reason': r['alignment']['fallback'], 'anchors': r['alignment']['anchors'],
+             'coverage': r['alignment']['coverage']}
+            for r in results if r['alignment'] and r['alignment'].get('fallback')]
+
+
+def print_alignment_summary(summary):
+    """Anchor statistics of a piecewise run and the episodes that fell back to the first-match delay"""
+    aligned = [r['alignment'] for r in summary['results'] if r['alignment'] and 'anchors' in r['alignment']]
+    if not aligned:
+        return
+    drift = max(abs(a['drift']) for a in aligned)
+    fallbacks = summary['alignment_fallbacks']
+    print(f"Alignment: median {median(a['anchors'] for a in aligned):.0f} anchors, "
+          f"median coverage {median(a['coverage'] for a in aligned):.0%}, "
+          f"max drift {drift:.1f}s, {len(fallbacks)} episode(s) fell back to the first-match delay")
+    for fallback in fallbacks:
+        print(f"⚠️ Episode {fallback['idx']} kept the first-match delay ({fallback['reason']}: "
+              f"{fallback['anchors']} anchors, coverage {fallback['coverage']:.0%})")
+
+
+def timing_report(summary, top=10):
+    """Where a run spent its time: totals and shares per stage, and the slowest episodes overall and per stage"""
+    timed = [r for r in summary['results'] if r['status'] != 'skipped']
+    total = sum(summary['stage_seconds'].values())
+    report = {
+        'wall_seconds': summary['wall_seconds'],
+        'workers': summary['workers'],
+        'episodes_timed': len(timed),
+        'stages': {name: {'seconds': seconds, 'share': round(seconds / total, 4) if total else 0.0}
+                   for name, seconds in sorted(summary['stage_seconds'].items(), key=lambda item: -item[1])},
+        'slowest_episodes': [{'idx': r['idx'], 'seconds': r['seconds'], 'stages': r['stages']}
+                             for r in sorted(timed, key=lambda r: r['seconds'], reverse=True)[:top]],
+        'slowest_by_stage': {
+            name: [{'idx': r['idx'], 'seconds': r['stages'][name]}
+                   for r in sorted((r for r in timed if name in r['stages']),
+                                   key=lambda r: r['stages'][name], reverse=True)[:top]]
+            for name in summary['stage_seconds']
+        },
+        'episodes': [{'idx': r['idx'], 'mode': r['mode'], 'seconds': r['seconds'], 'stages': r['stages'],
+                      **({'peak_mb': r['peak_mb']} if 'peak_mb' in r else {}),
+                      **({'profile': r['profile']} if 'profile' in r else {})}
+                     for r in timed],
+    }
+    return report
+
+
+def merge_profiles(results, path):
+    """Combine the per-episode cProfile dumps of a run into one file for pstats/snakeviz"""
+    paths = [r['profile'] for r in results if r.get('profile') and os.path.exists(r['profile'])]
+    if not paths:
+        return None
+    stats = pstats.Stats(paths[0])
+    for profile_path in paths[1:]:
+        stats.add(profile_path)
+    stats.dump_stats(path)
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Merge subtitles/{idx}_old.vtt with transcripts into subtitles/{idx}.vtt")
+    parser.add_argument('episodes', nargs='*',
+                        help='episode indices, ranges like 0-419, or globs like "subtitles/2*_old.vtt" '
+                             '(default: every transcript)')
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count() or 1,
+                        help='number of worker processes (default: CPU count)')
+    parser.add_argument('--subtitle-dir', default='subtitles')
+    parser.add_argument('--transcript-dir', default='transcripts')
+    parser.add_argument('--summary', help='write the JSON run summary to this file')
+    parser.add_argument('--force', action='store_true', help='ignore the build manifest and re-merge everything')
+    parser.add_argument('--alignment', choices=alignment.MODES, default='first-match',
+                        help='first-match: one delay per episode (default); '
+                             'piecewise: follow caption drift along the episode')
+    parser.add_argument('--timing-report', help='write per-episode, per-stage timings as JSON to this file')
+    parser.add_argument('--profile', choices=PROFILERS,
+                        help='cprofile: dump a profile per episode (and a merged one) to --profile-dir; '
+                             'tracemalloc: record peak memory per episode')
+    parser.add_argument('--profile-dir', default='profiles')
+    parser.add_argument('-v', '--verbose', action='store_true', help='show per-episode merge output')
+    args = parser.parse_args(argv)
+
+    indices = resolve_episodes(args.episodes, args.transcript_dir)
+    summary = run_batch(indices, args.workers, args.subtitle_dir, args.transcript_dir, args.verbose, args.force,
+                        args.alignment, args.profile, args.profile_dir)
+
+    if args.summary:
+        with open(args.summary, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2)
+
+    if args.timing_report:
+        with open(args.timing_report, 'w', encoding='utf-8') as f:
+            json.dump(timing_report(summary), f, indent=2)
+
+    if args.profile == 'cprofile':
+        merged_path = os.path.join(args.profile_dir, 'merged.prof')
+        stats = merge_profiles(summary['results'], merged_path)
+        if stats:
+            print(f"Profile of all episodes: {merged_path}")
+            stats.sort_stats('cumulative').print_stats(15)
+
+    for failure in summary['failures']:
+        print(f"❌ Error processing {failure['idx']}: {failure['error']}")
+    print_alignment_summary(summary)
+    total = sum(summary['stage_seconds'].values())
+    if total:
+        print("Stages: " + ", ".join(f"{name} {seconds:.2f}s ({seconds / total:.0%})"
+                                     for name, seconds in sorted(summary['stage_seconds'].items(),
+                                                                 key=lambda item: -item[1])))
+    timed = [r for r in summary['results'] if r['status'] != 'skipped']
+    slowest = sorted(timed, key=lambda r: r['seconds'], reverse=True)[:5]
+    if slowest:
+        print("Slowest episodes: " + ", ".join(f"{r['idx']} ({r['seconds']:.2f}s)" for r in slowest))
+    print(f"✓ {summary['succeeded']}/{summary['episodes']} episodes merged, {summary['skipped']} up to date, "
+          f"in {summary['wall_seconds']:.1f}s with {summary['workers']} worker(s)")
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
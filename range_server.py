@@ -0,0 +1,134 @@
+"""Local HTTP server with Range support, for testing video-download.py offline
+
+Serves a directory like ``python -m http.server`` but answers single-range
+``Range: bytes=a-b`` requests with 206 Partial Content, the way the video CDN
+does, with the file's Last-Modified as validator (a stale ``If-Range`` gets
+the whole file). ``make_samples`` fills a directory with fake episode pages, each
+linking to a random .mp4 file, and a links file pointing at them.
+
+Usage:
+    python range_server.py DIR [--port 8000] [--samples 3] [--size-mb 8]
+    python video-download.py --links DIR/links.txt --output-dir /tmp/videos
+"""
+import argparse
+import os
+import re
+import threading
+import uuid
+from functools import partial
+from http import HTTPStatus
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+RANGE_RE = re.compile(r'bytes=(\d*)-(\d*)$')
+
+
+class RangeRequestHandler(SimpleHTTPRequestHandler):
+    """SimpleHTTPRequestHandler that also serves single byte ranges"""
+
+    def send_head(self):
+        self._range = None
+        header = self.headers.get('Range')
+        path = self.translate_path(self.path)
+        if not header or not os.path.isfile(path):
+            return super().send_head()
+
+        last_modified = self.date_time_string(int(os.path.getmtime(path)))
+        if self.headers.get('If-Range', last_modified) != last_modified:
+            # The file changed since the client's copy: send all of it
+            return super().send_head()
+        match = RANGE_RE.match(header.strip())
+        size = os.path.getsize(path)
+        if not match or not any(match.groups()):
+            self.send_error(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+            return None
+        first, last = match.groups()
+        if first:
+            start, end = int(first), min(int(last), size - 1) if last else size - 1
+        else:
+            # Suffix range: the last N bytes
+            start, end = max(0, size - int(last)), size - 1
+        if start > end or start >= size:
+            self.send_response(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+            self.send_header('Content-Range', f'bytes */{size}')
+            self.end_headers()
+            return None
+
+        f = open(path, 'rb')
+        f.seek(start)
+        self._range = end - start + 1
+        self.send_response(HTTPStatus.PARTIAL_CONTENT)
+        self.send_header('Content-Type', self.guess_type(path))
+        self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        self.send_header('Content-Length', str(self._range))
+        self.send_header('Last-Modified', last_modified)
+        self.end_headers()
+        return f
+
+    def end_headers(self):
+        self.send_header('Accept-Ranges', 'bytes')
+        super().end_headers()
+
+    def copyfile(self, source, outputfile):
+        if self._range is None:
+            return super().copyfile(source, outputfile)
+        remaining = self._range
+        while remaining:
+            chunk = source.read(min(64 * 1024, remaining))
+            if not chunk:
+                break
+            outputfile.write(chunk)
+            remaining -= len(chunk)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(directory, port=0, host='127.0.0.1'):
+    """Start a RangeRequestHandler server on a background thread; return (server, base_url)
+
+    With ``port=0`` a free port is picked. Stop it with ``server.shutdown()``.
+    """
+    server = ThreadingHTTPServer((host, port), partial(RangeRequestHandler, directory=directory))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def make_samples(directory, base_url, count=3, size=8 * 1024 * 1024):
+    """Write ``count`` episode pages and videos plus links.txt; return the links file path"""
+    os.makedirs(directory, exist_ok=True)
+    links = []
+    for i in range(count):
+        with open(os.path.join(directory, f'sample_{i}.mp4'), 'wb') as f:
+            f.write(os.urandom(size))
+        with open(os.path.join(directory, f'episode_{i}.html'), 'w', encoding='utf-8') as f:
+            f.write(f'<html><body><a href="{base_url}/sample_{i}.mp4">Download</a></body></html>\n')
+        # Episode links carry a urn, like the real ones, so the episode registry accepts them
+        links.append(f"{base_url}/episode_{i}.html?urn=urn:srf:video:{uuid.uuid4()}")
+    links_path = os.path.join(directory, 'links.txt')
+    with open(links_path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(links) + '\n')
+    return links_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('directory')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--samples', type=int, default=0, help='generate N sample episodes first')
+    parser.add_argument('--size-mb', type=float, default=8, help='size of each sample video')
+    args = parser.parse_args()
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    if args.samples:
+        links_path = make_samples(args.directory, base_url, args.samples, int(args.size_mb * 1024 * 1024))
+        print(f"✓ Wrote {args.samples} sample episodes, links in {links_path}")
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), partial(RangeRequestHandler, directory=args.directory))
+    print(f"Serving {args.directory} at {base_url} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""Offset index of a corrected subtitle file: speaker turns and their video time
+
+subtitle_pipeline.py writes subtitles/{idx}_index.json next to every
+corrected file. It holds the sorted start offsets of the speaker turns in the
+corrected text, the speaker of each turn and, where the turn's words can be
+traced back to timed caption cues (or transcript turns for episodes without
+captions), the turn's time range in the video. A highlight span is resolved
+to the turns it overlaps by bisect, which pre-fills the annotation's Person
+field and gives saved annotations a video time to join exports on.
+
+An index that is missing or was built for another version of the text is
+replaced by one computed from the text alone, with speakers but no times.
+Running this module rebuilds the indexes of existing corrected files, e.g.
+after the two-pass merge_subtitle.py / subtitle_processing.py flow.
+
+Usage:
+    python speaker_index.py [episodes ...] [--subtitle-dir DIR] [--transcript-dir DIR]
+"""
+import argparse
+import difflib
+import json
+import os
+import sys
+from bisect import bisect_left, bisect_right
+
+from corpus_store import SUBTITLE_DIR, corrected_subtitle_path
+from merge_subtitle import episode_paths, is_background_sound, iter_transcript_turns, resolve_episodes
+from subtitle_processing import TURN_TAG_RE
+from vtt_parser import iter_cues
+
+INDEX_FORMAT = 1
+
+
+def offset_index_path(original_idx, subtitle_dir=SUBTITLE_DIR):
+    return os.path.join(subtitle_dir, f"{original_idx}_index.json")
+
+
+def caption_items(cues):
+    """(start, end, text) of the caption cues the merge keeps, in caption (= video) time"""
+    return [(cue.start, cue.end, cue.text) for cue in cues if not is_background_sound(cue.text)]
+
+
+def transcript_items(transcript_content):
+    """(start, end, speech) of the transcript turns, for episodes without captions"""
+    return [(start, end, speech) for _, start, end, speech in iter_transcript_turns(transcript_content)]
+
+
+def word_times(words, timed_items):
+    """(start, end) of the timed item each word came from, or None for words that cannot be traced
+
+    ``timed_items`` are (start, end, text) in text order. Fragment repair only
+    moves whole words between turns and drops text before the first tag, so
+    the words usually match one to one; otherwise the longest common
+    subsequence is used.
+    """
+    timed_words, times = [], []
+    for start, end, text in timed_items:
+        for word in text.split():
+            timed_words.append(word)
+            times.append((start, end))
+    if timed_words == words:
+        return times
+    # Only the differing middle goes through the quadratic matcher
+    head = 0
+    while head < min(len(words), len(timed_words)) and words[head] == timed_words[head]:
+        head += 1
+    tail = 0
+    while tail < min(len(words), len(timed_words)) - head and words[-1 - tail] == timed_words[-1 - tail]:
+        tail += 1
+    result = times[:head] + [None] * (len(words) - head - tail) + (times[len(times) - tail:] if tail else [])
+    matcher = difflib.SequenceMatcher(None, timed_words[head:len(timed_words) - tail],
+                                      words[head:len(words) - tail], autojunk=False)
+    for a, b, size in matcher.get_matching_blocks():
+        result[head + b:head + b + size] = times[head + a:head + a + size]
+    return result
+
+
+def build_offset_index(text, timed_items=None):
+    """Offset index of a corrected text as a JSON-ready dict
+
+    Args:
+        text: corrected subtitle text
+        timed_items: optional (start, end, text) of the non-background caption
+            cues, or of the transcript turns, the text was built from
+    """
+    tags = list(TURN_TAG_RE.finditer(text))
+    starts = [match.start() for match in tags]
+    speakers = [match.group(1) for match in tags]
+    if not starts or starts[0] != 0:
+        # Text before the first tag has no speaker
+        starts.insert(0, 0)
+        speakers.insert(0, None)
+
+    times = [None] * len(starts)
+    if timed_items is not None:
+        # Words of each turn, without its tag
+        turn_words = []
+        for k, start in enumerate(starts):
+            words = text[start:starts[k + 1] if k + 1 < len(starts) else len(text)].split()
+            turn_words.append(words[1:] if speakers[k] else words)
+        timed_words = word_times([word for words in turn_words for word in words], timed_items)
+        position = 0
+        for k, words in enumerate(turn_words):
+            traced = [time_range for time_range in timed_words[position:position + len(words)] if time_range]
+            position += len(words)
+            if traced:
+                times[k] = [round(min(start for start, _ in traced), 3), round(max(end for _, end in traced), 3)]
+    return {
+        'format': INDEX_FORMAT,
+        'length': len(text),
+        'starts': starts,
+        'speakers': speakers,
+        'times': times,
+    }
+
+
+def write_offset_index(path, index):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(index, f, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+
+class OffsetIndex:
+    """Speaker turns of one corrected text, looked up by character offset"""
+
+    def __init__(self, data):
+        self.length = data['length']
+        # Sorted start offsets of the turns; the first one is always 0
+        self.starts = data['starts']
+        self.speakers = data['speakers']
+        self.times = data['times']
+
+    @classmethod
+    def from_text(cls, text):
+        return cls(build_offset_index(text))
+
+    @classmethod
+    def load(cls, path, text):
+        """The index stored at path if it was built for this text, else one computed from the text"""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return cls.from_text(text)
+        if data.get('format') != INDEX_FORMAT or data.get('length') != len(text) \
+                or any(text[start:start + 1] != '[' for start in data['starts'][1:]):
+            return cls.from_text(text)
+        return cls(data)
+
+    @property
+    def timed(self):
+        return any(self.times)
+
+    def turns(self, start, end):
+        """Indices of the turns that overlap the span [start, end)"""
+        first = max(0, bisect_right(self.starts, start) - 1)
+        last = max(first, bisect_left(self.starts, end) - 1)
+        return range(first, last + 1)
+
+    def speakers_of(self, spans):
+        """Speakers of the turns the (start, end) spans overlap, in order of first appearance"""
+        found = {}
+        for start, end in spans:
+            for k in self.turns(start, end):
+                if self.speakers[k]:
+                    found.setdefault(self.speakers[k])
+        return list(found)
+
+    def time_range(self, spans):
+        """(start, end) in video seconds covering the turns the spans overlap, or None if none is timed"""
+        times = [self.times[k] for start, end in spans for k in self.turns(start, end) if self.times[k]]
+        if not times:
+            return None
+        return min(start for start, _ in times), max(end for _, end in times)
+
+
+def person_numbers(speakers):
+    """The Person field for a list of speakers: "11" or "11, 3"; Unknown speakers are left out"""
+    return ", ".join(speaker[len('Person'):] for speaker in speakers if speaker.startswith('Person'))
+
+
+def index_episode(idx, subtitle_dir=SUBTITLE_DIR, transcript_dir='transcripts'):
+    """Build and write the offset index of an existing corrected file; return whether it has video times"""
+    _, vtt_old_file, transcript_file = episode_paths(idx, subtitle_dir, transcript_dir)
+    with open(corrected_subtitle_path(idx, subtitle_dir), 'r', encoding='utf-8') as f:
+        text = f.read()
+    if os.path.exists(vtt_old_file):
+        with open(vtt_old_file, 'r', encoding='utf-8') as f:
+            timed_items = caption_items(iter_cues(f))
+    elif os.path.exists(transcript_file):
+        with open(transcript_file, 'r', encoding='utf-8') as f:
+            timed_items = transcript_items(f.read())
+    else:
+        timed_items = None
+    index = build_offset_index(text, timed_items)
+    write_offset_index(offset_index_path(idx, subtitle_dir), index)
+    return any(index['times'])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rebuild subtitles/{idx}_index.json for existing corrected files")
+    parser.add_argument('episodes', nargs='*', help='episode indices or ranges like 0-419 (default: every transcript)')
+    parser.add_argument('--subtitle-dir', default=SUBTITLE_DIR)
+    parser.add_argument('--transcript-dir', default='transcripts')
+    args = parser.parse_args(argv)
+
+    indices = [idx for idx in resolve_episodes(args.episodes, args.transcript_dir)
+               if os.path.exists(corrected_subtitle_path(idx, args.subtitle_dir))]
+    timed = sum(index_episode(idx, args.subtitle_dir, args.transcript_dir) for idx in indices)
+    print(f"✓ {len(indices)} offset indexes written, {timed} with video times")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
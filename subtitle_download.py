@@ -1,35 +1,277 @@
-import yt_dlp
+"""Download the original German captions of every episode
+
+Reads the links of video_links.txt with their stable episode IDs from the
+episode registry and saves the captions of episode idx as
+subtitles/{idx}_old.vtt.
+
+Downloads run on a bounded thread pool. Requests to the same host are spaced
+by a per-host rate limit, failed downloads are retried with exponential
+backoff, and finished episodes are recorded in a state file next to the
+captions, so an interrupted run resumes where it stopped. Every download
+writes into its own temporary directory, so concurrent workers never see
+each other's {video_id}.de.vtt files.
+
+Usage:
+    python subtitle_download.py [episodes ...] [-j N] [--rate R] [--retries N] [--force]
+    python subtitle_download.py 0-4 --stub      # offline run with a fake extractor
+
+A --stub run writes into a fresh temporary directory (with its own state
+file) unless --subtitle-dir names another directory; it refuses to write
+into the real subtitles directory.
+"""
+import argparse
+import glob
+import json
 import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse
+
 from tqdm import tqdm
-# 读取链接
-with open("video_links.txt", "r", encoding="utf-8") as f:
-    links = [line.strip() for line in f if line.strip()]
-
-# 创建字幕文件夹
-os.makedirs("subtitles", exist_ok=True)
-
-# yt-dlp 配置
-ydl_opts = {
-    "skip_download": True,        # 不下载视频
-    "writesubtitles": True,       # 下载字幕
-    "subtitleslangs": ["de"],     # 只要德语字幕
-    "subtitlesformat": "vtt",     # 保存为 .vtt
-    "outtmpl": "%(id)s.%(ext)s",  # 临时命名，后面再重命名
+
+from episode_registry import episode_links
+from merge_subtitle import resolve_episodes
+
+SUBTITLE_DIR = 'subtitles'
+STATE_FILE = '.download_state.json'
+STATE_FORMAT = 1
+SUBTITLE_LANG = 'de'
+
+# Requests per second to any single host
+DEFAULT_RATE = 1.0
+DEFAULT_RETRIES = 3
+# Seconds before the first retry; doubled for every further attempt
+BACKOFF_BASE = 2.0
+BACKOFF_MAX = 60.0
+
+YDL_OPTS = {
+    "skip_download": True,            # captions only, no video
+    "writesubtitles": True,
+    "subtitleslangs": [SUBTITLE_LANG],
+    "subtitlesformat": "vtt",
+    "quiet": True,
+    "no_warnings": True,
 }
 
-with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-    for i, url in tqdm(enumerate(links[10:13])):
-        try:
-            info = ydl.extract_info(url, download=True)
-            video_id = info.get("id")
-            subtitle_file = f"{video_id}.de.vtt"
-            new_name = os.path.join("subtitles", f"{10+i}_old.vtt")
 
-            if os.path.exists(subtitle_file):
-                os.rename(subtitle_file, new_name)
-                print(f"✅ {url} -> {new_name}")
-            else:
-                print(f"⚠️ 没有找到字幕: {url}")
+class HostRateLimiter:
+    """Space out request starts per host across threads"""
+
+    def __init__(self, rate=DEFAULT_RATE):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next_slot = {}
+
+    def wait(self, url):
+        """Block until the host of ``url`` may be contacted again"""
+        if not self.interval:
+            return
+        host = urlparse(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class DownloadState:
+    """Per-episode download status, saved atomically after every change"""
+
+    def __init__(self, path):
+        self.path = path
+        self.episodes = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get('format') == STATE_FORMAT:
+                    self.episodes = data.get('episodes', {})
+            except (OSError, ValueError):
+                # A corrupt state file only costs a full re-download
+                self.episodes = {}
+
+    def is_done(self, idx, url, output):
+        """True if this URL was already downloaded to ``output`` or is known to have no captions"""
+        entry = self.episodes.get(str(idx))
+        if not entry or entry.get('url') != url:
+            return False
+        if entry['status'] == 'missing':
+            return True
+        return entry['status'] == 'ok' and os.path.exists(output)
+
+    def update(self, idx, **entry):
+        with self._lock:
+            self.episodes[str(idx)] = entry
+            directory = os.path.dirname(self.path) or '.'
+            os.makedirs(directory, exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'format': STATE_FORMAT, 'episodes': self.episodes}, f, indent=1, sort_keys=True)
+            os.replace(tmp_path, self.path)
+
+
+def youtube_dl(opts):
+    """Default extractor factory; yt_dlp is only imported when it is used"""
+    import yt_dlp
+    return yt_dlp.YoutubeDL(opts)
+
+
+class StubExtractor:
+    """Offline stand-in for yt_dlp.YoutubeDL that writes a one-cue caption file
+
+    The video id is the SRF urn uuid (or the last path segment) of the URL, as
+    with the real extractor. Used by ``--stub`` to exercise the downloader
+    without network access.
+    """
 
+    def __init__(self, opts):
+        self.opts = opts
+
+    def extract_info(self, url, download=True):
+        match = re.search(r'urn:srf:video:([0-9a-f-]+)', url)
+        video_id = match.group(1) if match else urlparse(url).path.rstrip('/').rsplit('/', 1)[-1]
+        if download:
+            path = self.opts['outtmpl'] % {'id': f"{video_id}.{SUBTITLE_LANG}", 'ext': 'vtt'}
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(f"WEBVTT\n\n00:00:00.000 --> 00:00:02.000\n{url}\n")
+        return {'id': video_id}
+
+
+def old_subtitle_path(idx, subtitle_dir=SUBTITLE_DIR):
+    return os.path.join(subtitle_dir, f"{idx}_old.vtt")
+
+
+def download_subtitle(idx, url, subtitle_dir, extractor_factory=youtube_dl, limiter=None,
+                      retries=DEFAULT_RETRIES):
+    """Download one episode's captions and return a result record for the run summary
+
+    Each attempt runs a fresh extractor in its own temporary directory; the
+    caption file is moved into place only once it is complete.
+    """
+    result = {'idx': idx, 'url': url, 'status': 'ok', 'attempts': 0, 'seconds': 0.0, 'error': None}
+    start = time.perf_counter()
+    for attempt in range(retries + 1):
+        result['attempts'] = attempt + 1
+        if attempt:
+            delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempt - 1))
+            time.sleep(delay * random.uniform(0.5, 1.0))
+        if limiter:
+            limiter.wait(url)
+        try:
+            with tempfile.TemporaryDirectory(prefix=f"subtitle_{idx}_") as work_dir:
+                opts = dict(YDL_OPTS, outtmpl=os.path.join(work_dir, "%(id)s.%(ext)s"))
+                extractor_factory(opts).extract_info(url, download=True)
+                found = glob.glob(os.path.join(work_dir, f"*.{SUBTITLE_LANG}.vtt"))
+                if found:
+                    shutil.move(found[0], old_subtitle_path(idx, subtitle_dir))
+            result['status'] = 'ok' if found else 'missing'
+            result['error'] = None
+            break
         except Exception as e:
-            print(f"❌ 下载失败 {url}: {e}")
+            result['status'] = 'error'
+            result['error'] = f"{type(e).__name__}: {e}"
+    result['seconds'] = round(time.perf_counter() - start, 4)
+    return result
+
+
+def run_batch(links, indices, workers=4, subtitle_dir=SUBTITLE_DIR, rate=DEFAULT_RATE,
+              retries=DEFAULT_RETRIES, extractor_factory=youtube_dl, force=False):
+    """Download the captions of stale episodes on a thread pool and return the run summary
+
+    Episodes already in the state file are reported as skipped unless
+    ``force`` is set; episodes without German captions are not retried.
+    """
+    start = time.perf_counter()
+    os.makedirs(subtitle_dir, exist_ok=True)
+    state = DownloadState(os.path.join(subtitle_dir, STATE_FILE))
+    limiter = HostRateLimiter(rate)
+    results = []
+
+    pending = []
+    for idx in indices:
+        url = links[idx]
+        if not force and state.is_done(idx, url, old_subtitle_path(idx, subtitle_dir)):
+            results.append({'idx': idx, 'url': url, 'status': 'skipped', 'attempts': 0, 'seconds': 0.0,
+                            'error': None})
+        else:
+            pending.append(idx)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = [pool.submit(download_subtitle, idx, links[idx], subtitle_dir, extractor_factory, limiter,
+                               retries)
+                   for idx in pending]
+        for future in tqdm(as_completed(futures), total=len(futures), disable=not futures):
+            result = future.result()
+            state.update(result['idx'], url=result['url'], status=result['status'], error=result['error'])
+            results.append(result)
+
+    results.sort(key=lambda r: r['idx'])
+    failures = [r for r in results if r['status'] == 'error']
+    return {
+        'workers': workers,
+        'episodes': len(results),
+        'succeeded': sum(1 for r in results if r['status'] == 'ok'),
+        'missing': [r['idx'] for r in results if r['status'] == 'missing'],
+        'skipped': sum(1 for r in results if r['status'] == 'skipped'),
+        'failed': len(failures),
+        'wall_seconds': round(time.perf_counter() - start, 4),
+        'failures': [{'idx': r['idx'], 'url': r['url'], 'error': r['error']} for r in failures],
+        'results': results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Download the German captions of every episode")
+    parser.add_argument('episodes', nargs='*',
+                        help='episode indices or ranges like 0-419 (default: every link)')
+    parser.add_argument('--links', default='video_links.txt')
+    parser.add_argument('--subtitle-dir',
+                        help=f'caption directory (default: {SUBTITLE_DIR}, or a temporary directory with --stub)')
+    parser.add_argument('-j', '--workers', type=int, default=4, help='concurrent downloads (default: 4)')
+    parser.add_argument('--rate', type=float, default=DEFAULT_RATE,
+                        help=f'requests per second per host, 0 for no limit (default: {DEFAULT_RATE})')
+    parser.add_argument('--retries', type=int, default=DEFAULT_RETRIES,
+                        help=f'retries per episode after a failure (default: {DEFAULT_RETRIES})')
+    parser.add_argument('--force', action='store_true', help='ignore the state file and download everything')
+    parser.add_argument('--stub', action='store_true', help='use an offline fake extractor instead of yt-dlp')
+    parser.add_argument('--summary', help='write the JSON run summary to this file')
+    args = parser.parse_args(argv)
+
+    if args.stub:
+        # Fake captions must never replace real ones or mark them as downloaded
+        if args.subtitle_dir and os.path.abspath(args.subtitle_dir) == os.path.abspath(SUBTITLE_DIR):
+            parser.error(f"--stub would overwrite the captions in {SUBTITLE_DIR}; pass another --subtitle-dir")
+        if not args.subtitle_dir:
+            args.subtitle_dir = tempfile.mkdtemp(prefix='subtitle_stub_')
+            print(f"Stub captions go to {args.subtitle_dir}")
+    subtitle_dir = args.subtitle_dir or SUBTITLE_DIR
+
+    links = episode_links(args.links)
+    indices = [idx for idx in (resolve_episodes(args.episodes) if args.episodes else sorted(links)) if idx in links]
+
+    summary = run_batch(links, indices, args.workers, subtitle_dir, args.rate, args.retries,
+                        StubExtractor if args.stub else youtube_dl, args.force)
+
+    if args.summary:
+        with open(args.summary, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2)
+
+    for failure in summary['failures']:
+        print(f"❌ Download failed {failure['idx']} {failure['url']}: {failure['error']}")
+    for idx in summary['missing']:
+        print(f"⚠️ No German captions: {idx} {links[idx]}")
+    print(f"✓ {summary['succeeded']}/{summary['episodes']} episodes downloaded, {summary['skipped']} up to date, "
+          f"in {summary['wall_seconds']:.1f}s with {summary['workers']} worker(s)")
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,194 @@
+"""Single-pass caption pipeline: original captions + transcript -> corrected speaker file
+
+Runs what merge_subtitle.py and subtitle_processing.py do in two passes
+(parse -> align -> speaker assignment -> fragment repair) in memory and
+writes subtitles/{idx}_corrected.vtt once, together with its speaker offset
+index subtitles/{idx}_index.json (see speaker_index.py). The merged
+subtitles/{idx}.vtt of the two-pass flow is only written on request, as a
+debug artifact.
+
+Usage:
+    python subtitle_pipeline.py [episodes ...] [-j N] [--alignment piecewise]
+                                [--debug-dir DIR] [--force] [--timing-report FILE]
+"""
+import argparse
+import contextlib
+import functools
+import io
+import json
+import os
+import sys
+import time
+
+import alignment
+import merge_subtitle
+import speaker_index
+import subtitle_processing
+import vtt_parser
+from build_cache import run_episodes
+from corpus_store import corrected_subtitle_path
+from merge_subtitle import (StageTimer, alignment_fallbacks, episode_paths, merge_segments, print_alignment_summary,
+                            resolve_episodes, timing_report, transcript_lines)
+from speaker_index import (build_offset_index, caption_items, offset_index_path, transcript_items,
+                           write_offset_index)
+from subtitle_processing import fix_broken_sentences
+from vtt_parser import iter_cues
+
+# Bump to force every _corrected.vtt to be rebuilt even if the sources are unchanged
+PIPELINE_VERSION = 1
+PIPELINE_MANIFEST = '.pipeline_manifest.json'
+
+
+def episode_io(idx, subtitle_dir='subtitles', transcript_dir='transcripts'):
+    """Return (inputs, outputs) of an episode for the build manifest; debug artifacts are not tracked"""
+    _, vtt_old_file, transcript_file = episode_paths(idx, subtitle_dir, transcript_dir)
+    inputs = [vtt_old_file, transcript_file] if os.path.exists(vtt_old_file) else [transcript_file]
+    return inputs, [corrected_subtitle_path(idx, subtitle_dir), offset_index_path(idx, subtitle_dir)]
+
+
+def build_corrected(vtt_old, transcript_path, alignment_mode='first-match', timer=None):
+    """Run one episode through the pipeline in memory
+
+    Args:
+        vtt_old: original caption file, or None to convert the transcript alone
+        transcript_path: diarized transcript
+
+    Episodes without captions spend the 'convert' stage turning the
+    transcript into speaker lines instead of the delay/align/speaker stages.
+
+    Returns (corrected text, merged text before fragment repair, alignment
+    report or None without captions, speaker offset index).
+    """
+    timer = timer or StageTimer()
+    with timer.stage('parse'):
+        with open(transcript_path, 'r', encoding='utf-8') as f:
+            transcript_content = f.read()
+        vtt_segments = None
+        if vtt_old:
+            with open(vtt_old, 'r', encoding='utf-8') as f:
+                vtt_segments = list(iter_cues(f))
+
+    if vtt_segments is None:
+        with timer.stage('convert'):
+            merged, report = "\n\n".join(transcript_lines(transcript_content)), None
+            timed_items = transcript_items(transcript_content)
+    else:
+        merged, report = merge_segments(vtt_segments, transcript_content, alignment_mode, timer)
+        timed_items = caption_items(vtt_segments)
+
+    with timer.stage('repair'):
+        corrected = fix_broken_sentences(merged)
+    with timer.stage('index'):
+        index = build_offset_index(corrected, timed_items)
+    return corrected, merged, report, index
+
+
+def process_episode(idx, subtitle_dir='subtitles', transcript_dir='transcripts', alignment_mode='first-match',
+                    debug_dir=None, verbose=False):
+    """Build one episode's corrected file and return a result record for the run summary
+
+    With ``debug_dir`` the intermediate merged file ({idx}.vtt) and the
+    alignment report ({idx}.alignment.json) are written there as well.
+    """
+    _, vtt_old_file, transcript_file = episode_paths(idx, subtitle_dir, transcript_dir)
+    mode = 'combine' if os.path.exists(vtt_old_file) else 'convert'
+    result = {'idx': idx, 'mode': mode, 'status': 'ok', 'seconds': 0.0, 'error': None, 'alignment': None,
+              'stages': {}}
+    timer = StageTimer()
+
+    start = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(sys.stdout if verbose else io.StringIO()):
+            corrected, merged, report, index = build_corrected(
+                vtt_old_file if mode == 'combine' else None, transcript_file, alignment_mode, timer)
+        result['alignment'] = report
+
+        with timer.stage('write'):
+            with open(corrected_subtitle_path(idx, subtitle_dir), 'w', encoding='utf-8') as f:
+                f.write(corrected)
+            write_offset_index(offset_index_path(idx, subtitle_dir), index)
+            if debug_dir:
+                os.makedirs(debug_dir, exist_ok=True)
+                with open(os.path.join(debug_dir, f"{idx}.vtt"), 'w', encoding='utf-8') as f:
+                    f.write(merged)
+                if report:
+                    with open(os.path.join(debug_dir, f"{idx}.alignment.json"), 'w', encoding='utf-8') as f:
+                        json.dump(report, f, indent=2)
+    except Exception as e:
+        result['status'] = 'error'
+        result['error'] = f"{type(e).__name__}: {e}"
+    result['seconds'] = round(time.perf_counter() - start, 4)
+    result['stages'] = {name: round(seconds, 4) for name, seconds in timer.seconds.items()}
+    return result
+
+
+def run_batch(indices, workers=1, subtitle_dir='subtitles', transcript_dir='transcripts',
+              alignment_mode='first-match', debug_dir=None, verbose=False, force=False):
+    """Build stale episodes across a process pool and return the run summary
+
+    The manifest version covers this file, the parse, merge, alignment,
+    repair and index code and the alignment mode, so a change to any stage
+    rebuilds every episode.
+    """
+    summary = run_episodes(
+        indices,
+        functools.partial(process_episode, subtitle_dir=subtitle_dir, transcript_dir=transcript_dir,
+                          alignment_mode=alignment_mode, debug_dir=debug_dir, verbose=verbose),
+        functools.partial(episode_io, subtitle_dir=subtitle_dir, transcript_dir=transcript_dir),
+        os.path.join(subtitle_dir, PIPELINE_MANIFEST),
+        f"{PIPELINE_VERSION}-{alignment_mode}",
+        [__file__, merge_subtitle.__file__, alignment.__file__, subtitle_processing.__file__,
+         speaker_index.__file__, vtt_parser.__file__],
+        workers, force,
+        skipped_fields={'mode': 'cached', 'alignment': None, 'stages': {}})
+    return {'workers': workers, 'alignment': alignment_mode, **summary,
+            'alignment_fallbacks': alignment_fallbacks(summary['results'])}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Build subtitles/{idx}_corrected.vtt and its offset index from the original captions and "
+                    "transcripts in one pass")
+    parser.add_argument('episodes', nargs='*',
+                        help='episode indices, ranges like 0-419, or globs like "subtitles/2*_old.vtt" '
+                             '(default: every transcript)')
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count() or 1,
+                        help='number of worker processes (default: CPU count)')
+    parser.add_argument('--subtitle-dir', default='subtitles')
+    parser.add_argument('--transcript-dir', default='transcripts')
+    parser.add_argument('--alignment', choices=alignment.MODES, default='first-match',
+                        help='first-match: one delay per episode (default); '
+                             'piecewise: follow caption drift along the episode')
+    parser.add_argument('--debug-dir', help='also write the merged {idx}.vtt and alignment report here')
+    parser.add_argument('--summary', help='write the JSON run summary to this file')
+    parser.add_argument('--timing-report', help='write per-episode, per-stage timings as JSON to this file')
+    parser.add_argument('--force', action='store_true', help='ignore the build manifest and rebuild everything')
+    parser.add_argument('-v', '--verbose', action='store_true', help='show per-episode merge output')
+    args = parser.parse_args(argv)
+
+    indices = resolve_episodes(args.episodes, args.transcript_dir)
+    summary = run_batch(indices, args.workers, args.subtitle_dir, args.transcript_dir, args.alignment,
+                        args.debug_dir, args.verbose, args.force)
+
+    if args.summary:
+        with open(args.summary, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2)
+    if args.timing_report:
+        with open(args.timing_report, 'w', encoding='utf-8') as f:
+            json.dump(timing_report(summary), f, indent=2)
+
+    for failure in summary['failures']:
+        print(f"❌ Error processing {failure['idx']}: {failure['error']}")
+    print_alignment_summary(summary)
+    total = sum(summary['stage_seconds'].values())
+    if total:
+        print("Stages: " + ", ".join(f"{name} {seconds:.2f}s ({seconds / total:.0%})"
+                                     for name, seconds in sorted(summary['stage_seconds'].items(),
+                                                                 key=lambda item: -item[1])))
+    print(f"✓ {summary['succeeded']}/{summary['episodes']} episodes built, {summary['skipped']} up to date, "
+          f"in {summary['wall_seconds']:.1f}s with {summary['workers']} worker(s)")
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
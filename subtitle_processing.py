@@ -1,4 +1,32 @@
+"""Repair sentence fragments in merged speaker files
+
+Turns subtitles/{idx}.vtt (written by merge_subtitle.py) into
+subtitles/{idx}_corrected.vtt, the file the annotation app displays.
+
+Usage:
+    python subtitle_processing.py [episodes ...] [-j N] [--force]
+"""
+import argparse
+import functools
+import os
 import re
+import sys
+import time
+
+from build_cache import run_episodes
+from merge_subtitle import resolve_episodes
+
+# Bump to force every _corrected.vtt to be rebuilt even if this file is unchanged
+PIPELINE_VERSION = 1
+CORRECT_MANIFEST = '.correct_manifest.json'
+
+SPEAKER_TAG_RE = re.compile(r'\[Person\d+\]:')
+# Besides the [PersonN]: tags the merge writes "[Unknown]:" for cues no
+# transcript turn overlaps; fragment repair leaves those inside the previous
+# turn's text, but they still mark a change of speaker
+TURN_TAG_RE = re.compile(r'\[(Person\d+|Unknown)\]:')
+# End of the first complete sentence in a fragment: a period, then a capitalised word
+SENTENCE_BREAK_RE = re.compile(r'\.\s+[A-Z]')
 
 
 def fix_broken_sentences(text):
@@ -6,87 +34,114 @@ def fix_broken_sentences(text):
     Fixes broken sentences by merging sentence fragments with the previous speaker.
     If a speaker only has a broken sentence fragment, the entire speaker entry is removed
     and the fragment is merged with the previous speaker.
-    """
-    # Pattern to match speaker tags
-    speaker_pattern = r'\[Person\d+\]:'
 
+    Each speaker's text is collected as a list of parts and joined once at the
+    end, so long runs of fragments cost linear rather than quadratic time.
+    """
     # Find all speakers and their positions
-    matches = list(re.finditer(speaker_pattern, text))
+    matches = list(SPEAKER_TAG_RE.finditer(text))
 
     if not matches:
         return text
 
-    # Extract segments with speaker and content
-    segments = []
+    # Process segments to merge broken sentences; each entry is (speaker, [content parts])
+    result = []
+
     for i, match in enumerate(matches):
         speaker = match.group()
-        start = match.end()
         end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
-        content = text[start:end].strip()
-        segments.append({'speaker': speaker, 'content': content})
-
-    # Process segments to merge broken sentences
-    result = []
-
-    for i, segment in enumerate(segments):
-        content = segment['content']
-        speaker = segment['speaker']
+        content = text[match.end():end].strip()
 
         # Check if content starts with a lowercase letter (broken sentence)
         if content and content[0].islower() and result:
             # Check if entire content is just a broken fragment
             # (starts with lowercase and ends with period, no capital letter after first word)
-            match = re.search(r'\.\s+[A-Z]', content)
+            sentence_break = SENTENCE_BREAK_RE.search(content)
 
-            if not match:
+            if not sentence_break:
                 # Entire content is just a fragment, merge all with previous speaker
                 # and don't add this speaker at all
-                result[-1]['content'] += ' ' + content
+                result[-1][1].append(content)
             else:
                 # There's more content after the broken sentence
-                split_pos = match.start() + 1  # Include the period
-                broken_part = content[:split_pos].strip()
-                remaining = content[split_pos:].strip()
-
+                split_pos = sentence_break.start() + 1  # Include the period
                 # Merge broken part with previous speaker
-                result[-1]['content'] += ' ' + broken_part
-
+                result[-1][1].append(content[:split_pos].strip())
                 # Add current speaker with remaining content
-                result.append({'speaker': speaker, 'content': remaining})
+                result.append((speaker, [content[split_pos:].strip()]))
         else:
             # Normal segment, add as is
-            result.append({'speaker': speaker, 'content': content})
+            result.append((speaker, [content]))
 
     # Reconstruct the text
-    output = []
-    for seg in result:
-        output.append(f"{seg['speaker']} {seg['content']}")
+    return '\n\n'.join(f"{speaker} {' '.join(parts)}" for speaker, parts in result)
 
-    return '\n\n'.join(output)
 
+def correct_file(input_file, output_file):
+    """Write the fragment-repaired version of input_file to output_file"""
+    with open(input_file, 'r', encoding='utf-8') as f:
+        text = f.read()
+    with open(output_file, 'w', encoding='utf-8') as f:
+        f.write(fix_broken_sentences(text))
 
 
-# Process and print the result
-for i in range(1,2):
-    input_file = f'subtitles/{i}.vtt'
-    output_file = f'subtitles/{i}_corrected.vtt'
+def episode_io(idx, subtitle_dir='subtitles'):
+    """Return ([input], [output]) of an episode's correction step"""
+    return [os.path.join(subtitle_dir, f"{idx}.vtt")], [os.path.join(subtitle_dir, f"{idx}_corrected.vtt")]
 
-    try:
-        with open(input_file, 'r', encoding='utf-8') as f:
-            text = f.read()
 
-        # Process the text
-        corrected_text = fix_broken_sentences(text)
+def correct_episode(idx, subtitle_dir='subtitles'):
+    """Correct one episode and return a result record for the run summary"""
+    (input_file,), (output_file,) = episode_io(idx, subtitle_dir)
+    result = {'idx': idx, 'status': 'ok', 'seconds': 0.0, 'error': None}
+    start = time.perf_counter()
+    try:
+        correct_file(input_file, output_file)
+    except Exception as e:
+        result['status'] = 'error'
+        result['error'] = f"{type(e).__name__}: {e}"
+    result['seconds'] = round(time.perf_counter() - start, 4)
+    return result
 
-        # Write to output file
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write(corrected_text)
 
-        print(f"✓ Processing complete!")
-        print(f"  Input:  {input_file}")
-        print(f"  Output: {output_file}")
-    except FileNotFoundError:
-        print(f"Error: File '{input_file}' not found.")
-    except Exception as e:
-        print(f"Error: {e}")
+def run_batch(indices, workers=1, subtitle_dir='subtitles', force=False):
+    """Correct stale episodes across a process pool and return the run summary
 
+    Episodes whose merged file and pipeline version match the build manifest
+    are reported as skipped unless ``force`` is set.
+    """
+    return run_episodes(
+        indices,
+        functools.partial(correct_episode, subtitle_dir=subtitle_dir),
+        functools.partial(episode_io, subtitle_dir=subtitle_dir),
+        os.path.join(subtitle_dir, CORRECT_MANIFEST),
+        PIPELINE_VERSION, [__file__],
+        workers, force)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Repair sentence fragments in subtitles/{idx}.vtt into subtitles/{idx}_corrected.vtt")
+    parser.add_argument('episodes', nargs='*',
+                        help='episode indices, ranges like 0-419, or globs like "subtitles/2*.vtt" '
+                             '(default: every merged file)')
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count() or 1,
+                        help='number of worker processes (default: CPU count)')
+    parser.add_argument('--subtitle-dir', default='subtitles')
+    parser.add_argument('--force', action='store_true', help='ignore the build manifest and rebuild everything')
+    args = parser.parse_args(argv)
+
+    specs = args.episodes or [os.path.join(args.subtitle_dir, '*.vtt')]
+    indices = [idx for idx in resolve_episodes(specs)
+               if os.path.exists(episode_io(idx, args.subtitle_dir)[0][0])]
+    summary = run_batch(indices, args.workers, args.subtitle_dir, args.force)
+
+    for failure in summary['failures']:
+        print(f"❌ Error processing {failure['idx']}: {failure['error']}")
+    print(f"✓ {summary['succeeded']}/{summary['episodes']} episodes corrected, {summary['skipped']} up to date, "
+          f"in {summary['wall_seconds']:.1f}s with {summary['workers']} worker(s)")
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,73 @@
+"""Speaker-turn pages over a corrected subtitle text, for windowed highlighting
+
+A corrected file is a sequence of "[PersonN]: ..." and "[Unknown]: ..."
+turns, the same turns speaker_index.py indexes. Long episodes are cut into
+pages of whole turns, each a (start, end) range of global character offsets;
+the pages tile the text exactly. The annotation view hands only one
+page and the annotations inside it to the highlighter, shifting offsets to
+the page on the way out and back to the whole text on the way in, so every
+stored annotation keeps its global offsets.
+"""
+from bisect import bisect_right
+
+from subtitle_processing import TURN_TAG_RE
+
+# Characters per page; a long Arena episode has 70-90k
+WINDOW_CHARS = 6000
+
+
+def turn_starts(text):
+    """Sorted start offsets of the speaker turns; text before the first tag counts as a turn"""
+    starts = [match.start() for match in TURN_TAG_RE.finditer(text)]
+    if not starts or starts[0] != 0:
+        starts.insert(0, 0)
+    return starts
+
+
+def page_bounds(text, max_chars=WINDOW_CHARS):
+    """(start, end) of pages of whole turns, each at most max_chars unless one turn is longer
+
+    A turn longer than a page is split at the last line break or space before
+    the limit.
+    """
+    if not text:
+        return [(0, 0)]
+    cuts = turn_starts(text)[1:] + [len(text)]
+    pages = []
+    start = 0
+    while start < len(text):
+        limit = start + max_chars
+        # Last turn boundary that still fits on this page
+        k = bisect_right(cuts, limit) - 1
+        end = cuts[k] if k >= 0 and cuts[k] > start else None
+        if end is None:
+            if limit >= len(text):
+                end = len(text)
+            else:
+                split = max(text.rfind('\n', start, limit), text.rfind(' ', start, limit))
+                end = split + 1 if split > start else limit
+        pages.append((start, end))
+        start = end
+    return pages
+
+
+def page_of(pages, offset):
+    """Index of the page containing a global offset"""
+    return max(0, bisect_right([start for start, _ in pages], offset) - 1)
+
+
+def window_annotations(annotations, start, end):
+    """Annotations that lie inside [start, end), with offsets relative to the page
+
+    Spans crossing a page boundary can only come from the full view; they are
+    not shown on either page and are kept as they are by ``merge_window``.
+    """
+    return [{**anno, 'start': anno['start'] - start, 'end': anno['end'] - start}
+            for anno in annotations if start <= anno['start'] and anno['end'] <= end]
+
+
+def merge_window(annotations, window, start, end):
+    """Replace the annotations inside [start, end) with the page's current ones, in global offsets"""
+    outside = [anno for anno in annotations if not (start <= anno['start'] and anno['end'] <= end)]
+    inside = [{**anno, 'start': anno['start'] + start, 'end': anno['end'] + start} for anno in window]
+    return sorted(outside + inside, key=lambda anno: (anno['start'], anno['end']))
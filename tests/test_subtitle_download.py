@@ -0,0 +1,179 @@
+"""Offline tests of subtitle_download.run_batch with the StubExtractor"""
+import json
+import os
+import time
+
+import pytest
+
+import subtitle_download
+from subtitle_download import HostRateLimiter, StubExtractor, old_subtitle_path, run_batch
+
+LINKS = {idx: f"https://www.srf.ch/play/tv/arena/video/ep?urn=urn:srf:video:{idx:08d}-aaaa-4aaa-8aaa-aaaaaaaaaaaa"
+         for idx in range(3)}
+
+
+class FlakyExtractor(StubExtractor):
+    """StubExtractor that fails the first ``failures`` attempts per URL"""
+    failures = 2
+    attempts = {}
+
+    def extract_info(self, url, download=True):
+        self.attempts[url] = self.attempts.get(url, 0) + 1
+        if self.attempts[url] <= self.failures:
+            raise OSError("connection reset")
+        return super().extract_info(url, download)
+
+
+class NoCaptionsExtractor(StubExtractor):
+    def extract_info(self, url, download=True):
+        return {'id': 'none'}
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Record backoff sleeps instead of waiting, with the jitter fixed at its maximum"""
+    slept = []
+    monkeypatch.setattr(subtitle_download.time, 'sleep', slept.append)
+    monkeypatch.setattr(subtitle_download.random, 'uniform', lambda low, high: high)
+    return slept
+
+
+@pytest.fixture
+def flaky():
+    FlakyExtractor.attempts = {}
+    return FlakyExtractor
+
+
+def read_state(subtitle_dir):
+    with open(os.path.join(subtitle_dir, subtitle_download.STATE_FILE), encoding='utf-8') as f:
+        return json.load(f)['episodes']
+
+
+def test_downloads_every_episode(tmp_path):
+    summary = run_batch(LINKS, sorted(LINKS), workers=2, subtitle_dir=str(tmp_path), rate=0,
+                        extractor_factory=StubExtractor)
+
+    assert (summary['succeeded'], summary['skipped'], summary['failed']) == (3, 0, 0)
+    for idx, url in LINKS.items():
+        with open(old_subtitle_path(idx, str(tmp_path)), encoding='utf-8') as f:
+            assert url in f.read()
+    assert {entry['status'] for entry in read_state(str(tmp_path)).values()} == {'ok'}
+    # No per-download work directories are left behind
+    assert sorted(os.listdir(tmp_path)) == sorted([subtitle_download.STATE_FILE] +
+                                                  [f"{idx}_old.vtt" for idx in LINKS])
+
+
+def test_retries_with_exponential_backoff(tmp_path, sleeps, flaky):
+    summary = run_batch(LINKS, [0], workers=1, subtitle_dir=str(tmp_path), rate=0, retries=3,
+                        extractor_factory=flaky)
+
+    result = summary['results'][0]
+    assert (result['status'], result['attempts']) == ('ok', 3)
+    assert sleeps == [subtitle_download.BACKOFF_BASE, subtitle_download.BACKOFF_BASE * 2]
+
+
+def test_gives_up_after_the_last_retry(tmp_path, sleeps, flaky):
+    flaky.failures = 10
+    try:
+        summary = run_batch(LINKS, [0], workers=1, subtitle_dir=str(tmp_path), rate=0, retries=2,
+                            extractor_factory=flaky)
+    finally:
+        flaky.failures = FlakyExtractor.__dict__['failures']
+
+    assert summary['failed'] == 1
+    assert summary['results'][0]['attempts'] == 3
+    assert summary['failures'][0]['error'] == "OSError: connection reset"
+    assert read_state(str(tmp_path))['0']['status'] == 'error'
+    assert not os.path.exists(old_subtitle_path(0, str(tmp_path)))
+
+
+def test_backoff_is_capped(tmp_path, sleeps, flaky):
+    flaky.failures = 10
+    try:
+        run_batch(LINKS, [0], workers=1, subtitle_dir=str(tmp_path), rate=0, retries=8, extractor_factory=flaky)
+    finally:
+        flaky.failures = FlakyExtractor.__dict__['failures']
+
+    assert max(sleeps) == subtitle_download.BACKOFF_MAX
+    assert sleeps == sorted(sleeps)
+
+
+def test_rate_limit_spaces_requests_per_host():
+    limiter = HostRateLimiter(rate=20)
+    start = time.monotonic()
+    for _ in range(3):
+        limiter.wait("https://a.example/video")
+    same_host = time.monotonic() - start
+    # Two waits of 1/20 s between three requests to one host
+    assert same_host >= 0.09
+
+    start = time.monotonic()
+    limiter.wait("https://b.example/video")
+    limiter.wait("https://c.example/video")
+    assert time.monotonic() - start < 0.05
+
+
+def test_rate_limit_zero_never_waits():
+    limiter = HostRateLimiter(rate=0)
+    start = time.monotonic()
+    for _ in range(100):
+        limiter.wait("https://a.example/video")
+    assert time.monotonic() - start < 0.05
+
+
+def test_resume_skips_finished_episodes(tmp_path, flaky):
+    run_batch(LINKS, sorted(LINKS), workers=2, subtitle_dir=str(tmp_path), rate=0, extractor_factory=StubExtractor)
+
+    summary = run_batch(LINKS, sorted(LINKS), workers=2, subtitle_dir=str(tmp_path), rate=0, extractor_factory=flaky)
+    assert (summary['skipped'], summary['succeeded']) == (3, 0)
+    assert flaky.attempts == {}
+
+
+def test_resume_redownloads_changed_or_deleted_episodes(tmp_path):
+    run_batch(LINKS, sorted(LINKS), workers=2, subtitle_dir=str(tmp_path), rate=0, extractor_factory=StubExtractor)
+    os.remove(old_subtitle_path(0, str(tmp_path)))
+    links = {**LINKS, 1: LINKS[1].replace('aaaaaaaaaaaa', 'bbbbbbbbbbbb')}
+
+    summary = run_batch(links, sorted(links), workers=2, subtitle_dir=str(tmp_path), rate=0,
+                        extractor_factory=StubExtractor)
+    assert [r['idx'] for r in summary['results'] if r['status'] == 'ok'] == [0, 1]
+    assert summary['skipped'] == 1
+    assert read_state(str(tmp_path))['1']['url'] == links[1]
+
+
+def test_force_redownloads_everything(tmp_path):
+    run_batch(LINKS, sorted(LINKS), workers=2, subtitle_dir=str(tmp_path), rate=0, extractor_factory=StubExtractor)
+    summary = run_batch(LINKS, sorted(LINKS), workers=2, subtitle_dir=str(tmp_path), rate=0,
+                        extractor_factory=StubExtractor, force=True)
+    assert (summary['succeeded'], summary['skipped']) == (3, 0)
+
+
+def test_episodes_without_captions_are_not_retried(tmp_path, sleeps):
+    summary = run_batch(LINKS, [2], workers=1, subtitle_dir=str(tmp_path), rate=0,
+                        extractor_factory=NoCaptionsExtractor)
+    assert summary['missing'] == [2]
+    assert sleeps == []
+
+    summary = run_batch(LINKS, [2], workers=1, subtitle_dir=str(tmp_path), rate=0,
+                        extractor_factory=NoCaptionsExtractor)
+    assert summary['skipped'] == 1
+
+
+def test_stub_refuses_the_default_subtitle_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with pytest.raises(SystemExit) as exit_info:
+        subtitle_download.main(['0', '--stub', '--subtitle-dir', subtitle_download.SUBTITLE_DIR])
+    assert exit_info.value.code == 2
+    assert not os.path.exists(subtitle_download.SUBTITLE_DIR)
+
+
+def test_stub_defaults_to_a_temporary_directory(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(subtitle_download.tempfile, 'tempdir', str(tmp_path / 'tmp'))
+    os.makedirs(tmp_path / 'tmp')
+    (tmp_path / 'video_links.txt').write_text("\n".join(LINKS.values()) + "\n", encoding='utf-8')
+
+    assert subtitle_download.main(['--stub', '--rate', '0']) == 0
+    assert not os.path.exists(subtitle_download.SUBTITLE_DIR)
+    [stub_dir] = os.listdir(tmp_path / 'tmp')
+    assert len(read_state(str(tmp_path / 'tmp' / stub_dir))) == len(LINKS)
@@ -0,0 +1,54 @@
+"""Speaker-turn pages of subtitle_windows"""
+from speaker_index import build_offset_index
+from subtitle_windows import merge_window, page_bounds, page_of, turn_starts, window_annotations
+
+PERSON = "[Person1]: " + "a" * 38 + "\n"
+UNKNOWN = "[Unknown]: " + "b" * 38 + "\n"
+OTHER = "[Person2]: " + "c" * 38 + "\n"
+
+
+def test_unknown_tags_start_a_turn():
+    text = PERSON + UNKNOWN + OTHER
+    assert turn_starts(text) == [0, 50, 100]
+    assert turn_starts(text) == build_offset_index(text)['starts']
+
+
+def test_text_before_the_first_tag_is_a_turn():
+    assert turn_starts("intro " + PERSON) == [0, 6]
+
+
+def test_page_ends_before_an_unknown_turn():
+    text = PERSON + UNKNOWN + OTHER
+    # Room for one and a half turns: the page must end where the Unknown turn starts
+    pages = page_bounds(text, max_chars=75)
+    assert pages == [(0, 50), (50, 100), (100, 150)]
+    assert text[pages[1][0]:].startswith("[Unknown]:")
+
+
+def test_pages_tile_the_text():
+    text = (PERSON + UNKNOWN) * 20 + OTHER
+    pages = page_bounds(text, max_chars=175)
+    assert pages[0][0] == 0 and pages[-1][1] == len(text)
+    assert all(end == next_start for (_, end), (next_start, _) in zip(pages, pages[1:]))
+    assert all(text[start] == '[' for start, _ in pages)
+    assert all(end - start <= 175 for start, end in pages)
+
+
+def test_long_turn_is_split_at_a_space():
+    text = "[Person1]: " + "word " * 40
+    pages = page_bounds(text, max_chars=50)
+    assert all(text[end - 1] == ' ' for _, end in pages[:-1])
+    assert pages[-1][1] == len(text)
+
+
+def test_window_round_trip_keeps_global_offsets():
+    text = PERSON + UNKNOWN + OTHER
+    pages = page_bounds(text, max_chars=75)
+    annotations = [{'start': 12, 'end': 20}, {'start': 62, 'end': 70}, {'start': 45, 'end': 55}]
+    start, end = pages[page_of(pages, 62)]
+
+    window = window_annotations(annotations, start, end)
+    assert window == [{'start': 12, 'end': 20}]
+    window.append({'start': 30, 'end': 35})
+    assert merge_window(annotations, window, start, end) == [
+        {'start': 12, 'end': 20}, {'start': 45, 'end': 55}, {'start': 62, 'end': 70}, {'start': 80, 'end': 85}]
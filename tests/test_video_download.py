@@ -0,0 +1,128 @@
+"""Offline tests of video-download.py against range_server"""
+import importlib.util
+import os
+import time
+from pathlib import Path
+
+import pytest
+import requests
+
+import range_server
+
+spec = importlib.util.spec_from_file_location('video_download', Path(__file__).parent.parent / 'video-download.py')
+video_download = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(video_download)
+
+SIZE = 64 * 1024
+
+
+class RecordingSession(requests.Session):
+    """Session that records the Range header of every request"""
+
+    def __init__(self):
+        super().__init__()
+        self.ranges = []
+
+    def get(self, url, **kwargs):
+        self.ranges.append((kwargs.get('headers') or {}).get('Range'))
+        return super().get(url, **kwargs)
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    """range_server serving tmp_path/www with two sample episodes; yields (links, www directory)"""
+    monkeypatch.setattr(video_download, 'MIN_PART_SIZE', 4 * 1024)
+    monkeypatch.setattr(video_download, 'CHUNK_SIZE', 4 * 1024)
+    www = tmp_path / 'www'
+    httpd, base_url = range_server.serve(str(www))
+    links_path = range_server.make_samples(str(www), base_url, count=2, size=SIZE)
+    with open(links_path, encoding='utf-8') as f:
+        links = dict(enumerate(line.strip() for line in f))
+    yield links, www
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def sample(www, i):
+    return (www / f'sample_{i}.mp4').read_bytes()
+
+
+def interrupted_download(output_file, url, size, parts, have):
+    """Leave the .parts sidecar and the first ``have`` bytes of every part, as an interrupted run would"""
+    session = requests.Session()
+    _, _, validator = video_download.probe(session, url)
+    ranges = video_download.split_ranges(size, parts)
+    part_paths = [video_download.part_path(output_file, start, end) for start, end in ranges]
+    video_download.prepare_parts(output_file, url, size, validator, part_paths)
+    for path, (start, end) in zip(part_paths, ranges):
+        response = session.get(url, headers={'Range': f'bytes={start}-{start + have - 1}'})
+        with open(path, 'wb') as f:
+            f.write(response.content)
+    session.close()
+    return ranges
+
+
+def leftovers(directory):
+    return [name for name in os.listdir(directory) if '.part' in name]
+
+
+def test_full_download(server, tmp_path):
+    links, www = server
+    output_dir = tmp_path / 'videos'
+
+    summary = video_download.run_batch(links, sorted(links), videos=2, parts=4, output_dir=str(output_dir))
+
+    assert (summary['succeeded'], summary['failed']) == (2, 0)
+    assert summary['bytes'] == 2 * SIZE
+    for i in links:
+        assert (output_dir / f'video_{i}.mp4').read_bytes() == sample(www, i)
+    assert leftovers(output_dir) == []
+
+    summary = video_download.run_batch(links, sorted(links), videos=2, parts=4, output_dir=str(output_dir))
+    assert summary['skipped'] == 2
+
+
+def test_resume_fetches_only_the_missing_bytes(server, tmp_path):
+    links, www = server
+    url = f"{links[0].split('/episode_')[0]}/sample_0.mp4"
+    output_file = str(tmp_path / 'video_0.mp4')
+    ranges = interrupted_download(output_file, url, SIZE, parts=4, have=1000)
+
+    session = RecordingSession()
+    video_download.download_file(session, url, output_file, parts=4)
+
+    assert Path(output_file).read_bytes() == sample(www, 0)
+    assert sorted(session.ranges[1:]) == sorted(f'bytes={start + 1000}-{end}' for start, end in ranges)
+    assert leftovers(tmp_path) == []
+
+
+def test_resume_with_other_parts_discards_the_old_split(server, tmp_path):
+    links, www = server
+    url = f"{links[0].split('/episode_')[0]}/sample_0.mp4"
+    output_file = str(tmp_path / 'video_0.mp4')
+    # Part 1 of a 4-part split is half as long as part 1 of a 2-part split
+    interrupted_download(output_file, url, SIZE, parts=4, have=SIZE // 4)
+
+    video_download.download_file(requests.Session(), url, output_file, parts=2)
+
+    assert Path(output_file).read_bytes() == sample(www, 0)
+    assert leftovers(tmp_path) == []
+
+
+def test_resume_after_the_remote_file_changed(server, tmp_path):
+    links, www = server
+    url = f"{links[0].split('/episode_')[0]}/sample_0.mp4"
+    output_file = str(tmp_path / 'video_0.mp4')
+    interrupted_download(output_file, url, SIZE, parts=4, have=1000)
+    # Same size, new content and a later Last-Modified
+    (www / 'sample_0.mp4').write_bytes(os.urandom(SIZE))
+    later = time.time() + 10
+    os.utime(www / 'sample_0.mp4', (later, later))
+
+    session = RecordingSession()
+    video_download.download_file(session, url, output_file, parts=4)
+
+    assert Path(output_file).read_bytes() == sample(www, 0)
+    # Every part starts over
+    assert sorted(session.ranges[1:]) == sorted(f'bytes={start}-{end}'
+                                                for start, end in video_download.split_ranges(SIZE, 4))
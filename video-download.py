@@ -1,61 +1,274 @@
+"""Download the MP4 of every episode in video_links.txt
+
+For each episode page the first link ending in .mp4 is downloaded to
+OUTPUT_DIR/video_{idx}.mp4, idx being the episode's ID in the episode
+registry. Several videos are in flight at once, all on one pooled
+requests.Session. When the server supports HTTP Range requests a video
+is split into parts that download in parallel into {output}.part{start}-{end}
+files; an interrupted run resumes every part from its current size, and the
+parts are joined into the final file only once all of them are complete.
+A {output}.parts sidecar records the size and validator (ETag or
+Last-Modified) of the remote file the parts came from. Parts of another
+split, or of a remote file that has changed since, are deleted instead of
+being resumed.
+
+Usage:
+    python video-download.py [episodes ...] [-j N] [--parts N] [--output-dir DIR]
+
+To try it offline, serve sample pages with range_server.py and point --links
+at the links file it writes.
+"""
+import argparse
+import glob
+import json
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urljoin
+
 import requests
 from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
 from tqdm import tqdm
-import os
-from datetime import datetime
-def download_video(url,i):
-# 视频页面 URL
-# page_url = "https://www.srf.ch/play/tv/arena/video/parteispitzen-zu-us-zoellen-ukraine-und-gaza?urn=urn:srf:video:168db9f4-a1e4-473d-bcda-873c191a0062"
-
-# 请求页面
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"
-    }
-    response = requests.get(url, headers=headers)
-    response.raise_for_status()
+from urllib3.util.retry import Retry
+
+from episode_registry import episode_links
+from merge_subtitle import resolve_episodes
+
+OUTPUT_DIR = "/s3/politperformance/politperformance-data/politicalvideo"
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"
+}
+# Read buffer per request; large buffers keep the per-chunk overhead low on fast links
+CHUNK_SIZE = 1024 * 1024
+# Parts below this size are not worth a separate request
+MIN_PART_SIZE = 8 * 1024 * 1024
+DEFAULT_VIDEOS = 3
+DEFAULT_PARTS = 4
+TIMEOUT = (10, 60)
 
-    # 解析页面
-    soup = BeautifulSoup(response.text, "html.parser")
 
-    # 尝试查找 MP4 下载链接
-    video_url = None
+def make_session(pool_size):
+    """A Session whose connection pool fits every concurrent request, retrying transient errors"""
+    session = requests.Session()
+    session.headers.update(HEADERS)
+    retry = Retry(total=5, backoff_factor=1, status_forcelist=(429, 500, 502, 503, 504),
+                  allowed_methods=('GET', 'HEAD'))
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def find_video_url(session, page_url):
+    """Return the first .mp4 link on an episode page, or None"""
+    response = session.get(page_url, timeout=TIMEOUT)
+    response.raise_for_status()
+    soup = BeautifulSoup(response.text, "html.parser")
     for tag in soup.find_all("a", href=True):
-        href = tag['href']
-        if href.endswith(".mp4"):
-            video_url = href
-            break
-
-    # 获取当前时间
-    # now = datetime.now()
-    # 格式化为字符串，示例：2025-09-16_14-30-00
-    # time_str = now.strftime("%Y-%m-%d_%H-%M-%S")
-
-    if video_url:
-        print(f"find the video link: {video_url}")
-        # 下载视频
-        output_file = f"/s3/politperformance/politperformance-data/politicalvideo/video_{i}.mp4"
-        with requests.get(video_url, stream=True) as r:
-            r.raise_for_status()
-            total_size = int(r.headers.get('content-length', 0))
-            chunk_size = 8192
-
-            with open(output_file, 'wb') as f, tqdm(
-                total=total_size, unit='B', unit_scale=True, desc='video.mp4'
-            ) as bar:
-                for chunk in r.iter_content(chunk_size=chunk_size):
-                    if chunk:
+        if tag['href'].endswith(".mp4"):
+            return urljoin(page_url, tag['href'])
+    return None
+
+
+def probe(session, url):
+    """Return (size or None, whether the server honours Range requests, validator or None)
+
+    The validator is the ETag, or else the Last-Modified date, of the remote file.
+    """
+    with session.get(url, headers={'Range': 'bytes=0-0'}, stream=True, timeout=TIMEOUT) as r:
+        r.raise_for_status()
+        validator = r.headers.get('ETag') or r.headers.get('Last-Modified')
+        if r.status_code == 206 and '/' in r.headers.get('Content-Range', ''):
+            total = r.headers['Content-Range'].rsplit('/', 1)[1]
+            return (int(total) if total.isdigit() else None), total.isdigit(), validator
+        length = r.headers.get('Content-Length')
+        return (int(length) if length else None), False, validator
+
+
+def split_ranges(size, parts):
+    """Split [0, size) into at most ``parts`` inclusive byte ranges of at least MIN_PART_SIZE"""
+    parts = max(1, min(parts, size // MIN_PART_SIZE))
+    bounds = [size * k // parts for k in range(parts + 1)]
+    return [(bounds[k], bounds[k + 1] - 1) for k in range(parts)]
+
+
+def part_path(output_file, start, end):
+    return f"{output_file}.part{start}-{end}"
+
+
+def prepare_parts(output_file, url, size, validator, part_paths):
+    """Delete the part files that cannot be resumed and record what the remaining ones belong to
+
+    Every part is dropped if the sidecar is missing or names another URL, size
+    or validator; otherwise only parts of another split are dropped.
+    """
+    sidecar = f"{output_file}.parts"
+    source = {'url': url, 'size': size, 'validator': validator}
+    try:
+        with open(sidecar, 'r', encoding='utf-8') as f:
+            unchanged = json.load(f) == source
+    except (OSError, ValueError):
+        unchanged = False
+    for path in glob.glob(f"{glob.escape(output_file)}.part*-*"):
+        if not unchanged or path not in part_paths:
+            os.remove(path)
+    with open(sidecar, 'w', encoding='utf-8') as f:
+        json.dump(source, f)
+
+
+def download_part(session, url, part_path, start, end, bar=None, validator=None):
+    """Fetch bytes [start, end] into part_path, resuming from what is already there
+
+    With a validator the request carries If-Range, so a remote file that
+    changed since the probe is not appended to the part.
+    """
+    expected = end - start + 1
+    done = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    if done > expected:
+        os.remove(part_path)
+        done = 0
+    if bar:
+        bar.update(done)
+    if done == expected:
+        return
+
+    headers = {'Range': f'bytes={start + done}-{end}'}
+    if validator:
+        headers['If-Range'] = validator
+    with session.get(url, headers=headers, stream=True, timeout=TIMEOUT) as r:
+        r.raise_for_status()
+        if r.status_code != 206:
+            raise IOError(f"server ignored Range request for {url} or the file changed")
+        with open(part_path, 'ab') as f:
+            for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
+                f.write(chunk)
+                if bar:
+                    bar.update(len(chunk))
+    if os.path.getsize(part_path) != expected:
+        raise IOError(f"incomplete part {part_path}")
+
+
+def download_file(session, url, output_file, parts=DEFAULT_PARTS, desc=None):
+    """Download url to output_file through .part files; return the number of bytes"""
+    size, ranged, validator = probe(session, url)
+    with tqdm(total=size, unit='B', unit_scale=True, desc=desc or os.path.basename(output_file),
+              leave=False) as bar:
+        if ranged and size:
+            ranges = split_ranges(size, parts)
+            part_paths = [part_path(output_file, start, end) for start, end in ranges]
+            prepare_parts(output_file, url, size, validator, part_paths)
+            with ThreadPoolExecutor(max_workers=len(ranges)) as pool:
+                futures = [pool.submit(download_part, session, url, path, start, end, bar, validator)
+                           for path, (start, end) in zip(part_paths, ranges)]
+                for future in futures:
+                    future.result()
+            tmp_path = f"{output_file}.part"
+            with open(tmp_path, 'wb') as out:
+                for path in part_paths:
+                    with open(path, 'rb') as f:
+                        shutil.copyfileobj(f, out, CHUNK_SIZE)
+            os.replace(tmp_path, output_file)
+            for path in part_paths:
+                os.remove(path)
+            os.remove(f"{output_file}.parts")
+        else:
+            # No Range support: a single stream, restarted from scratch on failure
+            tmp_path = f"{output_file}.part"
+            with session.get(url, stream=True, timeout=TIMEOUT) as r:
+                r.raise_for_status()
+                with open(tmp_path, 'wb') as f:
+                    for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
                         f.write(chunk)
                         bar.update(len(chunk))
+            os.replace(tmp_path, output_file)
+    return os.path.getsize(output_file)
+
+
+def download_video(session, url, i, output_dir=OUTPUT_DIR, parts=DEFAULT_PARTS):
+    """Download one episode's video and return a result record for the run summary"""
+    output_file = os.path.join(output_dir, f"video_{i}.mp4")
+    result = {'idx': i, 'url': url, 'status': 'ok', 'bytes': 0, 'seconds': 0.0, 'error': None}
+    start = time.perf_counter()
+    try:
+        video_url = find_video_url(session, url)
+        if video_url:
+            result['bytes'] = download_file(session, video_url, output_file, parts, desc=f"video_{i}")
+        else:
+            result['status'] = 'missing'
+    except Exception as e:
+        result['status'] = 'error'
+        result['error'] = f"{type(e).__name__}: {e}"
+    result['seconds'] = round(time.perf_counter() - start, 4)
+    return result
+
+
+def run_batch(links, indices, videos=DEFAULT_VIDEOS, parts=DEFAULT_PARTS, output_dir=OUTPUT_DIR):
+    """Download the videos of the given episodes that are not on disk yet and return the run summary"""
+    start = time.perf_counter()
+    os.makedirs(output_dir, exist_ok=True)
+    session = make_session(videos * parts)
+    results = []
+
+    pending = []
+    for i in indices:
+        if os.path.exists(os.path.join(output_dir, f"video_{i}.mp4")):
+            results.append({'idx': i, 'url': links[i], 'status': 'skipped', 'bytes': 0, 'seconds': 0.0,
+                            'error': None})
+        else:
+            pending.append(i)
+
+    with ThreadPoolExecutor(max_workers=max(1, videos)) as pool:
+        futures = [pool.submit(download_video, session, links[i], i, output_dir, parts) for i in pending]
+        for future in tqdm(as_completed(futures), total=len(futures), disable=not futures, desc='videos'):
+            results.append(future.result())
+    session.close()
+
+    results.sort(key=lambda r: r['idx'])
+    failures = [r for r in results if r['status'] == 'error']
+    wall = time.perf_counter() - start
+    total_bytes = sum(r['bytes'] for r in results)
+    return {
+        'videos': videos,
+        'parts': parts,
+        'episodes': len(results),
+        'succeeded': sum(1 for r in results if r['status'] == 'ok'),
+        'missing': [r['idx'] for r in results if r['status'] == 'missing'],
+        'skipped': sum(1 for r in results if r['status'] == 'skipped'),
+        'failed': len(failures),
+        'bytes': total_bytes,
+        'wall_seconds': round(wall, 4),
+        'mb_per_s': round(total_bytes / 1e6 / wall, 2) if wall else None,
+        'failures': [{'idx': r['idx'], 'url': r['url'], 'error': r['error']} for r in failures],
+        'results': results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Download the MP4 of every episode")
+    parser.add_argument('episodes', nargs='*', help='episode indices or ranges like 0-100 (default: every link)')
+    parser.add_argument('--links', default='video_links.txt')
+    parser.add_argument('--output-dir', default=OUTPUT_DIR)
+    parser.add_argument('-j', '--videos', type=int, default=DEFAULT_VIDEOS,
+                        help=f'videos downloaded at once (default: {DEFAULT_VIDEOS})')
+    parser.add_argument('--parts', type=int, default=DEFAULT_PARTS,
+                        help=f'parallel Range requests per video (default: {DEFAULT_PARTS})')
+    args = parser.parse_args(argv)
+
+    links = episode_links(args.links)
+    indices = [i for i in (resolve_episodes(args.episodes) if args.episodes else sorted(links)) if i in links]
+
+    summary = run_batch(links, indices, args.videos, args.parts, args.output_dir)
+    for failure in summary['failures']:
+        print(f"❌ Download failed {failure['idx']} {failure['url']}: {failure['error']}")
+    for i in summary['missing']:
+        print(f"⚠️ MP4 not found: {i} {links[i]}")
+    print(f"✓ {summary['succeeded']}/{summary['episodes']} videos downloaded, {summary['skipped']} already on disk, "
+          f"{summary['bytes'] / 1e6:.1f} MB in {summary['wall_seconds']:.1f}s ({summary['mb_per_s']} MB/s)")
+    return 1 if summary['failed'] else 0
+
 
-        print(f"Download finished: {output_file}")
-    else:
-        print("MP4 not found")
-links = open('video_links.txt', 'r').read().splitlines()
-for i,link in tqdm(enumerate(links)):
-    path = f"/s3/politperformance/politperformance-data/politicalvideo/video_{i}.mp4"
-    if os.path.exists(path):
-        continue
-    print(f"Downloading video {i}")
-    download_video(link,i)
-    if i>100:
-        break
\ No newline at end of file
+if __name__ == "__main__":
+    sys.exit(main())
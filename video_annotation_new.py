@@ -1,13 +1,19 @@
-import json
 import streamlit as st
 import pandas as pd
 import os
 from datetime import datetime
-import re
 
-from pygments.lexer import combined
 from text_highlighter import text_highlighter
 
+from annotation_export import FORMATS as EXPORT_FORMATS, export_annotations, export_fingerprint
+from annotation_store import AnnotationStore, build_records
+from app_cache import cache_stats, mtime_cached
+from corpus_store import corrected_subtitle_path, open_store
+from episode_registry import registry_path_for
+from speaker_index import OffsetIndex, offset_index_path, person_numbers
+from subtitle_windows import merge_window, page_bounds, window_annotations
+from vtt_parser import ANY_TAG_RE, format_vtt_time, iter_cues
+
 st.set_page_config(
     page_title="Political Argument Annotation Tool",
     layout="wide",  # Wide screen model
@@ -49,34 +55,18 @@ USER_CREDENTIALS = {
 # File paths
 URL_FILE = "video_links.txt"
 INFO_FILE = 'video_info.json'
-SAVE_FILE = "annotations.csv"
+SAVE_FILE = "annotations.db"
+LEGACY_SAVE_FILE = "annotations.csv"  # imported into SAVE_FILE on first start
+STORE_FILE = "arena_corpus.db"  # compiled from URL_FILE, INFO_FILE and subtitles/ by corpus_store.py
 
 
 # ---------- 读取VTT字幕 ----------
 def load_vtt_with_time(file_path):
     with open(file_path, "r", encoding="utf-8") as f:
-        lines = f.readlines()
-
-    subtitles = []
-    buffer = []
-    current_time = ""
-    for line in lines:
-        line = line.strip()
-        if line.isdigit():
-            if buffer and current_time:
-                text = ' '.join(buffer).strip()
-                subtitles.append({"time": current_time, "text": text})
-                buffer = []
-                current_time = ""
-        elif "-->" in line:
-            current_time = line
-        elif line:
-            buffer.append(line)
-    if buffer and current_time:
-        text = ' '.join(buffer).strip()
-        subtitles.append({"time": current_time, "text": text})
-
-    return subtitles
+        return [
+            {"time": f"{format_vtt_time(cue.start)} --> {format_vtt_time(cue.end)}", "text": cue.text}
+            for cue in iter_cues(f, strip_tags=False)
+        ]
 
 
 # ---------- 将字幕转换为纯文本 ----------
@@ -85,43 +75,12 @@ def subtitles_to_text(subtitles):
     lines = []
     for i, sub in enumerate(subtitles, start=1):
         # 移除HTML标签
-        text = re.sub(r'<[^>]+>', '', sub['text'])
+        text = ANY_TAG_RE.sub('', sub['text'])
         text = text.strip('WEBVTT ')
         lines.append(f"[{sub['time']}] {text}")
     return "\n".join(lines)
 
 
-# ---------- Load video data ----------
-def load_video_data(url_path, info_path):
-    data = []
-    urls = [line.strip() for line in open(url_path, "r").readlines()]
-    infos = []
-    with open(info_path, "r", encoding="utf-8") as f:
-        buffer = ""
-        for line in f:
-            line = line.strip()
-            if not line:
-                continue
-            buffer += line
-            if line.endswith("}"):
-                try:
-                    obj = json.loads(buffer)
-                    infos.append(obj)
-                    buffer = ""
-                except json.JSONDecodeError:
-                    pass
-    for i, url in enumerate(urls):
-        info = infos[i]
-        data.append({
-            "original_idx": i,
-            "url": url,
-            "clip_info": '',
-            "title": info["title"],
-            "basic_info": info["description"]
-        })
-    return data
-
-
 def get_user_videos(all_videos, username):
     """根据用户身份返回可见的视频列表"""
     user_info = USER_CREDENTIALS.get(username)
@@ -146,76 +105,108 @@ def get_user_videos(all_videos, username):
 
     return []
 
+# ---------- Cached loaders ----------
+# Reruns are served from memory; entries reload when the files they came from change
+@mtime_cached("corpus_store", lambda: [URL_FILE, INFO_FILE, registry_path_for(URL_FILE), STORE_FILE], maxsize=1)
+def get_corpus():
+    return open_store(STORE_FILE, URL_FILE, INFO_FILE)
+
+
+@mtime_cached("video_list", lambda: [STORE_FILE], maxsize=1)
+def load_video_list():
+    return get_corpus().list_videos()
+
+
+@mtime_cached("user_videos", lambda username: [STORE_FILE], maxsize=16)
+def load_user_videos(username):
+    return get_user_videos(load_video_list(), username)
+
+
+@mtime_cached("user_positions", lambda username: [STORE_FILE], maxsize=16)
+def load_user_positions(username):
+    """original_idx -> position in the user's video list"""
+    return {video['original_idx']: i for i, video in enumerate(load_user_videos(username))}
+
+
+@mtime_cached("video_records", lambda original_idx: [STORE_FILE], maxsize=64)
+def load_video(original_idx):
+    return get_corpus().get_video(original_idx)
+
+
+@mtime_cached("subtitle_text", lambda original_idx: [corrected_subtitle_path(original_idx), STORE_FILE], maxsize=32)
+def load_subtitle_text(original_idx):
+    return get_corpus().get_subtitle_text(original_idx)
+
+
+@mtime_cached("subtitle_pages", lambda original_idx: [corrected_subtitle_path(original_idx), STORE_FILE], maxsize=32)
+def load_subtitle_pages(original_idx):
+    """Speaker-turn pages of the subtitle text, as global (start, end) offsets"""
+    return page_bounds(load_subtitle_text(original_idx))
+
+
+@mtime_cached("offset_index", lambda original_idx: [corrected_subtitle_path(original_idx),
+                                                    offset_index_path(original_idx), STORE_FILE], maxsize=32)
+def load_offset_index(original_idx):
+    """Speaker turns (and their video times, if indexed) of the subtitle text"""
+    return OffsetIndex.load(offset_index_path(original_idx), load_subtitle_text(original_idx))
+
+
+@mtime_cached("annotation_store", lambda: [], maxsize=1)
+def get_annotation_store():
+    return AnnotationStore(SAVE_FILE, LEGACY_SAVE_FILE)
+
+
+@mtime_cached("dashboard_summary", lambda data_version: [], maxsize=2)
+def load_dashboard_summary(data_version):
+    """Dashboard metrics and figures from the store's counters, rebuilt only when data_version changes"""
+    import plotly.express as px
+
+    store = get_annotation_store()
+    counters = store.counters()
+    total = sum(counters["user"].values())
+    videos = len(counters["video"])
+
+    user_stats = pd.DataFrame(sorted(counters["user"].items()), columns=["username", "count"])
+    type_stats = pd.DataFrame(sorted(counters["type"].items()), columns=["argument_type", "count"])
+    daily_counts = pd.DataFrame(sorted(counters["day"].items()), columns=["date", "count"])
+    daily_counts["date"] = pd.to_datetime(daily_counts["date"]).dt.date
+
+    return {
+        "total": total,
+        "videos": videos,
+        "users": len(counters["user"]),
+        "avg_per_video": total / videos if videos else 0,
+        "fig_users": px.bar(user_stats, x='username', y='count', title='Annotations per User'),
+        "fig_types": px.pie(type_stats, names='argument_type', values='count', title='Argument Types'),
+        "fig_daily": px.line(daily_counts, x='date', y='count', title='Daily Annotations'),
+        # Filter options for the annotations table
+        "types": sorted(counters["type"]),
+        "titles": store.distinct_values("video_title"),
+    }
+
+
 def save_annotation(video_info, annotations_list, username):
     """保存所有标注记录"""
-    records = []
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-    for idx, anno in enumerate(annotations_list, start=1):
-        record = {
-            "timestamp": timestamp,
-            "username": username,
-            "video_idx":  video_info['original_idx'],
-            "video_url": video_info['url'],
-            "video_title": video_info['title'],
-            "video_basic_info": video_info['basic_info'],
-            "annotation_order": idx,
-            "argument_type": anno['type'],
-            "claim": anno['claim'],
-            "premise": anno['premise'],
-            "unclear": anno.get('unclear', ''),  # 🔥 ADD THIS
-            "person": anno.get('person', ''),  # 🔥 ADD THIS LINE
-        }
-        records.append(record)
+    records = build_records(video_info, annotations_list, username)
 
     if not records:
         st.warning("No annotations to save!")
         return False
 
-    if os.path.exists(SAVE_FILE):
-        df_existing = pd.read_csv(SAVE_FILE)
-        df_existing = df_existing[
-            ~((df_existing["video_idx"] == video_info['original_idx']) &
-              (df_existing["username"] == username))
-        ]
-        # df_existing = df_existing[df_existing["video_idx"] != st.session_state.idx]
-        df_new = pd.DataFrame(records)
-        df = pd.concat([df_existing, df_new], ignore_index=True)
-    else:
-        df = pd.DataFrame(records)
-
-    df.to_csv(SAVE_FILE, index=False)
-
-    backup_file = f"annotations_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-    df.to_csv(backup_file, index=False)
-
+    # Appends one save and supersedes the previous one for this user/video
+    get_annotation_store().replace_annotations(username, video_info['original_idx'], records)
     return True
 
 
-def get_last_annotated_video(username, video_data):
+def get_last_annotated_video(username):
     """获取用户最后标注的视频索引"""
-    if not os.path.exists(SAVE_FILE):
-        return 0  # 如果没有保存文件，从第一个视频开始
-
     try:
-        df = pd.read_csv(SAVE_FILE)
-
-        # 筛选出该用户的标注记录
-        user_annotations = df[df['username'] == username]
-
-        if user_annotations.empty:
+        last_video_idx = get_annotation_store().last_saved_video(username)
+        if last_video_idx is None:
             return 0  # 该用户没有标注记录，从第一个视频开始
 
-        # 获取最后一次标注的 original_video_idx
-        last_video_idx = user_annotations.iloc[-1]['video_idx']
-
-        # 在过滤后的 video_data 中找到对应的位置
-        for i, video in enumerate(video_data):
-            if video['original_idx'] == last_video_idx:
-                return i  # 返回在过滤后列表中的位置
-
-        # 如果没找到（比如该视频不在用户的可见范围内），返回0
-        return 0
+        # 在过滤后的 video_data 中找到对应的位置；不在可见范围内则返回0
+        return load_user_positions(username).get(last_video_idx, 0)
 
     except Exception as e:
         print(f"Error loading last position: {e}")
@@ -306,15 +297,14 @@ if page == "Annotation":
     )
 
     # 🔥 修改：加载所有视频，然后根据用户过滤
-    all_video_data = load_video_data(URL_FILE, INFO_FILE)
-    video_data = get_user_videos(all_video_data, st.session_state.username)
+    video_data = load_user_videos(st.session_state.username)
 
     if not video_data:
         st.warning("No video data available for your account.")
     else:
         # 🔥 新增：恢复上次标注位置
         if st.session_state.get('need_restore_position', False):
-            last_position = get_last_annotated_video(st.session_state.username, video_data)
+            last_position = get_last_annotated_video(st.session_state.username)
             st.session_state.idx = last_position
             st.session_state.need_restore_position = False  # 只恢复一次
 
@@ -327,6 +317,13 @@ if page == "Annotation":
         else:
             st.info(f"📹 **Your assigned videos**: Total {len(video_data)} videos")
 
+        # 进度：已完成/剩余 (read from the progress index, not the annotation history)
+        completed_videos = get_annotation_store().completed_videos(st.session_state.username)
+        user_positions = load_user_positions(st.session_state.username)
+        completed_count = sum(1 for idx in completed_videos if idx in user_positions)
+        st.sidebar.markdown(f"**✅ Completed:** {completed_count}/{len(video_data)}")
+        st.sidebar.markdown(f"**⏳ Remaining:** {len(video_data) - completed_count}")
+
         # Dropdown selection（其余代码保持不变）
     # video_data = load_video_data(URL_FILE, INFO_FILE)
 
@@ -344,7 +341,7 @@ if page == "Annotation":
             "Select video to annotate",
             range(len(video_data)),
             index=st.session_state.idx,
-            format_func=lambda x: video_data[x]["title"],
+            format_func=lambda x: ("✅ " if video_data[x]["original_idx"] in completed_videos else "") + video_data[x]["title"],
             # key="selectbox_idx",
             # on_change=update_idx
         )
@@ -354,7 +351,7 @@ if page == "Annotation":
             st.rerun()
 
         # Current video
-        video = video_data[st.session_state.idx]
+        video = load_video(video_data[st.session_state.idx]['original_idx'])
         video_idx = st.session_state.idx
         original_video_idx = video['original_idx']  # 🔥 这是原始索引
 
@@ -370,7 +367,7 @@ if page == "Annotation":
         # original_video_idx = video['original_idx']
         # subtitles = load_vtt_with_time(f"subtitles/{original_video_idx}.vtt")
         # subtitle_text = subtitles_to_text(subtitles)
-        subtitle_text = ''.join(open(f"subtitles/{original_video_idx}_corrected.vtt").readlines())
+        subtitle_text = load_subtitle_text(original_video_idx)
 
         # 初始化当前视频的高亮标注
         if original_video_idx not in st.session_state.highlighter_annotations:
@@ -392,18 +389,47 @@ if page == "Annotation":
         # 使用 text_highlighter 组件
         if original_video_idx not in st.session_state.saved_annotation_ids:
             st.session_state.saved_annotation_ids[original_video_idx] = set()
-        highlighted = text_highlighter(
-            text=subtitle_text,
-            labels=[
-                ("Claim", "#FFB6C1"),  # 浅粉色
-                ("Premise", "#87CEEB"),  # 浅蓝色
-                ("Unclear", "#D3D3D3"),
-            ],
-            annotations=st.session_state.highlighter_annotations[original_video_idx],
-            key=f"highlighter_{original_video_idx}_{st.session_state.highlighter_key[original_video_idx]}",
-            show_label_selector=True,
-            text_height=400
-        )
+        highlighter_labels = [
+            ("Claim", "#FFB6C1"),  # 浅粉色
+            ("Premise", "#87CEEB"),  # 浅蓝色
+            ("Unclear", "#D3D3D3"),
+        ]
+        # Long transcripts are shown one page of speaker turns at a time; only
+        # that page and its highlights are sent to the component, while the
+        # stored highlights keep offsets into the whole text
+        subtitle_pages = load_subtitle_pages(original_video_idx)
+        windowed = len(subtitle_pages) > 1 and st.checkbox(
+            "Page through the transcript", value=True, key="windowed_subtitles",
+            help="Show one page of speaker turns at a time; faster for long episodes")
+        if windowed:
+            page_idx = st.selectbox(
+                "Page",
+                range(len(subtitle_pages)),
+                format_func=lambda k: f"{k + 1}/{len(subtitle_pages)}: "
+                                      f"{subtitle_text[subtitle_pages[k][0]:subtitle_pages[k][0] + 60].strip()}…",
+                key=f"subtitle_page_{original_video_idx}",
+            )
+            page_start, page_end = subtitle_pages[page_idx]
+            highlighted_page = text_highlighter(
+                text=subtitle_text[page_start:page_end],
+                labels=highlighter_labels,
+                annotations=window_annotations(
+                    st.session_state.highlighter_annotations[original_video_idx], page_start, page_end),
+                key=f"highlighter_{original_video_idx}_{page_idx}_{st.session_state.highlighter_key[original_video_idx]}",
+                show_label_selector=True,
+                text_height=400
+            )
+            highlighted = merge_window(
+                st.session_state.highlighter_annotations[original_video_idx], highlighted_page, page_start, page_end)
+        else:
+            highlighted = text_highlighter(
+                text=subtitle_text,
+                labels=highlighter_labels,
+                annotations=st.session_state.highlighter_annotations[original_video_idx],
+                key=f"highlighter_{original_video_idx}_{st.session_state.highlighter_key[original_video_idx]}",
+                show_label_selector=True,
+                text_height=400
+            )
         if highlighted != st.session_state.highlighter_annotations[original_video_idx]:
             st.session_state.highlighter_annotations[original_video_idx] = highlighted
         def get_annotation_id(anno):
@@ -416,6 +442,10 @@ if page == "Annotation":
         current_claims = [anno for anno in all_claims if get_annotation_id(anno) not in saved_ids]
         current_premises = [anno for anno in all_premises if get_annotation_id(anno) not in saved_ids]
         current_unclear = [anno for anno in all_unclear if get_annotation_id(anno) not in saved_ids]  # 🔥 ADD THIS
+        # Speaker and video time of the highlighted spans, looked up in the offset index
+        offset_index = load_offset_index(original_video_idx)
+        suggested_person = person_numbers(offset_index.speakers_of(
+            [(anno['start'], anno['end']) for anno in current_claims or current_premises]))
         st.markdown("---")
         st.subheader("➕ Create New Annotation")
         # 三元组输入区域
@@ -467,14 +497,22 @@ if page == "Annotation":
             )
         with col3:
             st.markdown("**👤 Person**")
+            person_key = f"person_name_{original_video_idx}_{st.session_state.highlighter_key[original_video_idx]}"
+            # The pre-fill follows the highlighted speaker until the annotator types something else
+            if st.session_state.get(person_key, "") in ("", st.session_state.get(f"{person_key}_suggested", "")):
+                st.session_state[person_key] = suggested_person
+            st.session_state[f"{person_key}_suggested"] = suggested_person
             person_name = st.text_input(
                 "Person name",
-                value="",
-                key=f"person_name_{original_video_idx}_{st.session_state.highlighter_key[original_video_idx]}",
+                key=person_key,
                 placeholder="Optional number (e.g. 11)",
                 label_visibility="collapsed",
-                help="Enter person name or leave empty"
+                help="Pre-filled with the speaker of the highlighted claim (or premise); edit or leave empty"
             )
+            span_time = offset_index.time_range(
+                [(anno['start'], anno['end']) for anno in current_claims + current_premises])
+            if span_time:
+                st.caption(f"🕒 {format_vtt_time(span_time[0])} – {format_vtt_time(span_time[1])}")
         with col4:
             st.markdown("**🏷️ Type**")
             radio_key = f"argument_type_radio_{st.session_state.idx}_{st.session_state.highlighter_key[original_video_idx]}"
@@ -495,24 +533,33 @@ if page == "Annotation":
             if st.button("✅ Add Annotation", type="primary", use_container_width=True):
                 if (current_claims or use_previous_claim) and (current_premises or use_previous_premise):
                     # 获取文本内容
+                    # Video time of the annotation: the highlighted spans, plus the previous
+                    # annotation's time when its claim or premise is reused
+                    time_spans, time_ranges = [], []
                     if use_previous_claim and original_video_idx in st.session_state.annotations and len(
                             st.session_state.annotations[original_video_idx]) > 0:
                         last_anno = st.session_state.annotations[original_video_idx][-1]
                         claim_texts = [last_anno['claim']]
                         claim_ids = last_anno.get('claim_ids', [])
+                        time_ranges.append((last_anno.get('time_start'), last_anno.get('time_end')))
                     else:
                         claim_texts = [subtitle_text[anno['start']:anno['end']] for anno in current_claims]
                         claim_ids = [get_annotation_id(anno) for anno in current_claims]
+                        time_spans += current_claims
                     # claim_texts = [subtitle_text[anno['start']:anno['end']] for anno in current_claims]
                     # claim_ids = [get_annotation_id(anno) for anno in current_claims]
                     if use_previous_premise and original_video_idx in st.session_state.annotations and len(st.session_state.annotations[original_video_idx]) > 0:
                         last_anno = st.session_state.annotations[original_video_idx][-1]
                         premise_texts = [last_anno['premise']]
                         premise_ids = last_anno.get('premise_ids', [])
+                        time_ranges.append((last_anno.get('time_start'), last_anno.get('time_end')))
                     else:
                         premise_texts = [subtitle_text[anno['start']:anno['end']] for anno in current_premises]
                         premise_ids = [get_annotation_id(anno) for anno in current_premises]
+                        time_spans += current_premises
                     unclear_texts = [subtitle_text[anno['start']:anno['end']] for anno in current_unclear]
+                    time_ranges.append(offset_index.time_range([(anno['start'], anno['end']) for anno in time_spans]))
+                    time_ranges = [time_range for time_range in time_ranges if time_range and time_range[0] is not None]
                     unclear_ids = [get_annotation_id(anno) for anno in current_unclear]
 
                     # 创建新标注（三元组）
@@ -522,6 +569,8 @@ if page == "Annotation":
                         'premise': "\n\n".join(premise_texts),
                         'unclear': "\n\n".join(unclear_texts) if unclear_texts else "",  # 🔥 ADD THIS
                         'person': person_name,
+                        'time_start': min(start for start, _ in time_ranges) if time_ranges else None,
+                        'time_end': max(end for _, end in time_ranges) if time_ranges else None,
                         'claim_ids': claim_ids,  # 🔥 新增
                         'premise_ids': premise_ids  # 🔥 新增
                     }
@@ -585,6 +634,9 @@ if page == "Annotation":
                         st.markdown(f"**🏷️ Type:** `{anno['type']}`")
                         if anno.get('person'):  # 🔥 ADD THESE 2 LINES
                             st.markdown(f"**👤 Person:** `{anno['person']}`")
+                        if anno.get('time_start') is not None:
+                            st.markdown(f"**🕒 Time:** `{format_vtt_time(anno['time_start'])} – "
+                                        f"{format_vtt_time(anno['time_end'])}`")
                         st.markdown("**📌 Claim:**")
                         st.text_area(
                             "claim",
@@ -692,55 +744,52 @@ elif page == "Admin Dashboard":
                 st.error("Wrong password!")
         st.stop()
 
-    if os.path.exists(SAVE_FILE):
-        df = pd.read_csv(SAVE_FILE)
-
+    summary = load_dashboard_summary(get_annotation_store().data_version())
+    if summary["total"]:
         col1, col2, col3, col4 = st.columns(4)
         with col1:
-            st.metric("Total Annotations", len(df))
+            st.metric("Total Annotations", summary["total"])
         with col2:
-            st.metric("Annotated Videos", df['video_idx'].nunique())
+            st.metric("Annotated Videos", summary["videos"])
         with col3:
-            st.metric("Active Users", df['username'].nunique() if 'username' in df.columns else "N/A")
+            st.metric("Active Users", summary["users"])
         with col4:
-            avg_per_video = len(df) / df['video_idx'].nunique() if df['video_idx'].nunique() > 0 else 0
-            st.metric("Avg Annotations/Video", f"{avg_per_video:.1f}")
-        if 'username' in df.columns:
-            st.subheader("👥 Annotations by User")
-            user_stats = df.groupby('username').size().reset_index(name='count')
-            import plotly.express as px
-
-            fig_users = px.bar(user_stats, x='username', y='count', title='Annotations per User')
-            st.plotly_chart(fig_users, use_container_width=True)
-        st.subheader("📈 Annotation Type Distribution")
-        import plotly.express as px
+            st.metric("Avg Annotations/Video", f"{summary['avg_per_video']:.1f}")
+
+        st.subheader("👥 Annotations by User")
+        st.plotly_chart(summary["fig_users"], use_container_width=True)
 
-        fig = px.pie(df, names='argument_type', title='Argument Types')
-        st.plotly_chart(fig, use_container_width=True)
+        st.subheader("📈 Annotation Type Distribution")
+        st.plotly_chart(summary["fig_types"], use_container_width=True)
 
-        if 'timestamp' in df.columns:
-            st.subheader("📅 Annotation Timeline")
-            df['date'] = pd.to_datetime(df['timestamp']).dt.date
-            daily_counts = df.groupby('date').size().reset_index(name='count')
-            fig2 = px.line(daily_counts, x='date', y='count', title='Daily Annotations')
-            st.plotly_chart(fig2, use_container_width=True)
+        st.subheader("📅 Annotation Timeline")
+        st.plotly_chart(summary["fig_daily"], use_container_width=True)
 
         st.subheader("📋 All Annotations")
 
+        # Filtering, search and paging run in the store; only the visible page is sent to the browser
         col1, col2 = st.columns(2)
         with col1:
-            filter_type = st.multiselect("Filter by Type", df['argument_type'].unique())
+            filter_type = st.multiselect("Filter by Type", summary["types"])
         with col2:
-            filter_video = st.multiselect("Filter by Video", df['video_title'].unique())
+            filter_video = st.multiselect("Filter by Video", summary["titles"])
+        search = st.text_input("🔍 Search claims and premises")
+        filters = {"argument_type": filter_type, "video_title": filter_video, "search": search}
 
-        filtered_df = df.copy()
-        if filter_type:
-            filtered_df = filtered_df[filtered_df['argument_type'].isin(filter_type)]
-        if filter_video:
-            filtered_df = filtered_df[filtered_df['video_title'].isin(filter_video)]
+        matching = get_annotation_store().count_current(filters)
+        col1, col2, col3 = st.columns([1, 1, 2])
+        with col1:
+            page_size = st.selectbox("Rows per page", [25, 50, 100, 200], index=1)
+        page_count = max(1, -(-matching // page_size))
+        with col2:
+            table_page = st.number_input("Page", min_value=1, max_value=page_count, value=1, step=1)
+        with col3:
+            first_row = (table_page - 1) * page_size
+            st.caption(f"Showing {min(first_row + 1, matching)}–{min(first_row + page_size, matching)} "
+                       f"of {matching} matching annotations")
 
         st.dataframe(
-            filtered_df,
+            get_annotation_store().current_page(filters, table_page - 1, page_size),
             use_container_width=True,
             hide_index=True,
             column_config={
@@ -750,38 +799,43 @@ elif page == "Admin Dashboard":
         )
 
         st.subheader("💾 Export Data")
-        col1, col2, col3 = st.columns(3)
-
+        # Exports are only built on request, streamed to disk and reused until the filters or data change
+        col1, col2 = st.columns([1, 2])
         with col1:
-            csv = filtered_df.to_csv(index=False).encode('utf-8')
-            st.download_button(
-                label="📥 Download CSV",
-                data=csv,
-                file_name=f"annotations_{datetime.now().strftime('%Y%m%d')}.csv",
-                mime="text/csv"
+            export_format = st.selectbox(
+                "Export format",
+                list(EXPORT_FORMATS),
+                format_func=lambda fmt: EXPORT_FORMATS[fmt]["label"]
             )
+            export_key = export_fingerprint(export_format, filters, get_annotation_store().data_version())
+            if st.button("📦 Prepare Export"):
+                with st.spinner("Writing export..."):
+                    st.session_state.export_path = export_annotations(
+                        get_annotation_store(), export_format, filters)
+                    st.session_state.export_key = export_key
+                    st.session_state.download_key = export_key
 
         with col2:
-            from io import BytesIO
-
-            buffer = BytesIO()
-            with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
-                filtered_df.to_excel(writer, index=False, sheet_name='Annotations')
-            st.download_button(
-                label="📥 Download Excel",
-                data=buffer.getvalue(),
-                file_name=f"annotations_{datetime.now().strftime('%Y%m%d')}.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-            )
-
-        with col3:
-            json_data = filtered_df.to_json(orient='records', indent=2)
-            st.download_button(
-                label="📥 Download JSON",
-                data=json_data,
-                file_name=f"annotations_{datetime.now().strftime('%Y%m%d')}.json",
-                mime="application/json"
-            )
+            export_path = st.session_state.get("export_path")
+            if export_path and st.session_state.get("export_key") == export_key and os.path.exists(export_path):
+                fmt_info = EXPORT_FORMATS[export_format]
+                # st.download_button holds the whole file in memory for the run that renders it,
+                # so it is only rendered on the run right after the user asked for it
+                if st.session_state.pop("download_key", None) == export_key:
+                    with open(export_path, "rb") as f:
+                        st.download_button(
+                            label=f"📥 Download {fmt_info['label']}",
+                            data=f,
+                            file_name=f"annotations_{datetime.now().strftime('%Y%m%d')}.{fmt_info['extension']}",
+                            mime=fmt_info["mime"],
+                            on_click="ignore"
+                        )
+                elif st.button(f"📥 Prepare download ({fmt_info['label']})"):
+                    st.session_state.download_key = export_key
+                    st.rerun()
 
     else:
-        st.info("No annotations found yet.")
\ No newline at end of file
+        st.info("No annotations found yet.")
+
+    st.subheader("⚡ Cache Statistics")
+    st.dataframe(pd.DataFrame(cache_stats()), use_container_width=True, hide_index=True)
\ No newline at end of file
@@ -0,0 +1,140 @@
+"""Streaming WebVTT cue parser shared by the merge scripts and the annotation app
+
+``iter_cues`` walks a file (or any iterable of lines) once and yields compact
+``Cue`` tuples, so callers never hold the raw file, its split lines and the
+parsed segments in memory at the same time.
+"""
+import re
+from typing import NamedTuple
+
+# <font color="..."> and </font> wrappers added by SRF live captions
+FONT_TAG_RE = re.compile(r'<font[^>]*>|</font>')
+# Any markup, for display text
+ANY_TAG_RE = re.compile(r'<[^>]+>')
+
+# Timing lines are almost always "HH:MM:SS.mmm --> HH:MM:SS.mmm". Converting
+# them with int()/float() dominates parsing, so the whole-second part is
+# memoised (a few thousand distinct values per corpus) and milliseconds come
+# from a table. Both give exactly the values parse_vtt_time computes.
+_CLOCK_SECONDS = {}
+_MILLISECONDS = {f"{ms:03d}": float(f"{ms:03d}") / 1000 for ms in range(1000)}
+
+
+class Cue(NamedTuple):
+    """One subtitle cue: start/end in seconds and its text lines joined by spaces"""
+    start: float
+    end: float
+    text: str
+
+
+def parse_vtt_time(time_str):
+    """Convert VTT timestamp (HH:MM:SS.mmm or MM:SS.mmm) to seconds"""
+    parts = time_str.strip().split(':')
+    if len(parts) == 3:
+        h, m, s = parts
+    elif len(parts) == 2:
+        h = 0
+        m, s = parts
+    else:
+        return None
+    if '.' in s:
+        s, ms = s.split('.')
+        return int(h) * 3600 + int(m) * 60 + int(s) + float(ms) / 1000
+    return int(h) * 3600 + int(m) * 60 + int(s)
+
+
+def format_vtt_time(seconds):
+    """Convert seconds to an HH:MM:SS.mmm VTT timestamp"""
+    total_ms = int(round(seconds * 1000))
+    h, rest = divmod(total_ms, 3600 * 1000)
+    m, rest = divmod(rest, 60 * 1000)
+    s, ms = divmod(rest, 1000)
+    return f"{h:02d}:{m:02d}:{s:02d}.{ms:03d}"
+
+
+def _clock_seconds(hms):
+    """Memoised HH:MM:SS to whole seconds"""
+    seconds = _CLOCK_SECONDS.get(hms)
+    if seconds is None:
+        h, m, s = hms.split(':')
+        seconds = _CLOCK_SECONDS[hms] = int(h) * 3600 + int(m) * 60 + int(s)
+    return seconds
+
+
+def _parse_timing(line):
+    """Slow path for timing lines the regex does not cover, e.g. MM:SS.mmm
+
+    Returns (None, None) when the line is not a timing line at all, which
+    happens when merged speaker files carry "-->" inside running text.
+    """
+    left, _, right = line.partition('-->')
+    # Drop cue settings such as "align:start" after the end time
+    right = right.split(None, 1)[0] if right.strip() else right
+    try:
+        start = parse_vtt_time(left)
+        end = parse_vtt_time(right)
+    except ValueError:
+        return None, None
+    if start is None or end is None:
+        return None, None
+    return start, end
+
+
+def iter_cues(lines, strip_tags=True):
+    """Yield a Cue for every timed block in a VTT file
+
+    Args:
+        lines: an open text file or any iterable of lines
+        strip_tags: remove <font> wrappers from the cue text
+
+    Cue numbers, the WEBVTT header, unparseable timing lines and cues
+    without any text are skipped.
+    """
+    start = end = None
+    text_lines = []
+
+    for raw in lines:
+        line = raw.strip()
+
+        if start is not None:
+            # Inside a cue: text lines run until the next blank line
+            if line:
+                if strip_tags and '<' in line:
+                    if line.startswith('<font') and line.endswith('</font>') and line.count('<') == 2:
+                        # Common case: one wrapper around the whole line
+                        line = line[line.index('>') + 1:-7].strip()
+                    else:
+                        line = FONT_TAG_RE.sub('', line).strip()
+                if line:
+                    text_lines.append(line)
+                continue
+            if text_lines:
+                yield Cue(start, end, ' '.join(text_lines))
+                text_lines = []
+            start = None
+            continue
+
+        if '-->' in line:
+            if len(line) >= 29 and line[12:17] == ' --> ' and line[8] == line[25] == '.':
+                try:
+                    start = _clock_seconds(line[0:8]) + _MILLISECONDS[line[9:12]]
+                    end = _clock_seconds(line[17:25]) + _MILLISECONDS[line[26:29]]
+                    continue
+                except (KeyError, ValueError):
+                    pass
+            start, end = _parse_timing(line)
+
+    if start is not None and text_lines:
+        yield Cue(start, end, ' '.join(text_lines))
+
+
+def read_cues(path, strip_tags=True):
+    """Parse a VTT file into a list of cues"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return list(iter_cues(f, strip_tags=strip_tags))
+
+
+def read_subtitle_text(path):
+    """Read a merged/corrected subtitle file as one string for display"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read()